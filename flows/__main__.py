@@ -1,5 +1,6 @@
 # isort: skip_file
 
+import argparse
 import sys
 
 sys.path.append(".")
@@ -15,6 +16,14 @@ FLOW_NAME = "example"
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="flows")
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help="resume a run from its last checkpoint, the flow must have a checkpoint_path",
+    )
+    args = parser.parse_args()
+
     # Load the pipeline definition from YAML
     pipeline = FlowModel.from_name(FLOW_NAME)
 
@@ -24,8 +33,12 @@ if __name__ == "__main__":
     pipeline.resolve_variables(tenant.variables)
 
     # Execute the pipeline (not actually running the steps, just a placeholder)
-    with pipeline.runner() as runner:
-        runner(pipeline)
+    flow = pipeline.runner()
+    flow.resume_run_id = args.resume
+    with flow as runner:
+        # source steps read their data from their config, they aren't given a
+        # record, so their output can be cached whatever the later steps are
+        runner()
 
     # Print the final result
     print("Pipeline execution completed.")
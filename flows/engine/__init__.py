@@ -1,11 +1,19 @@
+from .async_flow_runner import AsyncFlowRunner
 from .base_operator import BaseOperator
+from .context import Context
 from .end_operator import EndOperator
+from .execution_plan import ExecutionPlan
 from .flow import Flow
 from .flow_runner import FlowRunner
+from .pipelined_flow_runner import PipelinedFlowRunner
 
 __all__ = (
+    "AsyncFlowRunner",
     "BaseOperator",
+    "Context",
     "EndOperator",
+    "ExecutionPlan",
     "Flow",
     "FlowRunner",
+    "PipelinedFlowRunner",
 )
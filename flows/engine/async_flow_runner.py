@@ -0,0 +1,145 @@
+"""
+Async Flow Runner
+
+Runs a flow on an asyncio event loop, so Operators which spend most of their
+time waiting on the network (uploads, secrets lookups) can work on many
+records at once rather than blocking the interpreter for each.
+
+Each record returned by the entry step of the flow is walked through the
+rest of the flow as its own task, the number of records in flight at once is
+limited by `max_in_flight`. Within a task the flow is walked depth-first, in
+the same order as the FlowRunner.
+
+Operators can define `execute` as a regular method, a generator, a coroutine
+(`async def`) or an async generator; synchronous Operators run directly on
+the event loop, so should be quick.
+
+Flows are entered from a coroutine with `async with flow as runner`, which
+returns an AsyncFlowRunner and, on exit, awaits the steps' shut down on the
+running event loop.
+
+The AsyncFlowRunner calls the Operators in the plan directly, without the
+wrappers the FlowRunner adds, so flows which use time budgets, tracing,
+memory profiling, the step cache, checkpoints, joins, partitions or
+deferred retries can't be run by it.
+"""
+
+import asyncio
+
+from orso.tools import random_string
+
+from flows.engine.base_operator import iterate_outcomes
+from flows.engine.context import Context
+from flows.engine.execution_plan import ExecutionPlan
+from flows.engine.flow_runner import wrapped_options
+from flows.exceptions import FlowError
+
+
+def check_async_options(flow):
+    """
+    Raise a FlowError if the flow uses options the AsyncFlowRunner doesn't
+    honour.
+    """
+    unsupported = wrapped_options(flow)
+    if getattr(flow, "pipeline_queue_size", None):
+        unsupported.append("pipeline_queue_size")
+    if unsupported:
+        raise FlowError(
+            f"Flows using {', '.join(unsupported)} can't be run by the AsyncFlowRunner."
+        )
+
+
+class AsyncFlowRunner:
+    def __init__(self, flow, max_in_flight: int = 100):
+        """
+        Parameters:
+            flow: Flow
+                The flow to run, the compiled plan is used if the flow has been
+                entered, otherwise the flow is compiled
+            max_in_flight: integer (optional)
+                The most records to process concurrently, default is 100
+        """
+        check_async_options(flow)
+        self.flow = flow
+        self.plan = flow.plan or ExecutionPlan(flow)
+        self.max_in_flight = max(1, max_in_flight)
+        self.cycles = 0
+
+    async def __call__(self, data: dict = None, context: dict = None):
+        """
+        Create a `run` of a flow and execute with a specific data object.
+
+        Parameters:
+            data: dictionary, any (optional)
+                The data the flow is to process
+            context: dictionary (optional)
+                Additional information to support the processing of the data
+        """
+        if not context:
+            context = {}
+
+        # create a run_id for the message if it doesn't already have one
+        if not context.get("run_id"):
+            context["run_id"] = str(random_string(32))
+
+        # copies of the context made for each edge are Contexts too
+        if not isinstance(context, Context):
+            context = Context(context)
+
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        tasks: set = set()
+
+        def _finished(task):
+            tasks.discard(task)
+            semaphore.release()
+
+        try:
+            for slot in self.plan.entry_points:
+                self.cycles += 1
+                outcome = await self.plan.operators[slot].acall(data, context)
+                for outcome_data, outcome_context in iterate_outcomes(outcome):
+                    for link in self.plan.links[slot]:
+                        # wait for a space before starting on the next record
+                        await semaphore.acquire()
+                        task = asyncio.create_task(
+                            self._inner_runner(link, outcome_data, outcome_context)
+                        )
+                        tasks.add(task)
+                        task.add_done_callback(_finished)
+            # wait for the records in flight, the first failure is raised
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def _inner_runner(self, slot: int, data: dict = None, context: dict = None):
+        """
+        Walk the rest of the flow for a single record, depth-first, using a
+        stack of outstanding work rather than recursion.
+        """
+        operators = self.plan.operators
+        links = self.plan.links
+
+        stack: list = [(iter([(data, context)]), (slot,))]
+        while stack:
+            outcomes, out_going_links = stack[-1]
+            record = next(outcomes, None)
+            if record is None:
+                stack.pop()
+                continue
+            if len(out_going_links) > 1:
+                # come back for the other edges once this edge is complete
+                stack.append((iter([record]), out_going_links[1:]))
+            slot = out_going_links[0]
+            data, context = record
+
+            self.cycles += 1
+            outcome = await operators[slot].acall(data, context.copy())
+            if links[slot]:
+                stack.append((iter(iterate_outcomes(outcome)), links[slot]))
+            else:
+                # generators are run to completion, even at the end of the flow
+                for _ in iterate_outcomes(outcome):
+                    pass
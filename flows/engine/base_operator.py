@@ -7,20 +7,66 @@ It manages execution, retries, error handling, logging, and versioning for
 operators, allowing engineers to focus on implementing data processing logic.
 """
 
+import asyncio
 import datetime
-import functools
 import hashlib
 import inspect
+import random
 import re
 import sys
 import time
+import types
 from typing import Generator
+from typing import Iterable
+from typing import Optional
 from typing import Tuple
 
-from orso.logging import get_logger  # type:ignore
+import pyarrow
+from orso.logging import get_logger  # type: ignore
 from orso.tools import random_string
 
+from flows.engine.error_sink import render_error
+from flows.engine.latency_histogram import LatencyHistogram
+from flows.engine.memory_profiler import merge_memory_sensors
+from flows.engine.memory_profiler import new_memory_sensors
+from flows.engine.retry_scheduler import ParkedRecord
+from flows.engine.source_hash import source_hash
+from flows.engine.step_cache import merge_cache_sensors
+from flows.engine.step_cache import new_cache_sensors
+from flows.exceptions import TimeExceeded
+
 SIGTERM = random_string(64)
+# the context key naming the step a record came from, for steps which need it
+PRODUCER = "flows:producer"
+BATCH_TYPES = (pyarrow.Table, pyarrow.RecordBatch)
+# checking the type is in a set is much quicker than isinstance with Arrow types
+_BATCH_TYPE_SET = frozenset(BATCH_TYPES)
+MAX_RETRY_WAIT = 300
+# marks the end of a generator, records are tuples so can't be this
+_END_OF_RECORDS = object()
+
+
+def iterate_outcomes(outcome) -> Iterable[Tuple[dict, dict]]:
+    """
+    Normalize the value returned by an Operator into an iterable of
+    (data, context) tuples.
+
+    Operators can return None (stop), a single (data, context) tuple, or a
+    list or generator of (data, context) tuples.
+    """
+    if not outcome:
+        return ()
+    if type(outcome).__name__ not in ["generator", "list"]:
+        return [outcome]
+    return outcome
+
+
+def _is_awaitable_outcome(outcome) -> bool:
+    """
+    If the value returned by `execute` or `execute_batch` is a coroutine or an
+    async generator, rather than records.
+    """
+    return inspect.iscoroutine(outcome) or inspect.isasyncgen(outcome)
 
 
 class BaseOperator:
@@ -33,6 +79,28 @@ class BaseOperator:
     """
 
     sigterm = SIGTERM  # default signal to use for graceful shutdown
+    batch_size: Optional[int] = None  # set by the Flow when running in batch mode
+    inbound_queue = None  # set by the PipelinedFlowRunner, the queue feeding this step
+    fusable = False  # stateless operators which can be fused with their neighbours
+    memory_sensors = None  # set when the flow is profiling memory
+    defer_retries = False  # set by the Flow, park failed records rather than waiting
+    error_sink = None  # set by the Flow when it has an error writer
+    checkpointing = False  # set by the Flow when it is saving checkpoints
+    cache_sensors = None  # set when the flow is caching this Operator's output
+    needs_producer = False  # steps which need to know which step each record came from
+    input_steps: tuple = ()  # set by the Flow for steps which need the producer
+    _async_execute = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # work out once, rather than on every call, if `execute` is async
+        cls._async_execute = inspect.iscoroutinefunction(cls.execute) or inspect.isasyncgenfunction(
+            cls.execute
+        )
+        # async Operators which don't process batches themselves have each
+        # row of a batch awaited
+        if cls._async_execute and cls.execute_batch is BaseOperator.execute_batch:
+            cls.execute_batch = BaseOperator._execute_batch_async
 
     def __init__(self, **kwargs):
         """
@@ -41,11 +109,19 @@ class BaseOperator:
         Parameters:
             retry_count (int, optional): Number of retry attempts (default: 2, range: 1-5).
             retry_wait (int, optional): Seconds to wait between retries (default: 5, range: 1-300).
+            retry_backoff (float, optional): Multiply the wait by this after each retry (default: 1, range: 1-10).
+            retry_jitter (bool, optional): Wait a random time between half and all of the wait (default: False).
+            retry_budget (int, optional): Most retries this Operator will make over a run of the flow (default: unlimited).
+            time_budget (float, optional): Most seconds this Operator can spend processing records before the flow is stopped (default: unlimited).
             rolling_failure_window (int, optional): Number of previous executions to track for failures (default: 10, range: 1-100).
+            timing_sample_rate (int, optional): Time one in every n executions and extrapolate (default: 1, range: 1-1000).
+            cache (bool, optional): Replay this Operator's output from the flow's cache when it is given the same input again (default: False).
         """
         self.flow = None
         self.records_processed = 0  # number of times this Operator has been run
         self.execution_time_ns = 0  # nano seconds of cpu execution time
+        self.records_yielded = 0  # number of records returned or yielded
+        self.latency_histogram = LatencyHistogram()  # distribution of execution times
         self.errors = 0  # number of errors
         self.commencement_time = None  # the time processing started
         self.logger = get_logger()  # get the mabel logger
@@ -54,13 +130,25 @@ class BaseOperator:
 
         # read retry settings, clamp values to practical ranges
         self.retry_count = self._clamp(kwargs.get("retry_count", 2), 1, 5)
-        self.retry_wait = self._clamp(kwargs.get("retry_wait", 5), 1, 300)
+        self.retry_wait = self._clamp(kwargs.get("retry_wait", 5), 1, MAX_RETRY_WAIT)
+        self.retry_backoff = self._clamp(kwargs.get("retry_backoff", 1), 1, 10)
+        self.retry_jitter = bool(kwargs.get("retry_jitter", False))
+        self.retry_budget = kwargs.get("retry_budget")
+        time_budget = kwargs.get("time_budget")
+        self.time_budget_ns = None if time_budget is None else int(time_budget * 1e9)
         rolling_failure_window = self._clamp(kwargs.get("rolling_failure_window", 10), 1, 100)
-        self.last_few_results = [1] * rolling_failure_window  # track the last n results
-
-        # Log the hashes of the __call__ and version methods
-        call_hash = self._hash(inspect.getsource(self.__call__))[-12:]
-        version_hash = self._hash(inspect.getsource(self.version))[-12:]
+        # track the last n results in a ring buffer, with a running count of failures
+        self._window_size = rolling_failure_window
+        self._window = bytearray(b"\x01" * rolling_failure_window)
+        self._window_index = 0
+        self._window_failures = 0
+        self.timing_sample_rate = self._clamp(kwargs.get("timing_sample_rate", 1), 1, 1000)
+        self.cache_outputs = bool(kwargs.get("cache", False))
+
+        # Log the hashes of the __call__ and version methods, the hashes are
+        # cached so only the first instance of each Operator reads the source
+        call_hash = source_hash(self.__call__)[-12:]
+        version_hash = source_hash(self.version)[-12:]
         self.logger.audit(
             {
                 "operator": self.name,
@@ -97,76 +185,398 @@ class BaseOperator:
         """
         pass  # pragma: no cover
 
+    def execute_batch(
+        self, data: pyarrow.Table = None, context: dict = None
+    ) -> Generator[Tuple[pyarrow.Table, dict], None, None]:
+        """
+        Process a batch of records when the flow is running in batch mode.
+
+        Operators which can work on Arrow data directly should override this
+        method. The default implementation adapts row-based Operators by
+        calling `execute` for each row in the batch and collecting the rows
+        which are returned into a new batch.
+
+        Parameters:
+            data: pyarrow.Table or pyarrow.RecordBatch
+                The batch of records to be processed
+            context: Dictionary
+                Information to support the execution of the Operator, this is
+                passed to `execute` for each row, changes made to the context
+                by `execute` are not carried forward
+
+        Returns:
+            Iterable(data, context)
+                The batch to pass to the next Operator, no batch is returned
+                if every row was filtered out
+        """
+        rows = []
+        for row in data.to_pylist():
+            for outcome_data, _ in iterate_outcomes(self.execute(row, context)):
+                rows.append(outcome_data)
+        if rows:
+            yield pyarrow.Table.from_pylist(rows), context
+
+    async def _execute_batch_async(self, data: pyarrow.Table = None, context: dict = None):
+        """
+        The `execute_batch` of Operators with an `async def execute`, each row
+        is awaited in turn.
+        """
+        rows = []
+        for row in data.to_pylist():
+            outcome = await self._await_outcome(self.execute(row, context))
+            for outcome_data, _ in iterate_outcomes(outcome):
+                rows.append(outcome_data)
+        if rows:
+            return pyarrow.Table.from_pylist(rows), context
+        return None
+
+    def commit(self):
+        """
+        Called when the flow saves a checkpoint. Operators which write data out
+        should make the records they have been given durable, and when the flow
+        is checkpointing, not write records until they are committed.
+        """
+        pass
+
+    def checkpoint_state(self) -> Optional[dict]:
+        """
+        The state to save when the flow saves a checkpoint, stateful Operators
+        should override this and `restore_checkpoint`. The state must be able
+        to be saved as JSON.
+
+        Returns:
+            A dictionary, or None if the Operator has no state to save
+        """
+        return None
+
+    def restore_checkpoint(self, state: dict):
+        """
+        Restore the state saved by `checkpoint_state` when a run is resumed.
+        """
+        pass
+
     def __call__(self, data: dict = None, context: dict = None):
         """
         DO NOT OVERRIDE THIS METHOD
 
         This method wraps the `execute` method, which must be overridden, to
         to add management of the execution such as sensors and retries.
+
+        Operators with an `async def execute` are run to completion on a new
+        event loop, use the AsyncFlowRunner to run them concurrently.
+
+        Generators returned by `execute` are wrapped so the time taken to
+        produce each record is charged to this Operator, and the time the
+        steps after it take to process the record is not.
         """
         if self.commencement_time is None:
             self.commencement_time = datetime.datetime.now()
         self.records_processed += 1
-        attempts_to_go = self.retry_count
-        while attempts_to_go > 0:
-            try:
+        # time every call, or one in every `timing_sample_rate` calls
+        timed = self.records_processed % self.timing_sample_rate == 0
+        start_time = 0
+        try:
+            if timed:
                 start_time = time.perf_counter_ns()
+            if type(data) in _BATCH_TYPE_SET:
+                outcome = self.execute_batch(data, context)
+            else:
                 outcome = self.execute(data, context)
+            if self._async_execute and _is_awaitable_outcome(outcome):
+                outcome = asyncio.run(self._await_outcome(outcome))
+            if timed:
+                elapsed = time.perf_counter_ns() - start_time
+        except TimeExceeded:
+            # running out of time stops the flow, it isn't retried
+            raise
+        except Exception as err:
+            outcome = self._retry(err, data, context)
+        else:
+            # record the success in the failure window, while the window has
+            # no failures every result in it is already a success
+            if self._window_failures:
+                self._record_result(True)
+
+            if type(outcome) is types.GeneratorType:
+                outcome = self._timed_records(
+                    outcome, elapsed if timed else 0, self.timing_sample_rate if timed else 0
+                )
+            else:
+                if timed:
+                    self.execution_time_ns += elapsed * self.timing_sample_rate
+                    self.latency_histogram.record(elapsed, self.timing_sample_rate)
+                if outcome:
+                    self.records_yielded += len(outcome) if type(outcome) is list else 1
+
+        if self._window_failures:
+            self._check_failure_rate()
+        return outcome
+
+    def _account_outcome(self, outcome, elapsed: int):
+        """
+        Record the time taken and the records returned by a call which was
+        timed outside of the fast path of `__call__`.
+        """
+        if type(outcome) is types.GeneratorType:
+            return self._timed_records(outcome, elapsed, 1)
+        self.execution_time_ns += elapsed
+        self.latency_histogram.record(elapsed)
+        if outcome:
+            self.records_yielded += len(outcome) if type(outcome) is list else 1
+        return outcome
+
+    def _timed_records(self, records, elapsed: int, weight: int):
+        """
+        Yield the records from a generator returned by `execute`, counting them
+        and timing each `next()`.
+
+        The time is added to the Operator's execution time as each record is
+        produced, so time budgets see it, and the total time taken to create
+        the generator and produce all of its records is recorded as the time
+        for the call when the generator is exhausted or closed. Untimed calls
+        (a weight of 0) only count the records.
+        """
+        yielded = 0
+        try:
+            if not weight:
+                for record in records:
+                    yielded += 1
+                    yield record
+                return
+            perf_counter_ns = time.perf_counter_ns
+            self.execution_time_ns += elapsed * weight
+            while True:
+                start_time = perf_counter_ns()
+                record = next(records, _END_OF_RECORDS)
+                record_time = perf_counter_ns() - start_time
+                elapsed += record_time
+                self.execution_time_ns += record_time * weight
+                if record is _END_OF_RECORDS:
+                    return
+                yielded += 1
+                yield record
+        finally:
+            self.records_yielded += yielded
+            if weight:
+                self.latency_histogram.record(elapsed, weight)
+
+    def _retry(self, err, data, context):
+        """
+        The slow path of `__call__`, taken when `execute` fails. The record is
+        retried, waiting between attempts, and reported if every attempt fails.
+
+        When retries are deferred, the record is parked to be retried by the
+        runner rather than waiting here.
+        """
+        if self.defer_retries:
+            return self._park(err, data, context, 1)
+        attempt = 1
+        while True:
+            self.errors += 1
+            if attempt >= self.retry_count or not self._take_retry_budget():
+                self._report_failure(err, data, context)
+                self._record_result(False)
+                return None
+            delay = self._retry_delay(attempt)
+            self._report_retry(err, context, delay)
+            time.sleep(delay)
+            attempt += 1
+            try:
+                start_time = time.perf_counter_ns()
+                outcome = self._execute(data, context)
+                if self._async_execute and _is_awaitable_outcome(outcome):
+                    outcome = asyncio.run(self._await_outcome(outcome))
+                elapsed = time.perf_counter_ns() - start_time
+            except TimeExceeded:
+                raise
+            except Exception as retry_err:
+                err = retry_err
+                continue
+            self._record_result(True)
+            return self._account_outcome(outcome, elapsed)
+
+    def retry(self, parked: ParkedRecord):
+        """
+        DO NOT OVERRIDE THIS METHOD
+
+        Attempt a parked record again, called by the runner once the record's
+        wait is over.
+
+        Returns:
+            The outcome of `execute`, another ParkedRecord if the attempt failed
+            and the record can be retried again, or None if it can't
+        """
+        try:
+            start_time = time.perf_counter_ns()
+            outcome = self._execute(parked.data, parked.context)
+            if self._async_execute and _is_awaitable_outcome(outcome):
+                outcome = asyncio.run(self._await_outcome(outcome))
+            elapsed = time.perf_counter_ns() - start_time
+        except TimeExceeded:
+            raise
+        except Exception as err:
+            outcome = self._park(err, parked.data, parked.context, parked.attempt)
+            if self._window_failures:
+                self._check_failure_rate()
+            return outcome
+        self._record_result(True)
+        return self._account_outcome(outcome, elapsed)
+
+    def _park(self, err, data, context, attempt: int):
+        """
+        Record a failed attempt and, if the record can be retried, return it
+        parked until its wait is over.
+        """
+        self.errors += 1
+        if attempt >= self.retry_count or not self._take_retry_budget():
+            self._report_failure(err, data, context)
+            self._record_result(False)
+            return None
+        delay = self._retry_delay(attempt)
+        self._report_retry(err, context, delay)
+        return ParkedRecord(data, context, attempt + 1, time.monotonic() + delay)
+
+    def _retry_delay(self, attempt: int) -> float:
+        """
+        The seconds to wait after a failed attempt, growing by `retry_backoff`
+        after each attempt, up to the longest wait allowed.
+        """
+        delay = min(self.retry_wait * self.retry_backoff ** (attempt - 1), MAX_RETRY_WAIT)
+        if self.retry_jitter:
+            # spread retries out so failed records don't all retry together
+            delay = random.uniform(delay / 2, delay)  # nosec - not for security
+        return delay
+
+    def _take_retry_budget(self) -> bool:
+        if self.retry_budget is None:
+            return True
+        if self.retry_budget <= 0:
+            return False
+        self.retry_budget -= 1
+        return True
+
+    async def acall(self, data: dict = None, context: dict = None):
+        """
+        DO NOT OVERRIDE THIS METHOD
+
+        The asynchronous counterpart to `__call__`, used by the AsyncFlowRunner.
+
+        Coroutines returned by `execute` are awaited and async generators are
+        collected inside the retry loop, and waits between retries use
+        `asyncio.sleep`, so a record which is being retried doesn't hold up
+        other records on the event loop.
+        """
+        if self.commencement_time is None:
+            self.commencement_time = datetime.datetime.now()
+        self.records_processed += 1
+        attempt = 1
+        while True:
+            try:
+                start_time = time.perf_counter_ns()
+                outcome = self._execute(data, context)
+                if _is_awaitable_outcome(outcome):
+                    outcome = await self._await_outcome(outcome)
                 my_execution_time = time.perf_counter_ns() - start_time
-                self.execution_time_ns += my_execution_time
-                # add a success to the last_few_results list
-                self.last_few_results.append(1)
-                self.last_few_results.pop(0)
+                self._record_result(True)
+                outcome = self._account_outcome(outcome, my_execution_time)
                 break
+            except TimeExceeded:
+                raise
             except Exception as err:
                 self.errors += 1
-                attempts_to_go -= 1
-                if attempts_to_go:
-                    self.logger.error(
-                        f"{self.name} - {type(err).__name__} - {err} - retry in {self.retry_wait} seconds ({context.get('uuid')})"
-                    )
-                    time.sleep(self.retry_wait)
-                else:
-                    error_log_reference = ""
-                    error_reference = err
-                    try:
-                        error_payload = (
-                            f"timestamp  : {datetime.datetime.today().isoformat()}\n"
-                            f"operator   : {self.name}\n"
-                            f"error type : {type(err).__name__}\n"
-                            f"details    : {err}\n"
-                            "------------------------------------------------------------------------------------------------------------------------\n"
-                            f"{self._wrap_text('RenderErrorStack()', 120)}\n"
-                            "-------------------------------------------------------  context  ------------------------------------------------------\n"
-                            f"{self._wrap_text(str(context), 120)}\n"
-                            "--------------------------------------------------------  data  --------------------------------------------------------\n"
-                            f"{self._wrap_text(str(data), 120)}\n"
-                            "------------------------------------------------------------------------------------------------------------------------\n"
-                        )
-                        error_log_reference = self.error_writer(error_payload)  # type:ignore
-                    except Exception as err:
-                        self.logger.error(
-                            f"Problem writing to the error bin, a record has been lost. {type(err).__name__} - {err} - {context.get('uuid')}"
-                        )
-                    finally:
-                        # finally blocks are called following a try/except block regardless of the outcome
-                        self.logger.alert(
-                            f"{self.name} - {type(error_reference).__name__} - {error_reference} - tried {self.retry_count} times before aborting ({context.get('uuid')}) {error_log_reference}"
-                        )
+                if attempt >= self.retry_count or not self._take_retry_budget():
+                    self._report_failure(err, data, context)
                     outcome = None
-                    # add a failure to the last_few_results list
-                    self.last_few_results.append(0)
-                    self.last_few_results.pop(0)
+                    self._record_result(False)
+                    break
+                delay = self._retry_delay(attempt)
+                self._report_retry(err, context, delay)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        self._check_failure_rate()
+        return outcome
+
+    def _execute(self, data, context):
+        """
+        Call `execute`, or `execute_batch` if the data is an Arrow batch.
+        """
+        if type(data) in _BATCH_TYPE_SET:
+            return self.execute_batch(data, context)
+        return self.execute(data, context)
 
+    @staticmethod
+    async def _await_outcome(outcome):
+        """
+        Await the coroutine, or collect the records from the async generator,
+        returned by an `async def execute`.
+        """
+        if inspect.isasyncgen(outcome):
+            return [record async for record in outcome]
+        return await outcome
+
+    def _report_retry(self, err, context, delay):
+        self.logger.error(
+            f"{self.name} - {type(err).__name__} - {err} - retry in {delay:.1f} seconds ({context.get('uuid')})"
+        )
+
+    def _report_failure(self, err, data, context):
+        """
+        Write the details of a record which has failed every retry to the error
+        bin, and raise an alert.
+
+        When the flow has an error sink the record is written in the background,
+        otherwise it is written by the Operator's `error_writer`.
+        """
+        error_log_reference = ""
+        error_reference = err
+        try:
+            if self.error_sink is not None:
+                error_log_reference = self.error_sink.submit(
+                    "operator", self.name, err, data, context
+                )
+            else:
+                error_writer = self.error_writer  # type: ignore
+                error_log_reference = error_writer(
+                    render_error("operator", self.name, err, data, context)
+                )
+        except Exception as err:
+            self.logger.error(
+                f"Problem writing to the error bin, a record has been lost. {type(err).__name__} - {err} - {context.get('uuid')}"
+            )
+        finally:
+            # finally blocks are called following a try/except block regardless of the outcome
+            self.logger.alert(
+                f"{self.name} - {type(error_reference).__name__} - {error_reference} - tried {self.retry_count} times before aborting ({context.get('uuid')}) {error_log_reference}"
+            )
+
+    @property
+    def last_few_results(self) -> list:
+        """
+        The results of the last n executions, oldest first, 1 for a success
+        and 0 for a failure.
+        """
+        index = self._window_index
+        return list(self._window[index:] + self._window[:index])
+
+    def _record_result(self, success: bool):
+        # overwrite the oldest result in the ring buffer, keeping the count of
+        # failures in the window up to date
+        index = self._window_index
+        result = 1 if success else 0
+        self._window_failures += self._window[index] - result
+        self._window[index] = result
+        index += 1
+        self._window_index = 0 if index == self._window_size else index
+
+    def _check_failure_rate(self):
         # if there is a high failure rate, abort
-        if sum(self.last_few_results) < (len(self.last_few_results) / 2):
+        if self._window_size - self._window_failures < (self._window_size / 2):
             self.logger.alert(
-                f"Failure Rate for {self.name} over last {len(self.last_few_results)} executions is over 50%, aborting."
+                f"Failure Rate for {self.name} over last {self._window_size} executions is over 50%, aborting."
             )
             sys.exit(1)
 
-        return outcome
-
     def read_sensors(self):
         """
         Format data about the transformation, this can be overridden but it
@@ -177,15 +587,66 @@ class BaseOperator:
             "version": self.version(),
             "records_processed": self.records_processed,
             "error_count": self.errors,
+            "records_yielded": self.records_yielded,
             "execution_sec": self.execution_time_ns / 1e9,
         }
+        if self.latency_histogram.count:
+            response["latency_sec"] = self.latency_histogram.summary()
         if self.records_processed == 0:
             self.logger.warning(f"{self.name} processed 0 records")
         if self.commencement_time:
             response["commencement_time"] = self.commencement_time.isoformat()
+        if self.inbound_queue is not None:
+            response["inbound_queue"] = self.inbound_queue.read_sensors()
+        if self.memory_sensors is not None:
+            response["memory"] = dict(self.memory_sensors)
+        if self.cache_sensors is not None:
+            response["cache"] = dict(self.cache_sensors)
         return response
 
-    @functools.lru_cache(1)
+    def sensor_state(self) -> dict:
+        """
+        The raw values behind the sensors, used to combine the sensors of
+        copies of this Operator which have run in other processes.
+        """
+        return {
+            "records_processed": self.records_processed,
+            "errors": self.errors,
+            "records_yielded": self.records_yielded,
+            "execution_time_ns": self.execution_time_ns,
+            "latency_histogram": self.latency_histogram.to_state(),
+            "commencement_time": self.commencement_time,
+            "memory_sensors": self.memory_sensors,
+            "cache_sensors": self.cache_sensors,
+        }
+
+    def merge_sensor_state(self, state: dict):
+        """
+        Add the sensor values from a copy of this Operator to this Operator.
+
+        Parameters:
+            state: dictionary
+                The values returned by `sensor_state` on the copy
+        """
+        self.records_processed += state["records_processed"]
+        self.errors += state["errors"]
+        self.records_yielded += state["records_yielded"]
+        self.execution_time_ns += state["execution_time_ns"]
+        self.latency_histogram.merge(LatencyHistogram.from_state(state["latency_histogram"]))
+        if state["memory_sensors"] is not None:
+            if self.memory_sensors is None:
+                self.memory_sensors = new_memory_sensors()
+            merge_memory_sensors(self.memory_sensors, state["memory_sensors"])
+        if state["cache_sensors"] is not None:
+            if self.cache_sensors is None:
+                self.cache_sensors = new_cache_sensors()
+            merge_cache_sensors(self.cache_sensors, state["cache_sensors"])
+        commencement_time = state["commencement_time"]
+        if commencement_time and (
+            self.commencement_time is None or commencement_time < self.commencement_time
+        ):
+            self.commencement_time = commencement_time
+
     def version(self):
         """
         DO NOT OVERRIDE THIS METHOD.
@@ -199,10 +660,7 @@ class BaseOperator:
         Hashing isn't security sensitive here, it's to identify changes
         rather than protect information.
         """
-        source = inspect.getsource(self.execute)
-        source = self._only_alpha_nums(source)
-        full_hash = hashlib.sha256(source.encode())
-        return full_hash.hexdigest()[-16:]
+        return source_hash(self.execute, alpha_nums_only=True)[-16:]
 
     def __del__(self):
         # do nothing - prevents errors if someone thinks they're being a good
@@ -0,0 +1,188 @@
+"""
+Checkpoints
+
+Long running flows can save checkpoints so a run which dies part way through
+can be resumed from its last checkpoint rather than from the start.
+
+A checkpoint is taken by the FlowRunner between records from the first step,
+when every record the first step has produced so far has been through the
+whole flow (and no records are waiting to be retried). Checkpoints are saved
+in three steps:
+
+1. each Operator's `checkpoint_state` is saved as a pending checkpoint, for
+   source steps this is how many records they have produced, other steps can
+   save any state they need
+2. each Operator's `commit` is called, steps which write data out (sinks)
+   make the records they have been given durable
+3. the checkpoint is marked as committed
+
+The checkpoint file is written and synced to disk in steps 1 and 3, so each
+checkpoint costs two fsyncs as well as the sinks' commits; the
+`checkpoint_interval` keeps this to one checkpoint every so often however
+many records the flow reads.
+
+When a run is resumed, each Operator is given the state from the last
+committed checkpoint before the run starts, source steps skip the records
+they had already produced. Sinks which only write records when they are
+committed neither skip nor repeat records - unless the run died while the
+sinks were committing. Which of the records the sinks wrote can't be known,
+so the run resumes from the checkpoint before and those records may be
+written again; records are written at least once, never skipped.
+"""
+
+import json
+import os
+import time
+from typing import Optional
+
+from orso.logging import get_logger
+
+from flows.exceptions import FlowError
+
+
+class CheckpointStore:
+    """
+    Saves checkpoints as JSON files in a local folder, one file per run.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, run_id: str) -> str:
+        if not run_id or os.path.basename(run_id) != run_id:
+            raise FlowError(f"Invalid run_id for a checkpoint - {run_id!r}")
+        return os.path.join(self.path, f"{run_id}.json")
+
+    def save(self, run_id: str, checkpoint: dict):
+        # write to a temporary file and rename, so a checkpoint is never left
+        # half written
+        path = self._file(run_id)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file, default=str)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temporary_path, path)
+
+    def load(self, run_id: str) -> Optional[dict]:
+        try:
+            with open(self._file(run_id), "r", encoding="utf-8") as checkpoint_file:
+                return json.load(checkpoint_file)
+        except FileNotFoundError:
+            return None
+
+
+class Checkpointer:
+    """
+    Commits the steps of a flow and saves their state, at most once every
+    `interval` seconds.
+    """
+
+    def __init__(self, store: CheckpointStore, flow, interval: float = 60):
+        self.store = store
+        self.flow = flow
+        self.interval = interval
+        self.checkpoints = 0
+        self._next_checkpoint = time.monotonic() + interval
+        # the last committed checkpoint, kept in pending checkpoints so a run
+        # can be resumed from it if the commit doesn't finish
+        self._committed: Optional[dict] = None
+
+    def due(self) -> bool:
+        return time.monotonic() >= self._next_checkpoint
+
+    def save(self, run_id: str, complete: bool = False):
+        """
+        Save the state of each step as a pending checkpoint, commit each step,
+        then mark the checkpoint as committed.
+
+        Parameters:
+            run_id: string
+                The run being checkpointed
+            complete: boolean (optional)
+                The run has finished, resuming it does nothing, default False
+        """
+        nodes = self.flow.nodes
+        state = {}
+        for name, operator in nodes.items():
+            operator_state = operator.checkpoint_state()
+            if operator_state is not None:
+                state[name] = operator_state
+        checkpoint = {
+            "run_id": run_id,
+            "complete": complete,
+            "saved_at": time.time(),
+            "steps": state,
+        }
+        self.store.save(run_id, {**checkpoint, "committed": False, "previous": self._committed})
+        for operator in nodes.values():
+            operator.commit()
+        checkpoint["committed"] = True
+        self.store.save(run_id, checkpoint)
+        self._committed = checkpoint
+        self.checkpoints += 1
+        self._next_checkpoint = time.monotonic() + self.interval
+
+    def restore(self, run_id: str) -> dict:
+        """
+        Give each step the state saved in the run's last checkpoint.
+
+        Returns:
+            The checkpoint
+        """
+        checkpoint = self.store.load(run_id)
+        if checkpoint is None:
+            raise FlowError(f"There is no checkpoint to resume run {run_id} from.")
+        if not checkpoint.get("committed", True):
+            get_logger().warning(
+                f"Run {run_id} stopped while its steps were committing, records they wrote since the checkpoint before may be written again"
+            )
+            checkpoint = checkpoint["previous"] or {
+                "run_id": run_id,
+                "complete": False,
+                "saved_at": checkpoint["saved_at"],
+                "steps": {},
+            }
+        self._committed = checkpoint
+        for name, operator_state in checkpoint["steps"].items():
+            operator = self.flow.get_operator(name)
+            if operator is None:
+                raise FlowError(f"Checkpoint for run {run_id} has state for unknown step {name}.")
+            operator.restore_checkpoint(operator_state)
+        get_logger().info(
+            f"Resuming run {run_id} from the checkpoint saved at {time.ctime(checkpoint['saved_at'])}"
+        )
+        return checkpoint
+
+
+class SourceOffsets:
+    """
+    Checkpointing for source steps, which records how many records (or
+    batches in batch mode) the step has produced, and skips them when the
+    run is resumed.
+
+    Source steps pass the records they produce through `_offset_records`.
+    """
+
+    offset = 0  # the records produced in this run
+    resume_offset = 0  # the records to skip, when resuming a run
+
+    def checkpoint_state(self) -> dict:
+        return {"offset": self.offset, "batch_size": self.batch_size}
+
+    def restore_checkpoint(self, state: dict):
+        if state.get("batch_size") != self.batch_size:
+            raise FlowError(
+                f"{self.name} can't be resumed with a different batch_size to the one it was checkpointed with."
+            )
+        self.offset = self.resume_offset = state["offset"]
+
+    def _offset_records(self, records):
+        skip = self.resume_offset
+        self.resume_offset = 0
+        for index, record in enumerate(records):
+            if index < skip:
+                continue
+            self.offset = index + 1
+            yield record
@@ -0,0 +1,39 @@
+"""
+Context
+
+Every record passed between steps carries a context, and the runners copy the
+context for each outgoing edge so steps can't see changes made by steps on
+other branches.
+
+The Context is a dictionary, so steps can use it anywhere a dictionary is
+expected - `isinstance(context, dict)` is True and it can be serialized with
+`json.dumps` - and reads are dictionary reads. Copying a Context returns a
+Context rather than a plain dictionary, so copies made by steps keep the same
+type as they are passed along the flow.
+
+Contexts were previously layered mappings whose copies shared their layers,
+but every read had to search the layers in Python, which cost more than the
+copies saved for the small contexts most flows carry, and contexts weren't
+dictionaries. `tests/benchmarks/bench_context.py` compares the two.
+"""
+
+from collections.abc import Mapping
+
+
+class Context(dict):
+    __slots__ = ()
+
+    def copy(self):
+        """
+        Create a copy of the Context.
+        """
+        return self.__class__(self)
+
+    __copy__ = copy
+
+    def __or__(self, other):
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        child = self.__class__(self)
+        child.update(other)
+        return child
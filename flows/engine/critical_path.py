@@ -0,0 +1,118 @@
+"""
+Critical Path
+
+Where a step links to more than one step, the branches are run longest first.
+How long a branch takes is estimated from the time each step took per record
+in previous runs of the flow, which are saved to a timings file when the flow
+is given a `timings_path`.
+
+The estimated remaining critical path of a step is the time the step takes
+per record plus the longest remaining critical path of the steps it links to.
+Running the longest branches first means, when branches are run in parallel,
+the flow takes roughly as long as its longest branch rather than waiting for
+a long branch which was started last.
+
+Steps without timings (such as new steps) are estimated to take the average
+time of the steps which have timings. When there are no timings at all, every
+step is estimated to take no time, so branches are run in the order of the
+names of the steps.
+"""
+
+import json
+import os
+from typing import Dict
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from orso.logging import get_logger
+
+# how much each run moves the saved timings, so one unusual run doesn't
+# reorder the flow
+TIMING_WEIGHT = 0.25
+
+
+def load_step_timings(path: str) -> Dict[str, float]:
+    """
+    The saved seconds per record for each step, empty if nothing is saved or
+    the file can't be read.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as timings_file:
+            timings = json.load(timings_file)
+    except FileNotFoundError:
+        return {}
+    except ValueError as err:
+        # a run which died while the file was written can leave it truncated,
+        # the timings only order the branches so the flow runs without them
+        get_logger().warning(f"Ignoring the step timings in {path}, they can't be read - {err}")
+        return {}
+    if not isinstance(timings, dict):
+        get_logger().warning(f"Ignoring the step timings in {path}, they aren't a mapping")
+        return {}
+    return timings
+
+
+def save_step_timings(path: str, flow, timings: Optional[Dict[str, float]] = None):
+    """
+    Blend the seconds per record each step of the flow took in this run into
+    the saved timings.
+
+    Parameters:
+        path: string
+            The timings file
+        flow: Flow
+            The flow which has run
+        timings: dictionary (optional)
+            The timings the flow was run with, read from the file if not given
+    """
+    if timings is None:
+        timings = load_step_timings(path)
+    timings = dict(timings)
+    for name, operator in flow.nodes.items():
+        if not getattr(operator, "records_processed", 0):
+            continue
+        seconds = operator.execution_time_ns / operator.records_processed / 1e9
+        previous = timings.get(name)
+        if previous is not None:
+            seconds = previous + (seconds - previous) * TIMING_WEIGHT
+        timings[name] = seconds
+
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as timings_file:
+        json.dump(timings, timings_file, sort_keys=True, indent=2)
+    os.replace(temporary_path, path)
+
+
+def critical_paths(costs: Sequence[float], links: Sequence[Tuple[int, ...]]) -> Tuple[float, ...]:
+    """
+    The estimated remaining critical path of each slot of a plan.
+
+    Parameters:
+        costs: list of floats
+            The estimated seconds per record of the step in each slot
+        links: list of tuples of integers
+            The outgoing links of each slot, slots must be in topological
+            order so every link is to a later slot
+
+    Returns:
+        The estimated seconds per record from each slot to the end of the flow
+    """
+    paths = [0.0] * len(costs)
+    for slot in range(len(costs) - 1, -1, -1):
+        paths[slot] = costs[slot] + max((paths[target] for target in links[slot]), default=0.0)
+    return tuple(paths)
+
+
+def step_costs(names: Sequence[str], timings: Optional[Dict[str, float]]) -> list:
+    """
+    The estimated seconds per record of each step, steps without timings are
+    estimated to take the average time of those with timings.
+    """
+    if not timings:
+        return [0.0] * len(names)
+    default = sum(timings.values()) / len(timings)
+    return [timings.get(name, default) for name in names]
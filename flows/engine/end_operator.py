@@ -19,6 +19,12 @@ from flows.engine import BaseOperator
 
 
 class EndOperator(BaseOperator):
+    fusable = True
+
     def execute(self, data={}, context={}):
         # do nothing
         pass
+
+    def execute_batch(self, data=None, context={}):
+        # do nothing, and avoid splitting the batch into rows to do it
+        pass
@@ -0,0 +1,225 @@
+"""
+Error Sink
+
+Records which fail every retry are written to an error bin with the details
+of the failure, the context and the data. Rendering large records as text is
+slow, and writing each failure as it happens means a burst of failures slows
+the flow down, just when it is already struggling.
+
+When a flow has an error writer, failures are passed to an ErrorSink, which
+holds references to them and returns straight away. A background thread
+renders the failures, with the size of each field capped, and writes them to
+the error writer in gzip-compressed batches, when a batch is full, when
+`flush_interval` has passed, and when the flow finishes.
+"""
+
+import collections
+import datetime
+import gzip
+import reprlib
+import threading
+import traceback
+from collections.abc import Mapping
+from textwrap import fill
+from typing import Callable
+
+from orso.logging import get_logger
+from orso.tools import random_string
+
+FIELD_LIMIT = 10000  # the most characters written for the data, context or stack
+LINE_LENGTH = 120
+
+_repr = reprlib.Repr()
+_repr.maxlevel = 4
+_repr.maxdict = 100
+_repr.maxlist = 100
+_repr.maxtuple = 100
+_repr.maxset = 100
+_repr.maxstring = FIELD_LIMIT
+_repr.maxother = FIELD_LIMIT
+
+
+def _capped(value, limit: int = FIELD_LIMIT) -> str:
+    """
+    Render a value as text, without rendering more of it than will be kept.
+    """
+    if not isinstance(value, str):
+        if isinstance(value, Mapping):
+            value = dict(value)
+        value = _repr.repr(value) if isinstance(value, (dict, list, tuple, set)) else str(value)
+    if len(value) > limit:
+        value = value[:limit] + f"... ({len(value) - limit} characters not shown)"
+    return value
+
+
+def _wrap(text: str) -> str:
+    return "\n".join(fill(line, LINE_LENGTH) for line in text.splitlines())
+
+
+def render_error(
+    label: str,
+    name: str,
+    err: BaseException,
+    data,
+    context,
+    timestamp: datetime.datetime = None,
+    reference: str = None,
+    rule: str = "-",
+) -> str:
+    """
+    Render a failure as text for the error bin.
+
+    Parameters:
+        label: string
+            What failed, e.g. "operator"
+        name: string
+            The name of what failed
+        err: Exception
+            The error
+        data: any
+            The data which was being processed
+        context: dictionary
+            The context of the data
+        timestamp: datetime (optional)
+            When the failure happened, default now
+        reference: string (optional)
+            The reference the failure was reported with
+        rule: string (optional)
+            The character to draw the separating lines with
+    """
+    timestamp = timestamp or datetime.datetime.today()
+    stack = "".join(traceback.format_exception(type(err), err, err.__traceback__))
+
+    def _heading(title: str = "") -> str:
+        if not title:
+            return rule * LINE_LENGTH
+        title = f"  {title}  "
+        left = (LINE_LENGTH - len(title)) // 2
+        return rule * left + title + rule * (LINE_LENGTH - left - len(title))
+
+    lines = []
+    if reference:
+        lines.append(f"reference  : {reference}")
+    lines += [
+        f"timestamp  : {timestamp.isoformat()}",
+        f"{label:<11}: {name}",
+        f"error type : {type(err).__name__}",
+        f"details    : {_capped(err, LINE_LENGTH * 4)}",
+        _heading(),
+        _wrap(_capped(stack)),
+        _heading("context"),
+        _wrap(_capped(context)),
+        _heading("data"),
+        _wrap(_capped(data)),
+        _heading(),
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class ErrorSink:
+    """
+    Writes failures to an error writer in batches from a background thread.
+    """
+
+    def __init__(
+        self,
+        writer: Callable[[bytes], str],
+        batch_size: int = 100,
+        flush_interval: float = 5.0,
+        max_pending: int = 10000,
+    ):
+        """
+        Parameters:
+            writer: callable
+                Called with each batch of rendered failures, gzip-compressed
+            batch_size: integer (optional)
+                The most failures to write in each batch, default 100
+            flush_interval: float (optional)
+                The most seconds a failure waits to be written, default 5
+            max_pending: integer (optional)
+                The most failures waiting to be written, further failures are
+                only alerted, default 10000
+        """
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.written = 0
+        self.dropped = 0
+
+        self._pending: collections.deque = collections.deque()
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="flow-error-sink", daemon=True)
+        self._thread.start()
+
+    def submit(self, label: str, name: str, err: BaseException, data, context) -> str:
+        """
+        Queue a failure to be written, the failure is rendered when it is
+        written so the data and context must not be changed after this.
+
+        Returns:
+            The reference the failure will be written with
+        """
+        reference = random_string(16)
+        entry = (reference, datetime.datetime.today(), label, name, err, data, context)
+        with self._condition:
+            if self._closed or len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return "NOT LOGGED"
+            self._pending.append(entry)
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+        return reference
+
+    def flush(self):
+        """
+        Write all of the waiting failures now.
+        """
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self):
+        """
+        Write all of the waiting failures and stop the background thread.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+
+    def _take_batch(self) -> list:
+        with self._condition:
+            count = min(len(self._pending), self.batch_size)
+            return [self._pending.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._closed and len(self._pending) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                closed = self._closed
+            if closed:
+                return
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch: list):
+        try:
+            payload = "\n".join(
+                render_error(label, name, err, data, context, timestamp, reference)
+                for reference, timestamp, label, name, err, data, context in batch
+            )
+            with self._write_lock:
+                self.writer(gzip.compress(payload.encode()))
+            self.written += len(batch)
+        except Exception as err:
+            get_logger().error(
+                f"Problem writing to the error bin, {len(batch)} records have been lost. {type(err).__name__} - {err}"
+            )
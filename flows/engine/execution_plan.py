@@ -0,0 +1,150 @@
+"""
+Execution Plan
+
+The ExecutionPlan is the compiled, read-only form of a Flow which is used by
+the FlowRunner. It is built once, when the Flow is entered, so the work of
+finding entry points and outgoing links is done once per flow rather than
+for every record at every step.
+
+Steps are assigned integer slots in topological order; the operators and the
+outgoing links for each step are held in tuples indexed by slot, so routing a
+record to the next step is an index into a tuple.
+
+Where a step links to more than one step, the links are ordered longest
+estimated remaining critical path first, see `critical_path`.
+"""
+
+import heapq
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from flows.engine.critical_path import critical_paths
+from flows.engine.critical_path import step_costs
+from flows.engine.operator_fusion import FusedOperator
+from flows.engine.operator_fusion import find_fusable_chains
+from flows.exceptions import FlowError
+
+
+class ExecutionPlan:
+    """
+    Immutable, slot-indexed representation of a Flow.
+
+    Attributes:
+        names: Tuple[str]
+            The name of the step in each slot, slots are numbered in
+            topological order so this is also the topological order
+        operators: Tuple[BaseOperator]
+            The operator for the step in each slot
+        links: Tuple[Tuple[int]]
+            The slots of the outgoing links of each slot (the adjacency array),
+            ordered by the estimated remaining critical path of the target
+            step, longest first, then by the name of the target step
+        entry_points: Tuple[int]
+            The slots of the steps with no incoming links
+        critical_path: Tuple[float]
+            The estimated seconds per record from each slot to the end of the
+            flow, all zero when the plan has no step timings
+    """
+
+    __slots__ = ("names", "operators", "links", "entry_points", "critical_path")
+
+    def __init__(self, flow, fuse: bool = False, step_timings: Optional[Dict[str, float]] = None):
+        """
+        Compile a Flow into an ExecutionPlan.
+
+        Parameters:
+            flow: Flow
+                The flow to compile, the flow should have been validated
+            fuse: boolean (optional)
+                Combine runs of consecutive fusable steps into a single step,
+                the first slot of each run runs the whole run and links to the
+                steps after it, default is False
+            step_timings: dictionary (optional)
+                The seconds per record each step took in previous runs, used
+                to order the links of each step
+
+        Raises:
+            FlowError if a link refers to a step which has no operator, or the
+            flow is cyclic
+        """
+        names = self._topological_sort(flow)
+        slots = {name: slot for slot, name in enumerate(names)}
+
+        operators = []
+        for name in names:
+            operator = flow.get_operator(name)
+            if operator is None:
+                raise FlowError(f"Invalid Flow - Operator {name} is invalid")
+            operators.append(operator)
+
+        links = [tuple(slots[target] for target in flow.get_outgoing_links(name)) for name in names]
+        costs = step_costs(names, step_timings)
+
+        if fuse:
+            for chain in find_fusable_chains(operators, links):
+                operators[chain[0]] = FusedOperator([operators[slot] for slot in chain])
+                links[chain[0]] = links[chain[-1]]
+                costs[chain[0]] = sum(costs[slot] for slot in chain)
+
+        # links are already in name order, the sort is stable
+        paths = critical_paths(costs, links)
+        links = [tuple(sorted(targets, key=lambda target: -paths[target])) for targets in links]
+
+        object.__setattr__(self, "names", names)
+        object.__setattr__(self, "operators", tuple(operators))
+        object.__setattr__(self, "links", tuple(links))
+        object.__setattr__(
+            self, "entry_points", tuple(slots[name] for name in flow.get_entry_points())
+        )
+        object.__setattr__(self, "critical_path", paths)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ExecutionPlans are immutable, compile the flow again")
+
+    @property
+    def topological_order(self) -> Tuple[str, ...]:
+        """
+        The names of the steps, each step appears after all of its predecessors.
+        """
+        return self.names
+
+    def slot_of(self, name: str) -> int:
+        """
+        Get the slot of a step by name.
+
+        Parameters:
+            name: string
+                The name of the step
+        """
+        return self.names.index(name)
+
+    @staticmethod
+    def _topological_sort(flow) -> Tuple[str, ...]:
+        """
+        Order the steps of the flow using Kahn's algorithm, ties are broken by
+        the order steps were added to the flow so plans are deterministic.
+        """
+        # the flow already holds the links of each step as adjacency sets,
+        # linked steps which haven't been added are ordered so the flow's
+        # validation can report them
+        outgoing = flow._outgoing
+        names = list(flow.nodes)
+        names.extend(name for name in {**outgoing, **flow._incoming} if name not in flow.nodes)
+
+        incoming = {name: len(flow._incoming.get(name, ())) for name in names}
+        position = {name: i for i, name in enumerate(names)}
+        ready = [(position[name], name) for name in names if incoming[name] == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            _, name = heapq.heappop(ready)
+            order.append(name)
+            for target in outgoing.get(name, ()):
+                incoming[target] -= 1
+                if incoming[target] == 0:
+                    heapq.heappush(ready, (position[target], target))
+
+        if len(order) != len(names):
+            raise FlowError("Flow failed validation - Flows must be acyclic")
+        return tuple(order)
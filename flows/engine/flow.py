@@ -3,26 +3,198 @@ A Flow is a simplified Graph, this originally used NetworkX but it was replaced
 with a bespoke graph implementation as the NetworkX implementation was being
 monkey-patches to make it easier to use. The decision was made to write a
 specialized, albeit simple, graph library that didn't require monkey-patching.
+
+Edges are held as an insertion-ordered set, with the outgoing and incoming
+links of each step held as adjacency sets, so linking steps and finding the
+links of a step don't scan every edge in the flow.
 """
 
+import asyncio
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from typing import Optional
+
 from orso.logging import get_logger
 
+from flows.engine.async_flow_runner import AsyncFlowRunner
+from flows.engine.async_flow_runner import check_async_options
 from flows.engine.base_operator import BaseOperator
+from flows.engine.checkpoint import Checkpointer
+from flows.engine.checkpoint import CheckpointStore
+from flows.engine.critical_path import load_step_timings
+from flows.engine.critical_path import save_step_timings
+from flows.engine.error_sink import ErrorSink
+from flows.engine.execution_plan import ExecutionPlan
 from flows.engine.flow_runner import FlowRunner
+from flows.engine.flow_runner import wrapped_options
+from flows.engine.pipelined_flow_runner import PipelinedFlowRunner
+from flows.engine.step_cache import DEFAULT_CACHE_SIZE
+from flows.engine.step_cache import StepCache
+from flows.engine.tracing import TraceSink
 from flows.exceptions import FlowError
 
 logger = get_logger()
 
 
+def _event_loop_is_running() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
 class Flow:
-    def __init__(self):
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        branch_workers: Optional[int] = None,
+        partition_workers: Optional[int] = None,
+        partition_size: int = 1000,
+        pipeline_queue_size: Optional[int] = None,
+        fuse_steps: bool = False,
+        trace_path: Optional[str] = None,
+        profile_memory: bool = False,
+        deferred_retries: bool = False,
+        error_writer: Optional[Callable[[bytes], str]] = None,
+        error_batch_size: int = 100,
+        error_flush_interval: float = 5.0,
+        time_budget: Optional[float] = None,
+        checkpoint_path: Optional[str] = None,
+        checkpoint_interval: float = 60,
+        resume_run_id: Optional[str] = None,
+        cache_path: Optional[str] = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        timings_path: Optional[str] = None,
+        definition: Optional[dict] = None,
+    ):
         """
         Flow represents Directed Acyclic Graphs which are used to describe data
         pipelines.
+
+        Parameters:
+            batch_size: integer (optional)
+                When set, the flow runs in batch mode, source steps yield Arrow
+                batches of up to this many records rather than one dictionary
+                per record.
+            branch_workers: integer (optional)
+                When set, where a step links to more than one step the branches
+                are run in parallel in a pool of this many threads. This helps
+                when branches are I/O bound, such as saving to different
+                targets.
+            partition_workers: integer (optional)
+                When set, the records from the first step are split into
+                partitions which are run through the rest of the flow in a pool
+                of this many processes. Requires the definition of the flow so
+                the workers can build their own copies of the operators.
+            partition_size: integer (optional)
+                The number of records (or batches in batch mode) in each
+                partition, default is 1000.
+            pipeline_queue_size: integer (optional)
+                When set, each step of a linear flow runs in its own thread
+                with queues of this many records between the steps.
+            fuse_steps: boolean (optional)
+                Combine runs of consecutive fusable steps into a single step
+                when the flow is compiled, default is False.
+            trace_path: string (optional)
+                When set, the spans of sampled runs are written to this file
+                as Chrome trace events, see `trace_sample_rate` on the runner.
+            profile_memory: boolean (optional)
+                Measure the memory allocated by each step with `tracemalloc`
+                and report it in the sensors, steps aren't fused when memory
+                is being profiled, default is False.
+            deferred_retries: boolean (optional)
+                Park records which fail to be retried once their wait is over,
+                processing other records in the meantime, rather than waiting
+                before retrying them, default is False. Not used by pipelined
+                flows.
+            error_writer: callable (optional)
+                When set, records which fail every retry are written to this in
+                gzip-compressed batches from a background thread, rather than
+                by each Operator's `error_writer` as they fail.
+            error_batch_size: integer (optional)
+                The most failed records in each batch, default is 100.
+            error_flush_interval: float (optional)
+                The most seconds a failed record waits to be written, default
+                is 5.
+            time_budget: float (optional)
+                The most seconds each run of the flow can take, checked between
+                records, the run is stopped with TimeExceeded if it takes
+                longer. Steps can have their own `time_budget`.
+            checkpoint_path: string (optional)
+                When set, checkpoints of each run are saved in this folder so
+                runs which fail can be resumed.
+            checkpoint_interval: float (optional)
+                The least seconds between checkpoints, default is 60.
+            resume_run_id: string (optional)
+                Resume this run from its last checkpoint, rather than starting a
+                new run. Requires `checkpoint_path`.
+            cache_path: string (optional)
+                When set, the output of steps configured with `cache` is saved
+                in this folder and replayed when the step is given the same
+                input again.
+            cache_size: integer (optional)
+                The most bytes the cache holds before the least recently used
+                outputs are removed, default is 1GB.
+            timings_path: string (optional)
+                When set, the time each step takes per record is saved to this
+                file after each run, and where a step links to more than one
+                step, the branches estimated to take longest are run first.
+            definition: dictionary (optional)
+                The pipeline definition the flow was built from, as returned by
+                `FlowModel.to_dict`.
         """
         self.nodes = {}
         self.edges = []
         self.has_run = False
+        self.batch_size = batch_size
+        self.branch_workers = branch_workers
+        self.partition_workers = partition_workers
+        self.partition_size = partition_size
+        self.pipeline_queue_size = pipeline_queue_size
+        self.fuse_steps = fuse_steps
+        self.trace_path = trace_path
+        self.profile_memory = profile_memory
+        self.deferred_retries = deferred_retries
+        self.error_writer = error_writer
+        self.error_batch_size = error_batch_size
+        self.error_flush_interval = error_flush_interval
+        self.time_budget = time_budget
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.resume_run_id = resume_run_id
+        self.cache_path = cache_path
+        self.cache_size = cache_size
+        self.timings_path = timings_path
+        self.definition = definition
+        self.plan = None
+        self.executor = None
+        self.process_pool = None
+        self.trace_sink = None
+        self.error_sink = None
+        self.checkpointer = None
+        self.resumed_checkpoint = None
+        self.step_cache = None
+        self.step_timings = None
+        self._started_tracemalloc = False
+
+    @property
+    def edges(self) -> tuple:
+        """
+        The (source, target) links between steps, in the order they were added.
+        This is a snapshot, steps are linked with `link_steps`.
+        """
+        return tuple(self._edges)
+
+    @edges.setter
+    def edges(self, edges):
+        self._edges: dict = {}
+        self._outgoing: dict = {}
+        self._incoming: dict = {}
+        for source, target in edges:
+            self.link_steps(source, target)
 
     def add_step(self, name, operator):
         """
@@ -47,8 +219,10 @@ class Flow:
                 The name of the target step
         """
         edge = (source_operator, target_operator)
-        if edge not in self.edges:
-            self.edges.append((source_operator, target_operator))
+        if edge not in self._edges:
+            self._edges[edge] = None
+            self._outgoing.setdefault(source_operator, {})[target_operator] = None
+            self._incoming.setdefault(target_operator, {})[source_operator] = None
 
     def get_outgoing_links(self, name):
         """
@@ -58,42 +232,68 @@ class Flow:
             name: string
                 The name of the step to search from
         """
-        retval = {target for source, target in self.edges if source == name}
-        return sorted(retval)
+        return sorted(self._outgoing.get(name, ()))
+
+    def get_incoming_links(self, name):
+        """
+        Get the names of incoming links to a given step, in the order they
+        were linked.
+
+        Paramters:
+            name: string
+                The name of the step to search to
+        """
+        return list(self._incoming.get(name, ()))
 
     def get_exit_points(self):
         """
         Get steps in the flow with no outgoing steps.
         """
-        sources = {source for source, target in self.edges}
-        retval = {target for source, target in self.edges if target not in sources}
-        return sorted(retval)
+        return sorted(name for name in self._incoming if name not in self._outgoing)
 
     def get_entry_points(self):
         """
         Get steps in the flow with no incoming steps.
         """
-        targets = {target for source, target in self.edges}
-        retval = {source for source, target in self.edges if source not in targets}
-        return sorted(retval)
+        return sorted(name for name in self._outgoing if name not in self._incoming)
 
     def is_acyclic(self):
-        # cycle over the graph removing a layer of exits each cycle
-        # if we have nodes but no exists, we're cyclic
-        my_edges = self.edges.copy()
-
-        while len(my_edges) > 0:
-            # find all of the exits
-            sources = {source for source, target in my_edges}
-            exits = {target for source, target in my_edges if target not in sources}
+        return self.find_cycle() is None
 
-            if len(exits) == 0:
-                return False
+    def find_cycle(self):
+        """
+        Find a cycle in the flow, using Kahn's algorithm to remove the steps
+        which aren't part of a cycle.
 
-            # remove the exits
-            new_edges = [(source, target) for source, target in my_edges if target not in exits]
-            my_edges = new_edges
-        return True
+        Returns:
+            The names of the steps in a cycle, starting and ending with the
+            same step, or None if the flow is acyclic
+        """
+        incoming = {name: len(sources) for name, sources in self._incoming.items()}
+        ready = [name for name in self._outgoing if name not in incoming]
+        while ready:
+            name = ready.pop()
+            for target in self._outgoing.get(name, ()):
+                incoming[target] -= 1
+                if incoming[target] == 0:
+                    ready.append(target)
+
+        remaining = {name for name, count in incoming.items() if count}
+        if not remaining:
+            return None
+        # every remaining step has a link from another remaining step, so
+        # walking those links backwards must come back to a step it has seen
+        name = min(remaining)
+        seen: dict = {}
+        while name not in seen:
+            seen[name] = len(seen)
+            name = min(source for source in self._incoming[name] if source in remaining)
+        cycle = list(seen)[seen[name] :]
+        cycle.reverse()
+        # start from the first step by name, so the same cycle is always reported the same way
+        start = cycle.index(min(cycle))
+        cycle = cycle[start:] + cycle[:start]
+        return [*cycle, cycle[0]]
 
     def get_operator(self, name):
         """
@@ -114,8 +314,8 @@ class Flow:
                 The flow to assimilate into the current flows
         """
         self.nodes = {**self.nodes, **assimilatee.nodes}
-        self.edges += assimilatee.edges
-        self.edges = list(set(self.edges))
+        for source, target in assimilatee.edges:
+            self.link_steps(source, target)
 
     def _validate_flow(self):
         from flows.engine import EndOperator
@@ -131,33 +331,199 @@ class Flow:
             raise FlowError("Flow failed validation - Flows must end with an EndOperator")
 
         # flows must be acyclic
-        if not self.is_acyclic():
-            raise FlowError("Flow failed validation - Flows must be acyclic")
+        cycle = self.find_cycle()
+        if cycle is not None:
+            raise FlowError(
+                f"Flow failed validation - Flows must be acyclic, found cycle {' -> '.join(cycle)}"
+            )
 
     def __enter__(self):
+        if (
+            any(getattr(op, "_async_execute", False) for op in self.nodes.values())
+            and _event_loop_is_running()
+        ):
+            # the steps would be run with asyncio.run, which can't be called
+            # from the running loop
+            raise FlowError(
+                "Flows with async steps must be entered with `async with` when in a coroutine."
+            )
+        return self._enter()
+
+    async def __aenter__(self):
+        """
+        Enter the flow from a coroutine, returning an AsyncFlowRunner.
+        """
+        check_async_options(self)
+        self._enter()
+        return AsyncFlowRunner(self)
+
+    def _enter(self):
         if self.has_run:
             raise FlowError(
                 "Flows can only have a single runner, either loop after creating the runner or build the flow again."
             )
         self._validate_flow()
+        for name, operator in self.nodes.items():
+            if getattr(operator, "needs_producer", False):
+                # tell steps such as joins which steps link to them, the steps
+                # which link to them name themselves on each record, so can't
+                # be fused into other steps
+                operator.input_steps = tuple(self.get_incoming_links(name))
+                for source in operator.input_steps:
+                    self.nodes[source].fusable = False
+        if self.pipeline_queue_size:
+            # pipelined steps are called directly from their own threads
+            unsupported = wrapped_options(self)
+            if unsupported:
+                raise FlowError(f"Pipelined flows can't use {', '.join(unsupported)}.")
+        partitioned = bool(self.partition_workers and self.partition_workers > 1)
+        has_joins = any(getattr(op, "input_steps", ()) for op in self.nodes.values())
+        if partitioned:
+            if self.definition is None:
+                raise FlowError(
+                    "Flows can only be partitioned over processes when built from a definition."
+                )
+            if len(self.get_entry_points()) != 1:
+                raise FlowError("Flows can only be partitioned when they have one entry point.")
+            if has_joins:
+                raise FlowError(
+                    "Flows with joins can't be partitioned, each partition would only join its own records."
+                )
+        if self.checkpoint_path:
+            # checkpoints rely on records being run through the flow in order
+            if partitioned:
+                raise FlowError("Partitioned flows can't be checkpointed.")
+            # joins hold records until their inputs have finished
+            if has_joins:
+                raise FlowError("Flows with joins can't be checkpointed.")
+        elif self.resume_run_id:
+            raise FlowError("Runs can only be resumed when the flow has a checkpoint_path.")
+
+        if self.cache_path:
+            self.step_cache = StepCache(self.cache_path, max_bytes=self.cache_size)
+            # the runner caches the steps it calls, so don't fuse cached steps
+            for operator in self.nodes.values():
+                if getattr(operator, "cache_outputs", False):
+                    operator.fusable = False
+        if self.timings_path:
+            self.step_timings = load_step_timings(self.timings_path)
+        # freeze the graph, the runners only use the compiled plan
+        # memory is attributed to, and parked records are retried by, the
+        # steps the runner calls, so don't fuse steps for either
+        self.plan = ExecutionPlan(
+            self,
+            fuse=self.fuse_steps and not (self.profile_memory or self.deferred_retries),
+            step_timings=self.step_timings,
+        )
+        if self.batch_size:
+            for operator in self.nodes.values():
+                operator.batch_size = self.batch_size
+
+        # the options are valid, anything started from here is shut down if
+        # entering the flow fails, as __exit__ won't be called
+        try:
+            self._start(partitioned)
+        except BaseException:
+            self._shut_down()
+            raise
+        if self.pipeline_queue_size:
+            return PipelinedFlowRunner(self, queue_size=self.pipeline_queue_size)
         return FlowRunner(self)
 
+    def _start(self, partitioned: bool):
+        """
+        Start the profiler, pools and sinks the flow's options need.
+        """
+        if self.profile_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self.branch_workers and self.branch_workers > 1:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.branch_workers, thread_name_prefix="flow-branch"
+            )
+        if partitioned:
+            self.process_pool = ProcessPoolExecutor(max_workers=self.partition_workers)
+        if self.checkpoint_path:
+            self.checkpointer = Checkpointer(
+                CheckpointStore(self.checkpoint_path), self, interval=self.checkpoint_interval
+            )
+            for operator in self.nodes.values():
+                operator.checkpointing = True
+            if self.resume_run_id:
+                self.resumed_checkpoint = self.checkpointer.restore(self.resume_run_id)
+        if self.trace_path:
+            self.trace_sink = TraceSink(self.trace_path)
+        if self.error_writer is not None:
+            self.error_sink = ErrorSink(
+                self.error_writer,
+                batch_size=self.error_batch_size,
+                flush_interval=self.error_flush_interval,
+            )
+            for operator in self.nodes.values():
+                operator.error_sink = self.error_sink
+        if self.deferred_retries:
+            for operator in self.nodes.values():
+                operator.defer_retries = True
+
+    def _shut_down(self):
+        """
+        Shut down the pools, sinks and profiler started by `_start`.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=True)
+            self.process_pool = None
+        if self.trace_sink is not None:
+            self.trace_sink.close()
+            self.trace_sink = None
+        if self.error_sink is not None:
+            self.error_sink.close()
+            self.error_sink = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
     def __exit__(self, exc_type, exc_value, exc_traceback):
         """
         Finalize concludes the flow and returns the sensor information
         """
+        FlowRunner(self)(BaseOperator.sigterm, self._closing_context(exc_type))
+        self._finish()
+
+    async def __aexit__(self, exc_type, exc_value, exc_traceback):
+        """
+        Finalize the flow from a coroutine, the steps are shut down on the
+        running event loop.
+        """
+        await AsyncFlowRunner(self)(BaseOperator.sigterm, self._closing_context(exc_type))
+        self._finish()
+
+    @staticmethod
+    def _closing_context(exc_type) -> dict:
         # determine if we're closing because we had an error condition
         context = {}
         has_failure = False
         if exc_type:
             has_failure = exc_type.__name__ in ("SystemExit", "TimeExceeded")
         context["mabel:errored"] = has_failure
+        return context
 
-        FlowRunner(self)(BaseOperator.sigterm, context)
+    def _finish(self):
+        """
+        Shut down what the flow started and write the sensors to the audit log.
+        """
+        self._shut_down()
         for operator_name in self.nodes:
             operator = self.get_operator(operator_name)
             if operator:
                 logger.audit(operator.read_sensors())
+        if self.timings_path:
+            try:
+                save_step_timings(self.timings_path, self, self.step_timings)
+            except OSError as err:
+                logger.warning(f"Unable to save step timings - {err}")
         self.has_run = True
 
     def __repr__(self):
@@ -1,17 +1,236 @@
-import datetime
+import random
+import threading
+import time
+from concurrent.futures import ALL_COMPLETED
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import wait
 
 from orso.logging import get_logger
 from orso.tools import random_string
 
-from flows.exceptions import FlowError
+from flows.engine.base_operator import PRODUCER
+from flows.engine.base_operator import SIGTERM
+from flows.engine.base_operator import iterate_outcomes
+from flows.engine.context import Context
+from flows.engine.error_sink import render_error
+from flows.engine.execution_plan import ExecutionPlan
+from flows.engine.memory_profiler import MemoryProfiledOperator
+from flows.engine.retry_scheduler import ParkedRecord
+from flows.engine.retry_scheduler import RetryScheduler
+from flows.engine.step_cache import CachedOperator
+from flows.engine.tracing import TracedOperator
 from flows.exceptions import TimeExceeded
 
 
+def _run_partition(
+    definition: dict, entry_name: str, records: list, deadline: float = None
+) -> dict:
+    """
+    Run a partition of records through a copy of the flow, built from its
+    definition, starting from the steps after the entry step. This runs in a
+    worker process.
+
+    The partition is stopped with `TimeExceeded` when it passes the deadline
+    of the run, or a step goes over its time budget in this partition.
+
+    Returns:
+        The sensor state of each of the operators in the copy of the flow
+    """
+    from flows.models import FlowModel
+
+    flow = FlowModel.from_dict(definition).runner()
+    flow.partition_workers = None  # the copy runs in this process
+    # the parent writes the trace, opening it here would truncate it
+    flow.trace_path = None
+    runner = flow.__enter__()
+    # the monotonic clock is shared by the processes on a machine, so the
+    # deadline set by the parent holds here
+    runner.deadline = deadline
+    runner._check_budgets = deadline is not None or any(runner.step_budgets)
+    try:
+        links = runner.plan.links[runner.plan.slot_of(entry_name)]
+        for data, context in records:
+            for slot in links:
+                runner._inner_runner(slot=slot, data=data, context=context.copy())
+        runner._run_retries(runner.operators, wait=True)
+    finally:
+        if flow.executor is not None:
+            flow.executor.shutdown(wait=True)
+    return {
+        name: operator.sensor_state() for name, operator in flow.nodes.items() if name != entry_name
+    }
+
+
+def wrapped_options(flow) -> list:
+    """
+    The options set on the flow which the FlowRunner honours by wrapping the
+    steps it calls, by watching the run as a whole or by scheduling records
+    itself. Runners which call the steps directly can't run flows using them.
+    """
+    options = [
+        option
+        for option in (
+            "time_budget",
+            "trace_path",
+            "profile_memory",
+            "checkpoint_path",
+            "deferred_retries",
+        )
+        if getattr(flow, option, None)
+    ]
+    if (getattr(flow, "partition_workers", None) or 0) > 1:
+        options.append("partition_workers")
+    operators = flow.nodes.values()
+    if any(getattr(op, "time_budget_ns", None) is not None for op in operators):
+        options.append("step time_budget")
+    if getattr(flow, "cache_path", None) and any(
+        getattr(op, "cache_outputs", False) for op in operators
+    ):
+        options.append("cache")
+    if any(getattr(op, "needs_producer", False) for op in operators):
+        options.append("joins")
+    return options
+
+
+# set in threads running a branch, so branches fan out to the pool only once
+_branch_state = threading.local()
+
+
+class _SerializedOperator:
+    """
+    Wraps an Operator so only one thread runs it at a time.
+
+    When branches run in parallel, steps where branches meet (such as the end
+    step) can be reached from more than one thread. The lock is held while
+    the Operator is called and while each record is taken from generators it
+    returns, but not while downstream steps process those records.
+    """
+
+    __slots__ = ("operator", "lock")
+
+    def __init__(self, operator):
+        self.operator = operator
+        self.lock = threading.Lock()
+
+    def __call__(self, data, context):
+        with self.lock:
+            outcome = self.operator(data, context)
+        if type(outcome).__name__ == "generator":
+            return self._serialized_records(outcome)
+        return outcome
+
+    def retry(self, parked):
+        with self.lock:
+            outcome = self.operator.retry(parked)
+        if type(outcome).__name__ == "generator":
+            return self._serialized_records(outcome)
+        return outcome
+
+    def _serialized_records(self, outcome):
+        while True:
+            with self.lock:
+                record = next(outcome, None)
+            if record is None:
+                return
+            yield record
+
+
+class _ProducerTaggedOperator:
+    """
+    Wraps an Operator which links to a step that needs to know which step each
+    record came from (such as a join), adding the name of the step to the
+    context of each record the Operator returns.
+    """
+
+    __slots__ = ("operator", "name")
+
+    def __init__(self, operator, name):
+        self.operator = operator
+        self.name = name
+
+    def __call__(self, data, context):
+        return self._tagged(self.operator(data, context))
+
+    def retry(self, parked):
+        return self._tagged(self.operator.retry(parked))
+
+    def _tagged(self, outcome):
+        if not outcome or type(outcome) is ParkedRecord:
+            return outcome
+        if type(outcome).__name__ == "generator":
+            return self._tagged_records(outcome)
+        if type(outcome) is list:
+            return [self._tag(record) for record in outcome]
+        return self._tag(outcome)
+
+    def _tagged_records(self, outcome):
+        for record in outcome:
+            yield self._tag(record)
+
+    def _tag(self, record):
+        record[1][PRODUCER] = self.name
+        return record
+
+
 class FlowRunner:
     def __init__(self, flow):
         self.flow = flow
+        # use the plan compiled when the flow was entered, runners created
+        # directly from a flow compile their own
+        profile_memory = getattr(flow, "profile_memory", False)
+        deferred_retries = getattr(flow, "deferred_retries", False)
+        self.plan = flow.plan or ExecutionPlan(
+            flow,
+            fuse=getattr(flow, "fuse_steps", False) and not (profile_memory or deferred_retries),
+        )
         self.cycles = 0
 
+        # records parked by operators to be retried later in the run
+        self.retries = RetryScheduler()
+        self._running_retries = False
+
+        self.operators = self.plan.operators
+        step_cache = getattr(flow, "step_cache", None)
+        if step_cache is not None:
+            self.operators = tuple(
+                CachedOperator(op, step_cache) if getattr(op, "cache_outputs", False) else op
+                for op in self.operators
+            )
+        if profile_memory:
+            self.operators = tuple(MemoryProfiledOperator(op) for op in self.operators)
+
+        # steps which link to a step which needs to know where records came
+        # from name themselves in the context of the records they return
+        plan_operators = self.plan.operators
+        self.operators = tuple(
+            (
+                _ProducerTaggedOperator(op, name)
+                if any(getattr(plan_operators[t], "needs_producer", False) for t in links)
+                else op
+            )
+            for op, name, links in zip(self.operators, self.plan.names, self.plan.links)
+        )
+
+        # when the flow has a pool for running branches in parallel, make
+        # sure each operator is only run by one thread at a time
+        self.executor = getattr(flow, "executor", None)
+        if self.executor is not None:
+            self.operators = tuple(_SerializedOperator(op) for op in self.operators)
+
+        # runs are only traced when the flow has somewhere to write the spans
+        self.trace_sink = getattr(flow, "trace_sink", None)
+
+        # time budgets for each run of the flow, and for each step
+        self.time_budget = getattr(flow, "time_budget", None)
+        self.deadline = None
+        self.step_budgets = tuple(self._step_budgets(slot) for slot in range(len(self.plan.names)))
+        self._check_budgets = False
+
+        # checkpoints, and the checkpoint the first run is resuming from
+        self.checkpointer = getattr(flow, "checkpointer", None)
+        self._resuming = getattr(flow, "resumed_checkpoint", None)
+        self._checkpoint_run_id = None
+
     def __call__(
         self, data: dict = None, context: dict = None, trace_sample_rate: float = 1 / 1000
     ):
@@ -25,76 +244,370 @@ class FlowRunner:
             context: dictionary (optional)
                 Additional information to support the processing of the data
             trace_sample_rate: float (optional)
-                The sample for for to emit trace messages for, default is
-                1/1000.
+                The proportion of runs to record trace spans for, default is
+                1/1000. Runs are only traced when the flow has a trace sink.
         """
         if not context:
             context = {}
 
+        is_sigterm = isinstance(data, str) and data == SIGTERM
+
+        # a resumed run continues with the run_id of the run it is resuming
+        resuming, self._resuming = (None, self._resuming) if is_sigterm else (self._resuming, None)
+        if resuming is not None:
+            if resuming["complete"]:
+                get_logger().warning(f"Run {resuming['run_id']} has already completed.")
+                return
+            context["run_id"] = resuming["run_id"]
+
         # create a run_id for the message if it doesn't already have one
         if not context.get("run_id"):
             context["run_id"] = str(random_string(32))
 
+        # copies of the context made for each edge are Contexts too
+        if not isinstance(context, Context):
+            context = Context(context)
+
+        # checkpoints aren't saved when the flow is being shut down
+        self._checkpoint_run_id = None
+        if self.checkpointer is not None and not is_sigterm:
+            self._checkpoint_run_id = context["run_id"]
+
+        # budgets aren't checked when the flow is being shut down
+        self.deadline = None
+        if self.time_budget and not is_sigterm:
+            self.deadline = time.monotonic() + self.time_budget
+        self._check_budgets = not is_sigterm and (
+            self.deadline is not None or any(self.step_budgets)
+        )
+
+        operators = None
+        sampled = random.random() < trace_sample_rate  # nosec - not for security
+        if self.trace_sink is not None and not is_sigterm and sampled:
+            operators = self._traced_operators(context["run_id"])
+
         try:
-            # start the flow, walk from the nodes with no incoming links
-            for operator_name in self.flow.get_entry_points():
-                self._inner_runner(operator_name=operator_name, data=data, context=context)
+            if self.flow.process_pool is not None and not is_sigterm:
+                self._partitioned_runner(data=data, context=context, operators=operators)
+            else:
+                # start the flow, walk from the nodes with no incoming links
+                for slot in self.plan.entry_points:
+                    self._inner_runner(slot=slot, data=data, context=context, operators=operators)
+            # the run is complete when every parked record has been retried
+            self._run_retries(operators or self.operators, wait=True)
+            if self._checkpoint_run_id is not None:
+                self.checkpointer.save(self._checkpoint_run_id, complete=True)
         except TimeExceeded as te:
+            get_logger().alert(f"FLOW STOPPED - {te} ({context.get('run_id')})")
             raise te
         except (Exception, SystemExit) as err:
-            if hasattr(self, "error_writer"):
+            error_sink = getattr(self.flow, "error_sink", None)
+            if error_sink is not None:
+                error_sink.submit("location", "flow_runner", err, data, context)
+            elif hasattr(self, "error_writer"):
                 error_log_reference = "NOT LOGGED"
                 try:
-                    error_payload = (
-                        f"timestamp  : {datetime.datetime.today().isoformat()}\n"
-                        f"location   : flow_runner\n"
-                        f"error type : {type(err).__name__}\n"
-                        f"details    : {err}\n"
-                        "========================================================================================================================\n"
-                        f"{wrap_text('render_error_stack()', 120)}\n"
-                        "=======================================================  context  ======================================================\n"
-                        f"{wrap_text(str(context), 120)}\n"
-                        "========================================================  data  ========================================================\n"
-                        f"{wrap_text(str(data), 120)}\n"
-                        "========================================================================================================================\n"
+                    error_log_reference = self.error_writer(  # type: ignore
+                        render_error("location", "flow_runner", err, data, context, rule="=")
                     )
-                    error_log_reference = self.error_writer(  # type:ignore
-                        error_payload
-                    )  # type:ignore
                 except:
                     # if we have a uncaught failure, make sure it's logged
-                    get_logger().alert(  # type:ignore
+                    get_logger().alert(  # type: ignore
                         f"FLOW ABEND - {type(err).__name__} - {err} ({error_log_reference})"
                     )
             raise err
 
-    def _inner_runner(self, operator_name: str = None, data: dict = None, context: dict = None):
+    def _step_budgets(self, slot: int):
         """
-        Walk the dag/flow by:
-        - Getting the function of the current node
-        - Execute the function, wrapped in the base class
-        - Find the next step by finding outgoing edges
-        - Call this method for the next step
+        The names, operators and time budgets (in ns) of the operators in a
+        slot of the plan which have time budgets, fused slots can have more
+        than one operator.
         """
-        self.cycles += 1
+        operator = self.plan.operators[slot]
+        if hasattr(operator, "operators"):
+            steps = [(inner.name, inner) for inner in operator.operators]
+        else:
+            steps = [(self.plan.names[slot], operator)]
+        return tuple(
+            (name, step, step.time_budget_ns)
+            for name, step in steps
+            if getattr(step, "time_budget_ns", None) is not None
+        )
+
+    def _check_time_budgets(self, slot: int):
+        """
+        Stop the run if it has run out of time, or the step in the slot has.
+        """
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise TimeExceeded(f"Flow exceeded its time budget of {self.time_budget} seconds")
+        for name, step, budget_ns in self.step_budgets[slot]:
+            if step.execution_time_ns > budget_ns:
+                raise TimeExceeded(
+                    f"Step '{name}' exceeded its time budget of {budget_ns / 1e9} seconds, "
+                    f"after {step.execution_time_ns / 1e9:.3f} seconds"
+                )
+
+    def _traced_operators(self, run_id):
+        """
+        The operators for this run, wrapped to record a trace span each time
+        they are called.
+        """
+        return tuple(
+            TracedOperator(operator, name, self.trace_sink, run_id)
+            for operator, name in zip(self.operators, self.plan.names)
+        )
+
+    def _inner_runner(
+        self, slot: int = None, data: dict = None, context: dict = None, operators: tuple = None
+    ):
+        """
+        Walk the dag/flow depth-first, without recursion, by:
+        - Getting the operator in the current slot of the plan
+        - Execute the operator, wrapped in the base class
+        - Find the next steps from the plan's outgoing links for the slot
+        - Continue with the next step, or if the step returned more than one
+          record or has more than one outgoing edge, push the outstanding
+          work onto a stack and take the first item
+
+        Working from the top of the stack means each record reaches the end of
+        the flow before the next record is requested from the step that
+        created it, the same order as walking the flow recursively.
+
+        Traced runs pass in the traced copies of the operators.
+
+        Records parked by operators to be retried are retried between records
+        once they are due, by the thread running the flow.
+
+        Time budgets are checked after each step is called and each record is
+        taken from a step, when a budget is exceeded the generators which are
+        part way through are closed so their time is recorded.
+
+        Checkpoints are saved before records are taken from the first step,
+        when all of the records it has produced have been through the flow.
+        """
+        if operators is None:
+            operators = self.operators
+        links = self.plan.links
+        in_branch = getattr(_branch_state, "active", False)
+        fan_out_to_pool = self.executor is not None and not in_branch
+        retries = self.retries.heap
+        run_retries = not in_branch and not self._running_retries
+        check_budgets = self._check_budgets
+        checkpoint_run_id = self._checkpoint_run_id if run_retries else None
+
+        # each entry on the stack is an iterable of (data, context) records, the
+        # slots of the steps each of those records is to be passed to, and the
+        # slot of the step which produced them
+        stack: list = []
         if not context:
             context = {}
 
-        operator = self.flow.get_operator(operator_name)
-        if operator is None:
-            raise FlowError(f"Invalid Flow - Operator {operator_name} is invalid")
-        out_going_links = self.flow.get_outgoing_links(operator_name)
-
-        outcome = operator(data, context)
-
-        if outcome:
-            if not type(outcome).__name__ in ["generator", "list"]:
-                outcome_data, outcome_context = outcome
-                outcome = [(outcome_data, outcome_context)]
-            for outcome_data, outcome_context in outcome:
-                for op_name in out_going_links:
-                    self._inner_runner(
-                        operator_name=op_name,
-                        data=outcome_data,
-                        context=outcome_context.copy(),
+        try:
+            while True:
+                while slot is not None:
+                    self.cycles += 1
+
+                    out_going_links = links[slot]
+                    outcome = operators[slot](data, context)
+                    current_slot, slot = slot, None
+                    if check_budgets:
+                        self._check_time_budgets(current_slot)
+
+                    if not outcome:
+                        continue
+                    if type(outcome).__name__ not in ["generator", "list"]:
+                        if type(outcome) is ParkedRecord:
+                            self.retries.park(current_slot, outcome)
+                            continue
+                        if len(out_going_links) == 1:
+                            # the common case, a single record to a single step,
+                            # continue without touching the stack
+                            data, outcome_context = outcome
+                            context = outcome_context.copy()
+                            slot = out_going_links[0]
+                            continue
+                        outcome = [outcome]
+                    if out_going_links:
+                        stack.append((iter(outcome), out_going_links, current_slot))
+                    else:
+                        # generators are run to completion, even at the end of the flow
+                        for _ in outcome:
+                            pass
+
+                if run_retries and retries:
+                    self._run_retries(operators)
+
+                # take the next piece of outstanding work from the top of the stack
+                while stack:
+                    if (
+                        checkpoint_run_id is not None
+                        and len(stack) == 1
+                        and not retries
+                        and self.checkpointer.due()
+                    ):
+                        self.checkpointer.save(checkpoint_run_id)
+                    outcomes, out_going_links, producer = stack[-1]
+                    record = next(outcomes, None)
+                    if check_budgets:
+                        self._check_time_budgets(producer)
+                    if record is None:
+                        stack.pop()
+                        continue
+                    if fan_out_to_pool and len(out_going_links) > 1:
+                        self._run_branches(record, out_going_links, operators)
+                        continue
+                    if len(out_going_links) > 1:
+                        # come back for the other edges once this edge is complete
+                        stack.append((iter([record]), out_going_links[1:], producer))
+                    slot = out_going_links[0]
+                    data, outcome_context = record
+                    context = outcome_context.copy()
+                    break
+
+                if slot is None:
+                    return
+        except TimeExceeded:
+            for outcomes, _, _ in reversed(stack):
+                close = getattr(outcomes, "close", None)
+                if close is not None:
+                    close()
+            raise
+
+    def _run_retries(self, operators: tuple, wait: bool = False):
+        """
+        Retry the parked records which are due, and pass the records returned
+        to the next steps.
+
+        Parameters:
+            operators: tuple
+                The operators for the run
+            wait: boolean (optional)
+                Wait for every parked record to be retried, rather than only
+                those which are already due, default False
+        """
+        links = self.plan.links
+        self._running_retries = True
+        try:
+            while True:
+                if (
+                    wait
+                    and self.deadline is not None
+                    and self.retries.heap
+                    and self.retries.heap[0][0] > self.deadline
+                ):
+                    raise TimeExceeded(
+                        f"Flow exceeded its time budget of {self.time_budget} seconds, "
+                        "waiting to retry records"
                     )
+                due = self.retries.pop_due(wait=wait)
+                if due is None:
+                    return
+                slot, parked = due
+                outcome = operators[slot].retry(parked)
+                if type(outcome) is ParkedRecord:
+                    self.retries.park(slot, outcome)
+                    continue
+                for data, context in iterate_outcomes(outcome):
+                    for next_slot in links[slot]:
+                        self._inner_runner(
+                            slot=next_slot, data=data, context=context.copy(), operators=operators
+                        )
+        finally:
+            self._running_retries = False
+
+    def _run_branches(self, record, out_going_links, operators=None):
+        """
+        Run each of the branches for a record in the flow's thread pool.
+
+        All of the branches are waited on before continuing, the branches are
+        joined in the order of the links so if more than one branch fails the
+        error from the first is raised.
+        """
+
+        def _branch(slot, data, context):
+            _branch_state.active = True
+            try:
+                self._inner_runner(slot=slot, data=data, context=context, operators=operators)
+            finally:
+                _branch_state.active = False
+
+        data, context = record
+        futures = [
+            self.executor.submit(_branch, slot, data, context.copy()) for slot in out_going_links
+        ]
+        errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+
+    def _partitioned_runner(self, data: dict = None, context: dict = None, operators: tuple = None):
+        """
+        Run the first step of the flow in this process, and the rest of the
+        flow over partitions of its records in the flow's process pool.
+
+        The number of partitions waiting to be run is limited so the records
+        read by the first step are not all held in memory at once. Sensors
+        from the copies of the operators in the worker processes are merged
+        into this flow's operators as each partition completes.
+
+        Only the first step is traced in traced runs, the worker processes
+        don't trace their partitions.
+
+        Workers stop at the deadline of the run, and waits for them are
+        limited to the time remaining. Step budgets are checked in each
+        worker, and against the merged sensors as each partition completes.
+        """
+        flow = self.flow
+        entry = self.plan.entry_points[0]
+        entry_name = self.plan.names[entry]
+        max_pending = flow.partition_workers * 2
+
+        def _submit(partition):
+            pending.add(
+                flow.process_pool.submit(
+                    _run_partition, flow.definition, entry_name, partition, self.deadline
+                )
+            )
+
+        def _wait(pending, return_when):
+            timeout = None
+            if self.deadline is not None:
+                timeout = max(self.deadline - time.monotonic(), 0)
+            done, pending = wait(pending, timeout=timeout, return_when=return_when)
+            try:
+                for future in done:
+                    for name, state in future.result().items():
+                        flow.get_operator(name).merge_sensor_state(state)
+                if self._check_budgets:
+                    for slot in range(len(self.plan.names)):
+                        self._check_time_budgets(slot)
+            except (Exception, SystemExit):
+                # partitions which haven't started yet aren't run
+                for future in pending:
+                    future.cancel()
+                raise
+            return pending
+
+        self.cycles += 1
+        operators = operators or self.operators
+        outcome = operators[entry](data, context)
+        while type(outcome) is ParkedRecord:
+            # nothing else can run until the first step has produced records
+            self.retries.park(entry, outcome)
+            _, parked = self.retries.pop_due(wait=True)
+            outcome = operators[entry].retry(parked)
+
+        pending: set = set()
+        partition: list = []
+        for record in iterate_outcomes(outcome):
+            if self._check_budgets:
+                self._check_time_budgets(entry)
+            partition.append(record)
+            if len(partition) >= flow.partition_size:
+                _submit(partition)
+                partition = []
+                if len(pending) >= max_pending:
+                    pending = _wait(pending, FIRST_COMPLETED)
+        if partition:
+            _submit(partition)
+        _wait(pending, ALL_COMPLETED)
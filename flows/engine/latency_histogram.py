@@ -0,0 +1,151 @@
+"""
+Latency Histogram
+
+A fixed size, log-bucketed histogram of execution times, in the style of an
+HDR histogram. Each power of two is split into `SUB_BUCKETS` linear buckets,
+so the value reported for a percentile is within 1/SUB_BUCKETS (12.5%) of
+the recorded value, however large or small it is, in the same memory for
+a microsecond as for an hour.
+
+Every call to an Operator records a value, so recording has to be cheap.
+Once `EXACT_VALUES` values have been recorded, only one in every
+`SAMPLE_EVERY` values, on average, is bucketed and counted as standing for
+the values which were skipped. The gap between bucketed values is random, so
+a step whose slow records come at regular intervals still has them counted.
+The maximum is always exact.
+
+Histograms from copies of an Operator, such as those run in other processes,
+are combined by adding their counts together, so percentiles can be reported
+over all of the records, not just those which ran in this process.
+"""
+
+import random
+
+SUB_BUCKET_BITS = 3
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# enough buckets for any 64 bit number of nanoseconds
+BUCKET_COUNT = (64 - SUB_BUCKET_BITS + 1) * SUB_BUCKETS
+# every value is bucketed until this many have been recorded, after that one
+# in every SAMPLE_EVERY values is, on average
+EXACT_VALUES = 1024
+SAMPLE_EVERY = 8
+SAMPLE_GAP_BITS = SAMPLE_EVERY.bit_length() - 1
+
+
+def _bucket_upper_bound(index: int) -> int:
+    """
+    The largest value which is recorded in a bucket.
+    """
+    if index < SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    mantissa = index % SUB_BUCKETS + SUB_BUCKETS
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    __slots__ = ("counts", "count", "max", "_skip", "_weight")
+
+    def __init__(self):
+        # a list rather than an array, incrementing list items is quicker
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.max = 0
+        # the values until the next value is bucketed, and how many values
+        # each bucketed value stands for
+        self._skip = 1
+        self._weight = 1
+
+    def record(self, value: int, times: int = 1):
+        """
+        Record a value, in nanoseconds.
+
+        Parameters:
+            value: integer
+                The value to record
+            times: integer (optional)
+                The number of times to record the value, used when only one in
+                every n values are measured
+        """
+        if value > self.max:
+            self.max = value
+        self._skip -= 1
+        if self._skip:
+            return
+        times *= self._weight
+        # the top SUB_BUCKET_BITS + 1 bits of the value pick the bucket, values
+        # below SUB_BUCKETS * 2 are their own bucket
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        index = (shift << SUB_BUCKET_BITS) + (value >> shift) if shift > 0 else max(value, 0)
+        self.counts[index] += times
+        self.count += times
+        if self.count >= EXACT_VALUES:
+            self._weight = SAMPLE_EVERY
+            # an odd gap from 1 to SAMPLE_EVERY * 2 - 1, averaging SAMPLE_EVERY
+            self._skip = (random.getrandbits(SAMPLE_GAP_BITS) << 1) + 1  # nosec
+        else:
+            self._skip = 1
+
+    def percentile(self, percentile: float) -> int:
+        """
+        The value, in nanoseconds, below which the given percentage of the
+        recorded values fall.
+
+        Parameters:
+            percentile: float
+                The percentile, between 0 and 100
+        """
+        if self.count == 0:
+            return 0
+        target = max(1, -(-self.count * percentile // 100))
+        running = 0
+        for index, bucket_count in enumerate(self.counts):
+            running += bucket_count
+            if running >= target:
+                return min(_bucket_upper_bound(index), self.max)
+        return self.max  # pragma: no cover
+
+    def merge(self, other: "LatencyHistogram"):
+        """
+        Add the values recorded by another histogram to this histogram.
+        """
+        counts = self.counts
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                counts[index] += bucket_count
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def to_state(self) -> dict:
+        """
+        A compact copy of the histogram, only including the buckets with values,
+        which can be sent between processes.
+        """
+        return {
+            "buckets": {
+                index: bucket_count
+                for index, bucket_count in enumerate(self.counts)
+                if bucket_count
+            },
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "LatencyHistogram":
+        histogram = cls()
+        for index, bucket_count in state["buckets"].items():
+            histogram.counts[index] = bucket_count
+            histogram.count += bucket_count
+        histogram.max = state["max"]
+        return histogram
+
+    def summary(self) -> dict:
+        """
+        The p50, p90, p99 and max of the recorded values, in seconds.
+        """
+        return {
+            "p50": self.percentile(50) / 1e9,
+            "p90": self.percentile(90) / 1e9,
+            "p99": self.percentile(99) / 1e9,
+            "max": self.max / 1e9,
+        }
@@ -0,0 +1,99 @@
+"""
+Memory Profiling
+
+When a flow is run with `profile_memory`, the memory allocated by each step is
+measured with `tracemalloc`, along with the memory held in the Arrow memory
+pool, which `tracemalloc` can't see, for flows running in batch mode.
+
+Each call to an Operator, and each record taken from a generator it returns,
+is measured separately. The steps after the Operator run between the records
+it yields, so memory they allocate isn't attributed to it. For each step the
+sensors report:
+
+- peak_bytes: the most memory allocated above the starting level by any one
+  call or record
+- net_bytes: the memory allocated and not released by the step over the run,
+  a step which is holding memory will keep growing this number
+- arrow_peak_bytes and arrow_net_bytes: the same for the Arrow memory pool,
+  the pool is only read before and after each call or record, so memory
+  which is allocated and released within a call isn't included in the peak
+
+Memory is profiled by the FlowRunner. `tracemalloc` is process wide, so when
+branches run in threads, memory allocated by other steps at the same time is
+included. It also slows Python allocations considerably, so this is intended
+for investigating problems, not for every run.
+"""
+
+import tracemalloc
+import types
+
+import pyarrow
+
+
+def new_memory_sensors() -> dict:
+    return {"peak_bytes": 0, "net_bytes": 0, "arrow_peak_bytes": 0, "arrow_net_bytes": 0}
+
+
+def merge_memory_sensors(sensors: dict, other: dict):
+    """
+    Combine the memory sensors from a copy of an Operator into `sensors`.
+    """
+    sensors["peak_bytes"] = max(sensors["peak_bytes"], other["peak_bytes"])
+    sensors["arrow_peak_bytes"] = max(sensors["arrow_peak_bytes"], other["arrow_peak_bytes"])
+    sensors["net_bytes"] += other["net_bytes"]
+    sensors["arrow_net_bytes"] += other["arrow_net_bytes"]
+
+
+class MemoryProfiledOperator:
+    """
+    Wraps an Operator to attribute the memory allocated while it runs to it.
+    """
+
+    __slots__ = ("operator", "sensors")
+
+    def __init__(self, operator):
+        self.operator = operator
+        if getattr(operator, "memory_sensors", None) is None:
+            operator.memory_sensors = new_memory_sensors()
+        self.sensors = operator.memory_sensors
+
+    def __call__(self, data, context):
+        start = self._start()
+        outcome = self.operator(data, context)
+        self._stop(start)
+        if type(outcome) is types.GeneratorType:
+            return self._profiled_records(outcome)
+        return outcome
+
+    def retry(self, parked):
+        start = self._start()
+        outcome = self.operator.retry(parked)
+        self._stop(start)
+        if type(outcome) is types.GeneratorType:
+            return self._profiled_records(outcome)
+        return outcome
+
+    def _profiled_records(self, outcome):
+        while True:
+            start = self._start()
+            record = next(outcome, None)
+            self._stop(start)
+            if record is None:
+                return
+            yield record
+
+    @staticmethod
+    def _start():
+        tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0], pyarrow.total_allocated_bytes()
+
+    def _stop(self, start):
+        python_start, arrow_start = start
+        current, peak = tracemalloc.get_traced_memory()
+        arrow_current = pyarrow.total_allocated_bytes()
+
+        sensors = self.sensors
+        sensors["net_bytes"] += current - python_start
+        sensors["peak_bytes"] = max(sensors["peak_bytes"], peak - python_start)
+        sensors["arrow_net_bytes"] += arrow_current - arrow_start
+        sensors["arrow_peak_bytes"] = max(sensors["arrow_peak_bytes"], arrow_current - arrow_start)
@@ -0,0 +1,119 @@
+"""
+Operator Fusion
+
+Every hop between steps goes back to the runner, which copies the context for
+the edge and walks its stack of outstanding work - which for cheap, stateless
+steps can cost more than the work the step does.
+
+Fusion combines runs of consecutive steps which are marked as `fusable` into a
+single FusedOperator which calls each step in turn, passing the records from
+one step to the next without going back to the runner, and without copying
+the context of a record which is only passed to the next step. Each step is
+still called through its own `__call__`, so sampled timing, retries, error
+reporting and failure-rate limits apply as they would without fusion, and
+sensors read the same.
+"""
+
+import inspect
+from types import GeneratorType
+from typing import List
+from typing import Sequence
+from typing import Tuple
+
+from flows.engine.base_operator import iterate_outcomes
+
+
+def is_fusable(operator) -> bool:
+    """
+    Operators are fusable if they are marked as such and are not async.
+    """
+    if not getattr(operator, "fusable", False):
+        return False
+    execute = getattr(operator, "execute", None)
+    return not (inspect.iscoroutinefunction(execute) or inspect.isasyncgenfunction(execute))
+
+
+def find_fusable_chains(
+    operators: Sequence, links: Sequence[Tuple[int, ...]]
+) -> List[Tuple[int, ...]]:
+    """
+    Find the runs of consecutive fusable steps in a plan.
+
+    A step can join the run of the step before it if it is that step's only
+    outgoing link, and that step is its only incoming link.
+
+    Parameters:
+        operators: Sequence
+            The operators, indexed by slot
+        links: Sequence[Tuple[int]]
+            The outgoing links, indexed by slot
+
+    Returns:
+        The slots of each run of two or more fusable steps
+    """
+    incoming = [0] * len(operators)
+    for targets in links:
+        for target in targets:
+            incoming[target] += 1
+
+    fusable = [is_fusable(operator) for operator in operators]
+    chains = []
+    in_chain = set()
+    # slots are in topological order, so runs are found from their start
+    for slot in range(len(operators)):
+        if slot in in_chain or not fusable[slot]:
+            continue
+        chain = [slot]
+        while (
+            len(links[chain[-1]]) == 1
+            and fusable[links[chain[-1]][0]]
+            and incoming[links[chain[-1]][0]] == 1
+        ):
+            chain.append(links[chain[-1]][0])
+        if len(chain) > 1:
+            chains.append(tuple(chain))
+            in_chain.update(chain)
+    return chains
+
+
+class FusedOperator:
+    """
+    Runs a chain of fusable operators as a single step.
+    """
+
+    def __init__(self, operators: Sequence):
+        self.operators = tuple(operators)
+        self.name = "+".join(operator.name for operator in self.operators)
+
+    def __call__(self, data, context):
+        return self._run_from(0, data, context)
+
+    async def acall(self, data, context):
+        # fused operators are never async, so can run directly on the event loop
+        return self(data, context)
+
+    def _run_from(self, stage: int, data, context):
+        """
+        Run the record through the chain from the given stage.
+
+        Stages which return a single record are run in a loop, the record
+        and its context are only passed to the next stage, so the context is
+        passed on rather than copied. Only stages which return generators or
+        lists need a generator to pass each of their records on.
+        """
+        operators = self.operators
+        last = len(operators) - 1
+        while True:
+            outcome = operators[stage](data, context)
+            if not outcome or stage == last:
+                return outcome
+            if type(outcome) is GeneratorType or type(outcome) is list:
+                return self._fan_out(stage + 1, outcome)
+            data, context = outcome
+            stage += 1
+
+    def _fan_out(self, stage: int, records):
+        # the records from one call can share a context, so each record gets
+        # its own copy, as it would between unfused steps
+        for data, context in records:
+            yield from iterate_outcomes(self._run_from(stage, data, context.copy()))
@@ -0,0 +1,190 @@
+"""
+Pipelined Flow Runner
+
+Runs a linear flow with each step in its own thread, passing records between
+the steps through bounded queues. Reading, transforming and saving overlap
+rather than running in lockstep one record at a time, and memory is bounded
+by the capacity of the queues rather than by how quickly the first step can
+produce records - when a queue is full the step feeding it waits.
+
+The depth of each queue and the time steps spend waiting on them are
+reported in the sensors of the step the queue feeds.
+
+Like the AsyncFlowRunner, the steps are called directly, without the wrappers
+the FlowRunner adds, so flows which use time budgets, tracing, memory
+profiling, the step cache, checkpoints, joins, partitions or deferred
+retries can't be pipelined.
+"""
+
+import queue
+import threading
+import time
+
+from orso.tools import random_string
+
+from flows.engine.base_operator import iterate_outcomes
+from flows.engine.context import Context
+from flows.engine.execution_plan import ExecutionPlan
+from flows.exceptions import FlowError
+
+# marks the end of the records in a queue
+_END = object()
+
+
+class EdgeQueue:
+    """
+    A bounded queue between two steps which records how full it gets and how
+    long the steps either side of it wait.
+    """
+
+    def __init__(self, maxsize: int):
+        self.queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.capacity = maxsize
+        self.records = 0
+        self.max_depth = 0
+        self.total_depth = 0
+        self.put_stall_ns = 0  # time the upstream step waited for space
+        self.get_stall_ns = 0  # time the downstream step waited for records
+
+    def put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            start = time.perf_counter_ns()
+            self.queue.put(item)
+            self.put_stall_ns += time.perf_counter_ns() - start
+        depth = self.queue.qsize()
+        self.records += 1
+        self.total_depth += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def get(self):
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            start = time.perf_counter_ns()
+            item = self.queue.get()
+            self.get_stall_ns += time.perf_counter_ns() - start
+            return item
+
+    def read_sensors(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "max_depth": self.max_depth,
+            "mean_depth": self.total_depth / self.records if self.records else 0,
+            "upstream_stall_sec": self.put_stall_ns / 1e9,
+            "downstream_stall_sec": self.get_stall_ns / 1e9,
+        }
+
+
+class PipelinedFlowRunner:
+    def __init__(self, flow, queue_size: int = 64):
+        """
+        Parameters:
+            flow: Flow
+                The flow to run, this must be a single chain of steps
+            queue_size: integer (optional)
+                The number of records each queue between steps can hold,
+                default is 64
+        """
+        self.flow = flow
+        self.plan = flow.plan or ExecutionPlan(flow)
+        self.cycles = 0
+        # each stage counts its own cycles, adding them to the total when it ends
+        self._cycles_lock = threading.Lock()
+
+        plan = self.plan
+        if len(plan.entry_points) != 1 or any(len(links) > 1 for links in plan.links):
+            raise FlowError("Only linear flows can be run as a pipeline.")
+
+        # walk the chain to get the steps in order
+        self.chain = [plan.entry_points[0]]
+        while plan.links[self.chain[-1]]:
+            self.chain.append(plan.links[self.chain[-1]][0])
+
+        # the queues are kept between runs so their sensors cover every run
+        self.queues = [EdgeQueue(queue_size) for _ in self.chain[1:]]
+        for slot, edge_queue in zip(self.chain[1:], self.queues):
+            plan.operators[slot].inbound_queue = edge_queue
+
+    def __call__(self, data: dict = None, context: dict = None):
+        """
+        Create a `run` of a flow and execute with a specific data object.
+
+        Parameters:
+            data: dictionary, any (optional)
+                The data the flow is to process
+            context: dictionary (optional)
+                Additional information to support the processing of the data
+        """
+        if not context:
+            context = {}
+
+        # create a run_id for the message if it doesn't already have one
+        if not context.get("run_id"):
+            context["run_id"] = str(random_string(32))
+
+        # copies of the context made for each edge are Contexts too
+        if not isinstance(context, Context):
+            context = Context(context)
+
+        inbound = EdgeQueue(2)
+        inbound.put((data, context))
+        inbound.put(_END)
+
+        stop = threading.Event()
+        errors: list = []
+        queues = [inbound, *self.queues]
+        threads = [
+            threading.Thread(
+                target=self._stage,
+                args=(slot, queues[i], queues[i + 1] if i + 1 < len(queues) else None),
+                kwargs={"stop": stop, "errors": errors},
+                name=f"flow-stage-{self.plan.names[slot]}",
+                daemon=True,
+            )
+            for i, slot in enumerate(self.chain)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+    def _stage(self, slot, inbound, outbound, *, stop, errors):
+        """
+        Run one step of the flow, taking records from the inbound queue and
+        putting the records the step returns on the outbound queue.
+
+        If any step fails the others stop taking new records, the failed step
+        keeps draining its inbound queue so the steps before it are not left
+        waiting for space.
+        """
+        operator = self.plan.operators[slot]
+        cycles = 0
+        try:
+            while True:
+                item = inbound.get()
+                if item is _END:
+                    break
+                if stop.is_set():
+                    continue
+                data, context = item
+                cycles += 1
+                for outcome_data, outcome_context in iterate_outcomes(operator(data, context)):
+                    if outbound is not None:
+                        outbound.put((outcome_data, outcome_context.copy()))
+                    if stop.is_set():
+                        break
+        except BaseException as err:
+            errors.append(err)
+            stop.set()
+            while inbound.get() is not _END:
+                pass
+        finally:
+            with self._cycles_lock:
+                self.cycles += cycles
+            if outbound is not None:
+                outbound.put(_END)
@@ -0,0 +1,92 @@
+"""
+Retry Scheduler
+
+When a flow is run with `deferred_retries`, an Operator which fails doesn't
+wait before retrying the record, it returns a ParkedRecord and the runner
+holds the record in a RetryScheduler until its wait is over. Other records
+continue to be processed in the meantime, so a step which is failing for some
+records (such as a partial outage of a service it calls) slows down only the
+records which are failing.
+
+The runner retries parked records which are due between records, and waits
+for all of the parked records to be retried before the run completes.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+
+class ParkedRecord:
+    """
+    A record waiting to be retried by an Operator.
+
+    Parameters:
+        data: any
+            The data which failed to be processed
+        context: dictionary
+            The context for the data
+        attempt: integer
+            The number of the next attempt to process the record
+        due: float
+            The `time.monotonic` time the record can be retried from
+    """
+
+    __slots__ = ("data", "context", "attempt", "due")
+
+    def __init__(self, data, context, attempt: int, due: float):
+        self.data = data
+        self.context = context
+        self.attempt = attempt
+        self.due = due
+
+
+class RetryScheduler:
+    """
+    A delay queue of parked records, ordered by when they are due.
+    """
+
+    def __init__(self):
+        # (due, sequence, slot, parked record), the sequence keeps records
+        # which are due at the same time in the order they were parked
+        self.heap: list = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def park(self, slot: int, parked: ParkedRecord):
+        """
+        Hold a record to be retried by the Operator in a slot of the plan.
+        """
+        with self._lock:
+            heapq.heappush(self.heap, (parked.due, next(self._sequence), slot, parked))
+
+    def pop_due(self, wait: bool = False):
+        """
+        Take the next record which is due to be retried.
+
+        Parameters:
+            wait: boolean (optional)
+                Wait for the next record to be due, rather than returning if
+                no records are due yet, default False
+
+        Returns:
+            The slot and the parked record, or None if there are no records
+            or, when not waiting, none of the records are due
+        """
+        heap = self.heap
+        while heap:
+            delay = heap[0][0] - time.monotonic()
+            if delay > 0:
+                if not wait:
+                    return None
+                time.sleep(delay)
+                continue
+            with self._lock:
+                if heap and heap[0][0] <= time.monotonic():
+                    _, _, slot, parked = heapq.heappop(heap)
+                    return slot, parked
+        return None
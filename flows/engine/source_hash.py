@@ -0,0 +1,112 @@
+"""
+Source Hashes
+
+Operators log hashes of their source code when they are created, so the code
+which processed the data can be identified. Reading and tokenizing source
+files to do this is much slower than everything else creating an Operator
+does, and flows are built many times (for example once per worker process
+when partitioning), so hashes are cached for each function's code object.
+
+Setting the FLOWS_SOURCE_HASH_CACHE environment variable also saves the
+hashes in the `__pycache__` folder next to the compiled module, so new
+processes don't need to read the source again. Saved hashes are only used
+while the size and modification time of the source file are unchanged.
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import sys
+import threading
+from typing import Callable
+
+_ALPHA_NUMS = re.compile(r"[\W_]+")
+_hashes: dict = {}
+_saved: dict = {}  # the saved hashes for each source file, read once per file
+_lock = threading.Lock()
+
+
+def source_hash(function: Callable, alpha_nums_only: bool = False) -> str:
+    """
+    The SHA-256 hash of the source code of a function or method.
+
+    Parameters:
+        function: callable
+            The function or method to hash
+        alpha_nums_only: boolean (optional)
+            Only hash the letters and numbers in the source, so changes to
+            whitespace and punctuation don't change the hash, default False
+
+    Returns:
+        The hex digest of the hash
+    """
+    code = function.__code__
+    key = (code, alpha_nums_only)
+    cached = _hashes.get(key)
+    if cached is not None:
+        return cached
+
+    persist = bool(os.environ.get("FLOWS_SOURCE_HASH_CACHE")) and not sys.dont_write_bytecode
+    saved_key = f"{code.co_qualname}:{code.co_firstlineno}:{int(alpha_nums_only)}"
+    saved = _read_saved(code.co_filename) if persist else None
+    if saved is not None and saved_key in saved["hashes"]:
+        cached = saved["hashes"][saved_key]
+    else:
+        import inspect
+
+        source = inspect.getsource(function)
+        if alpha_nums_only:
+            source = _ALPHA_NUMS.sub("", source)
+        cached = hashlib.sha256(source.encode()).hexdigest()
+        if saved is not None:
+            saved["hashes"][saved_key] = cached
+            _write_saved(code.co_filename, saved)
+
+    _hashes[key] = cached
+    return cached
+
+
+def _saved_path(filename: str) -> str:
+    # alongside the module's bytecode, e.g. __pycache__/module.cpython-311.hashes.json
+    return os.path.splitext(importlib.util.cache_from_source(filename))[0] + ".hashes.json"
+
+
+def _read_saved(filename: str):
+    """
+    The saved hashes for a source file, an empty set of hashes if there are
+    none or they are out of date, or None if the file can't be cached.
+    """
+    with _lock:
+        if filename in _saved:
+            return _saved[filename]
+        try:
+            stat = os.stat(filename)
+            path = _saved_path(filename)
+        except (OSError, ValueError, NotImplementedError):
+            _saved[filename] = None
+            return None
+        saved = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hashes": {}}
+        try:
+            with open(path, "r", encoding="utf-8") as saved_file:
+                on_disk = json.load(saved_file)
+            if on_disk["size"] == saved["size"] and on_disk["mtime_ns"] == saved["mtime_ns"]:
+                saved["hashes"] = on_disk["hashes"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        _saved[filename] = saved
+        return saved
+
+
+def _write_saved(filename: str, saved: dict):
+    try:
+        path = _saved_path(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as saved_file:
+            json.dump(saved, saved_file)
+        os.replace(temporary_path, path)
+    except (OSError, ValueError, NotImplementedError):
+        # the cache is an optimization, failing to write it isn't an error
+        pass
@@ -0,0 +1,303 @@
+"""
+Step Output Cache
+
+Steps which opt in with `cache` in their configuration have their output saved
+to a local folder, when the step is given the same input again its output is
+replayed from the cache rather than the step being run. This means a flow can
+be run again after changing a later step without, for example, the source step
+querying its data again.
+
+Entries are keyed on:
+
+- the step's class and `version()`, so changing the step's code misses
+- the step's resolved configuration and the flow's batch size
+- a fingerprint of the data the step is given, the context isn't included so
+  steps whose output depends on the context shouldn't be cached
+
+Outputs which are Arrow record batches (source steps in batch mode) are saved
+as Arrow IPC streams, other outputs are saved as a sequence of pickles. Both
+are written as the step produces its records and read back as they are
+replayed, so outputs don't need to fit in memory. Outputs are only saved when
+the step succeeds, calls which fail, or are parked to be retried, aren't.
+
+Once the cache holds more than its size, the least recently used entries are
+removed.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import pickle  # nosec - only reads files written by this module
+import threading
+import types
+from collections import OrderedDict
+from typing import Optional
+
+import pyarrow
+import pyarrow.ipc
+from orso.tools import random_string
+
+from flows.engine.retry_scheduler import ParkedRecord
+
+SUFFIXES = (".arrow", ".pickle")
+DEFAULT_CACHE_SIZE = 1 << 30
+
+
+def new_cache_sensors() -> dict:
+    return {"hits": 0, "misses": 0}
+
+
+def merge_cache_sensors(sensors: dict, other: dict):
+    """
+    Combine the cache sensors from a copy of an Operator into `sensors`.
+    """
+    sensors["hits"] += other["hits"]
+    sensors["misses"] += other["misses"]
+
+
+class StepCache:
+    """
+    The entries in a local folder, with least recently used eviction once the
+    entries are larger than `max_bytes`.
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_CACHE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        os.makedirs(path, exist_ok=True)
+
+        # the size of each entry, least recently used first
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self.total_bytes = 0
+        found = []
+        for file_name in os.listdir(path):
+            if file_name.endswith(SUFFIXES):
+                stat = os.stat(os.path.join(path, file_name))
+                found.append((stat.st_mtime_ns, file_name, stat.st_size))
+        for _, file_name, size in sorted(found):
+            self._entries[file_name] = size
+            self.total_bytes += size
+
+    @staticmethod
+    def step_key(operator) -> str:
+        """
+        The part of the key for the operator, its code and configuration.
+        """
+        return json.dumps(
+            [
+                f"{type(operator).__module__}.{type(operator).__qualname__}",
+                operator.version(),
+                operator.config,
+                operator.batch_size,
+            ],
+            sort_keys=True,
+            default=str,
+        )
+
+    @staticmethod
+    def key(step_key: str, data) -> Optional[str]:
+        """
+        The key for the output of a step for this data, or None if the data
+        can't be fingerprinted.
+        """
+        try:
+            fingerprint = hashlib.sha256(pickle.dumps(data, protocol=4)).hexdigest()
+        except Exception:
+            return None
+        return hashlib.sha256(f"{step_key}:{fingerprint}".encode()).hexdigest()
+
+    def replay(self, key: str, context: dict):
+        """
+        The records saved for the key, each with the context, or None if the
+        key isn't in the cache.
+        """
+        for suffix in SUFFIXES:
+            file_name = key + suffix
+            try:
+                # closed by the replay generator once the entry is read
+                entry = open(os.path.join(self.path, file_name), "rb")  # noqa: SIM115
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                if file_name in self._entries:
+                    self._entries.move_to_end(file_name)
+            with contextlib.suppress(OSError):
+                os.utime(entry.fileno())
+            if suffix == ".arrow":
+                return self._replay_batches(entry, context)
+            return self._replay_pickles(entry, context)
+        return None
+
+    @staticmethod
+    def _replay_batches(entry, context):
+        with entry:
+            for batch in pyarrow.ipc.open_stream(entry):
+                yield batch, context
+
+    @staticmethod
+    def _replay_pickles(entry, context):
+        with entry:
+            while True:
+                try:
+                    data = pickle.load(entry)  # nosec - written by this module
+                except EOFError:
+                    return
+                yield data, context
+
+    def writer(self, key: str) -> "_EntryWriter":
+        return _EntryWriter(self, key)
+
+    def _add(self, file_name: str, size: int):
+        """
+        Record a new entry, removing the least recently used entries if the
+        cache is over its size.
+        """
+        with self._lock:
+            self.total_bytes += size - self._entries.pop(file_name, 0)
+            self._entries[file_name] = size
+            evicted = []
+            while self.total_bytes > self.max_bytes and self._entries:
+                old_name, old_size = self._entries.popitem(last=False)
+                self.total_bytes -= old_size
+                evicted.append(old_name)
+        for old_name in evicted:
+            try:
+                os.remove(os.path.join(self.path, old_name))
+                self.evictions += 1
+            except FileNotFoundError:  # pragma: no cover
+                pass
+
+
+class _EntryWriter:
+    """
+    Writes the records output by a step to a temporary file, which becomes
+    the entry when it is committed.
+
+    The format is chosen by the first record, if a later record doesn't fit
+    the format (such as a batch with a different schema) the entry is
+    abandoned.
+    """
+
+    def __init__(self, cache: StepCache, key: str):
+        self.cache = cache
+        self.key = key
+        self.temporary_path = os.path.join(cache.path, f"{key}.{random_string(8)}.tmp")
+        # written to as the step produces records, closed on commit or abandon
+        self.file = open(self.temporary_path, "wb")  # noqa: SIM115
+        self.batch_writer = None
+        self.suffix = None
+
+    def add(self, data) -> bool:
+        """
+        Add a record to the entry, returns False if the entry was abandoned.
+        """
+        if self.file is None:
+            return False
+        try:
+            if self.suffix is None:
+                self.suffix = ".arrow" if type(data) is pyarrow.RecordBatch else ".pickle"
+                if self.suffix == ".arrow":
+                    self.batch_writer = pyarrow.ipc.new_stream(self.file, data.schema)
+            if self.suffix == ".arrow":
+                # raises if the record isn't a batch with the same schema
+                self.batch_writer.write_batch(data)
+            else:
+                pickle.dump(data, self.file, protocol=4)
+        except Exception:
+            self.abandon()
+            return False
+        return True
+
+    def commit(self):
+        if self.file is None:
+            return
+        if self.batch_writer is not None:
+            self.batch_writer.close()
+        self.file.close()
+        self.file = None
+        file_name = self.key + (self.suffix or ".pickle")
+        os.replace(self.temporary_path, os.path.join(self.cache.path, file_name))
+        self.cache._add(file_name, os.path.getsize(os.path.join(self.cache.path, file_name)))
+
+    def abandon(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.temporary_path)
+
+
+class CachedOperator:
+    """
+    Wraps an Operator to replay its output from the cache, or save its output
+    to the cache.
+
+    Source steps which skip records when a run is resumed from a checkpoint
+    skip them from replayed output too, and their output isn't saved while
+    they are skipping records as it is incomplete.
+    """
+
+    __slots__ = ("operator", "cache", "step_key", "sensors")
+
+    def __init__(self, operator, cache: StepCache):
+        self.operator = operator
+        self.cache = cache
+        self.step_key = cache.step_key(operator)
+        if getattr(operator, "cache_sensors", None) is None:
+            operator.cache_sensors = new_cache_sensors()
+        self.sensors = operator.cache_sensors
+
+    def __call__(self, data, context):
+        operator = self.operator
+        # the end of the flow is passed through
+        if isinstance(data, str) and data == operator.sigterm:
+            return operator(data, context)
+        key = self.cache.key(self.step_key, data)
+        if key is None:
+            return operator(data, context)
+
+        replayed = self.cache.replay(key, context)
+        if replayed is not None:
+            self.sensors["hits"] += 1
+            if hasattr(operator, "_offset_records"):
+                return operator._offset_records(replayed)
+            return replayed
+
+        self.sensors["misses"] += 1
+        errors = operator.errors
+        resuming = getattr(operator, "resume_offset", 0)
+        outcome = operator(data, context)
+        if operator.errors != errors or resuming or type(outcome) is ParkedRecord:
+            return outcome
+        if type(outcome) is types.GeneratorType:
+            return self._saved_records(outcome, key)
+
+        writer = self.cache.writer(key)
+        records = [] if not outcome else outcome if type(outcome) is list else [outcome]
+        for record_data, _ in records:
+            if not writer.add(record_data):
+                return outcome
+        writer.commit()
+        return outcome
+
+    def retry(self, parked):
+        return self.operator.retry(parked)
+
+    def _saved_records(self, outcome, key):
+        """
+        Save the records from a generator as they are yielded, the entry is
+        only committed if the generator is run to completion.
+        """
+        writer = self.cache.writer(key)
+        try:
+            for record in outcome:
+                writer.add(record[0])
+                yield record
+            writer.commit()
+        finally:
+            # does nothing if the entry was committed
+            writer.abandon()
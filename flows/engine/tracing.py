@@ -0,0 +1,163 @@
+"""
+Sampled Tracing
+
+A sample of runs of a flow (see `trace_sample_rate` on the FlowRunner) record
+a span for each step they run: the operator, when it started and finished,
+how many records it received and returned, and the run_id.
+
+Spans are written as Chrome trace events (complete events, "ph": "X") in the
+JSON array format, which can be opened directly in Perfetto or
+chrome://tracing. Span times include the time spent in the steps after the
+step, as those steps run while the step's records are being consumed, so the
+spans for a run nest like a flame graph.
+
+Events are buffered in memory and written to the file in blocks; the array
+is closed when the sink is closed. Viewers accept unterminated arrays, so a
+file from a flow which didn't shut down cleanly can still be opened.
+"""
+
+import json
+import os
+import threading
+import time
+import types
+
+from flows.engine.retry_scheduler import ParkedRecord
+
+
+class TraceSink:
+    """
+    Buffered writer for Chrome trace events.
+    """
+
+    def __init__(self, path: str, buffer_size: int = 1000):
+        """
+        Parameters:
+            path: string
+                The file to write the trace events to, it is overwritten
+            buffer_size: integer (optional)
+                The number of events to hold before writing them, default 1000
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.buffer_size = buffer_size
+        self._buffer: list = []
+        self._lock = threading.Lock()
+        # held open for the life of the sink, it is closed by close()
+        self._file = open(path, "w", encoding="utf-8")  # noqa: SIM115
+        self._file.write("[")
+        self._file.flush()
+        self._written = 0
+        self.pid = os.getpid()
+
+    def record_span(
+        self,
+        name: str,
+        step: str,
+        start_ns: int,
+        end_ns: int,
+        records_in: int,
+        records_out: int,
+        run_id,
+    ):
+        """
+        Add a span to the trace.
+        """
+        event = {
+            "name": name,
+            "cat": "flow",
+            "ph": "X",
+            "ts": start_ns / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": self.pid,
+            "tid": threading.get_ident(),
+            "args": {
+                "step": step,
+                "run_id": run_id,
+                "start_ns": start_ns,
+                "end_ns": end_ns,
+                "records_in": records_in,
+                "records_out": records_out,
+            },
+        }
+        with self._lock:
+            self._buffer.append(event)
+            if len(self._buffer) >= self.buffer_size:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._file.closed or not self._buffer:
+            return
+        for event in self._buffer:
+            self._file.write(",\n" if self._written else "\n")
+            self._file.write(json.dumps(event, default=str))
+            self._written += 1
+        self._buffer.clear()
+        self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flush()
+            self._file.write("\n]\n")
+            self._file.close()
+
+
+class TracedOperator:
+    """
+    Wraps an Operator to record a span for each time it is called.
+
+    The span is closed when the records the Operator returned have all been
+    consumed, for generators this is when the generator is exhausted (or
+    closed).
+    """
+
+    __slots__ = ("operator", "step", "sink", "run_id")
+
+    def __init__(self, operator, step: str, sink: TraceSink, run_id):
+        self.operator = operator
+        self.step = step
+        self.sink = sink
+        self.run_id = run_id
+
+    def __call__(self, data, context):
+        start_ns = time.perf_counter_ns()
+        return self._traced(self.operator(data, context), start_ns)
+
+    def retry(self, parked):
+        start_ns = time.perf_counter_ns()
+        return self._traced(self.operator.retry(parked), start_ns)
+
+    def _traced(self, outcome, start_ns):
+        if type(outcome) is types.GeneratorType:
+            return self._traced_records(outcome, start_ns)
+        if not outcome or type(outcome) is ParkedRecord:
+            records_out = 0
+        elif type(outcome) is list:
+            records_out = len(outcome)
+        else:
+            records_out = 1
+        self._record(start_ns, records_out)
+        return outcome
+
+    def _traced_records(self, outcome, start_ns):
+        records_out = 0
+        try:
+            for record in outcome:
+                records_out += 1
+                yield record
+        finally:
+            self._record(start_ns, records_out)
+
+    def _record(self, start_ns, records_out):
+        name = getattr(self.operator, "name", type(self.operator).__name__)
+        self.sink.record_span(
+            name, self.step, start_ns, time.perf_counter_ns(), 1, records_out, self.run_id
+        )
@@ -7,6 +7,7 @@ from types import ModuleType
 STEP_REGISTRY = (
     "extract",
     "filter",
+    "join",
     "normalize",
     "read",
     "save",
@@ -1,9 +1,256 @@
+"""
+Filter Step
+
+Keeps the records which match the `conditions` in the step's configuration.
+The conditions are a list of groups, a record is kept if it matches every
+condition in any of the groups:
+
+    conditions:
+      - [["length", ">=", 4], ["status", "==", "approved"]]
+      - [["is_published", "==", true]]
+
+Each condition is a column, a comparison (==, !=, <, <=, >, >=, in, not in)
+and a value. Missing and null values don't match any comparison, other than
+`== null` and `!= null`, and values which can't be compared to the value
+(such as a string with `>` 5) don't match that condition. Steps without
+conditions keep every record.
+
+The conditions are compiled once, when the step is created. In row mode they
+are compiled into closures, in batch mode they are evaluated as vectorized
+`pyarrow.compute` masks. Within each group the cheapest conditions are tested
+first, and groups stop being tested once the result is known.
+"""
+
+import operator
 from typing import Generator
 from typing import Optional
 
+import pyarrow
+import pyarrow.compute
+
 from flows.engine import BaseOperator
 
+# the relative cost of each comparison, cheaper conditions are tested first
+COSTS = {"==": 1, "!=": 1, "<": 2, "<=": 2, ">": 2, ">=": 2, "in": 3, "not in": 3}
+ROW_COMPARISONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+ARROW_COMPARISONS = {
+    "==": pyarrow.compute.equal,
+    "!=": pyarrow.compute.not_equal,
+    "<": pyarrow.compute.less,
+    "<=": pyarrow.compute.less_equal,
+    ">": pyarrow.compute.greater,
+    ">=": pyarrow.compute.greater_equal,
+}
+# errors from comparing values of different types, which don't match
+ARROW_COMPARISON_ERRORS = (pyarrow.ArrowNotImplementedError, pyarrow.ArrowInvalid, TypeError)
+
+
+def parse_conditions(conditions) -> list:
+    """
+    Validate the conditions from the configuration, and order them so the
+    cheapest conditions, and groups of conditions, are tested first.
+
+    Returns:
+        A list of groups, each a list of (column, comparison, value) tuples
+    """
+    if not conditions:
+        return []
+    if not isinstance(conditions, list):
+        raise ValueError("Filter step 'conditions' must be a list of groups of conditions.")
+    groups = []
+    for group in conditions:
+        if not isinstance(group, list) or not group:
+            raise ValueError("Filter step conditions must be grouped in non-empty lists.")
+        parsed = []
+        for condition in group:
+            if not isinstance(condition, (list, tuple)) or len(condition) != 3:
+                raise ValueError(
+                    f"Filter step condition {condition!r} must be [column, comparison, value]."
+                )
+            column, comparison, value = condition
+            if comparison not in COSTS:
+                raise ValueError(
+                    f"Filter step comparison {comparison!r} must be one of {', '.join(COSTS)}."
+                )
+            if comparison in ("in", "not in") and not isinstance(value, (list, tuple)):
+                raise ValueError(f"Filter step '{comparison}' needs a list of values.")
+            if value is None and comparison not in ("==", "!="):
+                raise ValueError(f"Filter step can't compare {column} {comparison} null.")
+            parsed.append((column, comparison, value))
+        # sorting is stable, so conditions which cost the same keep their order
+        parsed.sort(key=lambda condition: COSTS[condition[1]])
+        groups.append(parsed)
+    groups.sort(key=lambda group: sum(COSTS[comparison] for _, comparison, _ in group))
+    return groups
+
+
+def _row_condition(column, comparison, value):
+    """
+    A closure testing a row against a single condition. Values which can't be
+    compared to the condition's value, and records which aren't rows, don't
+    match the condition but leave the other conditions to decide the result.
+    """
+    if value is None:
+        is_null = comparison == "=="
+
+        def condition(row):
+            try:
+                return (row.get(column) is None) is is_null
+            except AttributeError:
+                return False
+
+        return condition
+
+    if comparison in ROW_COMPARISONS:
+        compare = ROW_COMPARISONS[comparison]
+
+        def condition(row):
+            try:
+                return (found := row.get(column)) is not None and compare(found, value)
+            except (TypeError, AttributeError):
+                return False
+
+        return condition
+
+    try:
+        values = frozenset(value)
+    except TypeError:
+        values = tuple(value)
+    if comparison == "in":
+
+        def condition(row):
+            try:
+                return row.get(column) in values
+            except (TypeError, AttributeError):
+                return False
+
+        return condition
+
+    def condition(row):
+        try:
+            return (found := row.get(column)) is not None and found not in values
+        except (TypeError, AttributeError):
+            return False
+
+    return condition
+
+
+def _all(tests: list):
+    first = tests[0]
+    if len(tests) == 1:
+        return first
+    rest = _all(tests[1:])
+    return lambda row: first(row) and rest(row)
+
+
+def _any(tests: list):
+    first = tests[0]
+    if len(tests) == 1:
+        return first
+    rest = _any(tests[1:])
+    return lambda row: first(row) or rest(row)
+
+
+def compile_row_predicate(groups: list):
+    """
+    A single closure testing a row against all of the groups of conditions,
+    or None if there are no conditions.
+    """
+    if not groups:
+        return None
+    return _any([_all([_row_condition(*condition) for condition in group]) for group in groups])
+
+
+def _arrow_condition(batch, column, comparison, value):
+    """
+    The mask of the rows in the batch which match a single condition, or
+    False if none of the rows can match.
+    """
+    if column not in batch.schema.names:
+        return value is None and comparison == "=="
+    array = batch.column(column)
+    if value is None:
+        if comparison == "==":
+            return pyarrow.compute.is_null(array)
+        return pyarrow.compute.is_valid(array)
+    try:
+        if comparison in ARROW_COMPARISONS:
+            return ARROW_COMPARISONS[comparison](array, value)
+        mask = pyarrow.compute.is_in(array, value_set=pyarrow.array(value, type=array.type))
+    except ARROW_COMPARISON_ERRORS:
+        return False
+    if comparison == "in":
+        return mask
+    return pyarrow.compute.and_(pyarrow.compute.invert(mask), pyarrow.compute.is_valid(array))
+
+
+def batch_mask(batch, groups: list):
+    """
+    The mask of the rows in the batch which match any of the groups.
+
+    Nulls in the masks are treated as not matching, AND and OR use Kleene
+    logic so a null only matters when nothing else decides the result.
+
+    Returns:
+        A boolean array, True if every row matches or False if none do
+    """
+    result = False
+    for group in groups:
+        group_mask = True
+        for condition in group:
+            mask = _arrow_condition(batch, *condition)
+            if mask is False:
+                group_mask = False
+                break
+            if mask is True:
+                continue
+            group_mask = (
+                mask if group_mask is True else pyarrow.compute.and_kleene(group_mask, mask)
+            )
+            if not pyarrow.compute.any(group_mask).as_py():
+                group_mask = False
+                break
+        if group_mask is False:
+            continue
+        if group_mask is True:
+            return True
+        result = group_mask if result is False else pyarrow.compute.or_kleene(result, group_mask)
+        if pyarrow.compute.all(result, skip_nulls=False).as_py():
+            return True
+    return result
+
 
 class FilterStep(BaseOperator):
-    def execute(self, data: Optional[dict] = None, context: dict = None) -> Generator:
-        yield data, context
+    fusable = True
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.groups = parse_conditions(self.config.get("conditions"))
+        self._predicate = compile_row_predicate(self.groups)
+
+    def execute(self, data: Optional[dict] = None, context: dict = None):
+        predicate = self._predicate
+        if predicate is None or data == self.sigterm:
+            return data, context
+        if predicate(data):
+            return data, context
+        return None
+
+    def execute_batch(self, data=None, context: dict = None) -> Generator:
+        if not self.groups:
+            yield data, context
+            return
+        mask = batch_mask(data, self.groups)
+        if mask is True:
+            yield data, context
+        elif mask is not False:
+            data = data.filter(mask)
+            if data.num_rows:
+                yield data, context
@@ -0,0 +1,433 @@
+"""
+Join Step
+
+Combines the records from the two steps which link to it, matching records on
+the columns in `on`. The records from the `build` step (by default the second
+step the join needs) are held in a hash index, the records from the other
+step (the probe side) are streamed past the index.
+
+The build side can only be probed once it is complete, which is when the end
+of the flow reaches the join from the build step. Probe records which arrive
+before then are held until it does, so the join returns its records when the
+flow is finishing, and passes the end of the flow on once both of the steps
+linking to it have finished. Joins are supported:
+
+- inner: each probe record combined with each build record with the same key
+- left: as inner, and probe records with no match are returned with the
+  build columns set to None
+- semi: probe records which have a match in the build side, returned once
+
+Where a build column has the same name as a probe column, the build column is
+suffixed with `_right`. Records with None in a key column don't match.
+
+The build records and the probe records held for the build side count
+towards `memory_limit` bytes, when they take more than that they are spilled
+to disk. The build and probe records are split into partitions by the hash of
+their key - pickled in row mode, as Arrow IPC files in batch mode - and once
+both steps have finished, each partition of the build side is loaded and its
+partition of the probe side is joined against it in turn. Only one partition
+of the build side is held in memory at a time.
+"""
+
+import os
+import pickle  # nosec - only reads files written by this step
+import shutil
+import sys
+import tempfile
+from typing import Generator
+from typing import Optional
+
+import pyarrow
+import pyarrow.compute
+import pyarrow.ipc
+
+from flows.engine import BaseOperator
+from flows.engine.base_operator import PRODUCER
+from flows.exceptions import FlowError
+
+JOIN_TYPES = {"inner": "inner", "left": "left outer", "semi": "left semi"}
+DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024
+SPILL_PARTITIONS = 16
+SUFFIX = "_right"
+
+
+def _row_size(row: dict) -> int:
+    """
+    An estimate of the memory a row holds, the row and its keys and values.
+    """
+    return sys.getsizeof(row) + sum(
+        sys.getsizeof(key) + sys.getsizeof(value) for key, value in row.items()
+    )
+
+
+class _SpilledPartitions:
+    """
+    Build and probe records written to files, partitioned by the hash of
+    their key, so each partition of the build side can be indexed in turn.
+    """
+
+    def __init__(self, path: Optional[str], partitions: int = SPILL_PARTITIONS):
+        self.folder = tempfile.mkdtemp(prefix="flows-join-", dir=path)
+        self.partitions = partitions
+        # held open until the join is finished, they are closed by close()
+        self.build_files = [
+            open(os.path.join(self.folder, f"build-{i}"), "w+b")  # noqa: SIM115
+            for i in range(partitions)
+        ]
+        self.probe_files = [
+            open(os.path.join(self.folder, f"probe-{i}"), "w+b")  # noqa: SIM115
+            for i in range(partitions)
+        ]
+
+    def add_build(self, key, row: dict):
+        pickle.dump((key, row), self.build_files[hash(key) % self.partitions])
+
+    def add_probe(self, key, record: tuple):
+        pickle.dump((key, record), self.probe_files[hash(key) % self.partitions])
+
+    @staticmethod
+    def _read(spill_file):
+        spill_file.seek(0)
+        while True:
+            try:
+                yield pickle.load(spill_file)  # nosec - written by this step
+            except EOFError:
+                return
+
+    def build_partition(self, partition: int):
+        return self._read(self.build_files[partition])
+
+    def probe_partition(self, partition: int):
+        return self._read(self.probe_files[partition])
+
+    def close(self):
+        for spill_file in self.build_files + self.probe_files:
+            spill_file.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+
+class _SpilledBatches:
+    """
+    Build and probe batches written to Arrow IPC files, partitioned by the
+    hash of their key, so each partition of the build side can be joined in
+    turn.
+    """
+
+    def __init__(self, path: Optional[str], keys: list, partitions: int = SPILL_PARTITIONS):
+        self.folder = tempfile.mkdtemp(prefix="flows-join-", dir=path)
+        self.keys = keys
+        self.partitions = partitions
+        # the files are written as the batches arrive, they are opened for the
+        # first batch in their partition and closed by finish()
+        self.writers: dict = {}
+        # the context of each probe batch, by partition, in the order written
+        self.contexts: list = [[] for _ in range(partitions)]
+
+    def _partitions(self, batch) -> Generator:
+        table = pyarrow.Table.from_batches([batch]) if type(batch) is pyarrow.RecordBatch else batch
+        if not table.num_rows:
+            return
+        columns = [table.column(key).to_pylist() for key in self.keys]
+        keys = columns[0] if len(columns) == 1 else zip(*columns)
+        # the same hash as the row partitions, so keys which compare equal
+        # across types, like 1 and 1.0, are in the same partition
+        partition_of = pyarrow.array([hash(key) % self.partitions for key in keys])
+        for partition in range(self.partitions):
+            part = table.filter(pyarrow.compute.equal(partition_of, partition))
+            if part.num_rows:
+                yield partition, part.combine_chunks().to_batches()[0]
+
+    def _write(self, side: str, partition: int, batch):
+        writer = self.writers.get((side, partition))
+        if writer is None:
+            sink = pyarrow.OSFile(os.path.join(self.folder, f"{side}-{partition}"), "wb")
+            writer = self.writers[(side, partition)] = pyarrow.ipc.new_stream(sink, batch.schema)
+        writer.write_batch(batch)
+
+    def add_build(self, batch):
+        for partition, part in self._partitions(batch):
+            self._write("build", partition, part)
+
+    def add_probe(self, batch, context):
+        for partition, part in self._partitions(batch):
+            self._write("probe", partition, part)
+            self.contexts[partition].append(context)
+
+    def finish(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+    def _read(self, side: str, partition: int) -> Generator:
+        path = os.path.join(self.folder, f"{side}-{partition}")
+        if not os.path.exists(path):
+            return
+        # memory mapped, so the OS pages the batches in as they are read
+        yield from pyarrow.ipc.open_stream(pyarrow.memory_map(path))
+
+    def build_partition(self, partition: int) -> Optional[pyarrow.Table]:
+        batches = list(self._read("build", partition))
+        return pyarrow.Table.from_batches(batches) if batches else None
+
+    def probe_partition(self, partition: int) -> Generator:
+        return zip(self._read("probe", partition), self.contexts[partition])
+
+    def close(self):
+        self.finish()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+
+class JoinStep(BaseOperator):
+    needs_producer = True
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+        on = self.config.get("on")
+        if not on:
+            raise ValueError("Join step requires the columns to join 'on' in its configuration.")
+        self.keys = [on] if isinstance(on, str) else list(on)
+        self.how = self.config.get("how", "inner")
+        if self.how not in JOIN_TYPES:
+            raise ValueError(f"Join step 'how' must be one of {', '.join(JOIN_TYPES)}.")
+        self.build = self.config.get("build")
+        self.memory_limit = int(self.config.get("memory_limit", DEFAULT_MEMORY_LIMIT))
+        self.spill_path = self.config.get("spill_path")
+
+        self.build_records = 0
+        self.probe_records = 0
+        self.spilled = False
+        # the bytes of build and probe records held in memory, and the most held
+        self.held_bytes = 0
+        self.peak_bytes = 0
+        self._finished: set = set()
+        self._pending: list = []  # probe records waiting for the build side
+        # row mode, the build rows by key and the build columns seen
+        self._index: dict = {}
+        self._build_columns: dict = {}
+        self._spilled: Optional[_SpilledPartitions] = None
+        # batch mode, the build batches until the build side is complete
+        self._build_batches: list = []
+        self._build_schema: Optional[pyarrow.Schema] = None
+        self._build_table: Optional[pyarrow.Table] = None
+        self._spilled_batches: Optional[_SpilledBatches] = None
+
+    def execute(self, data: Optional[dict] = None, context: dict = None) -> Generator:
+        producer = self._producer(context)
+        if data == self.sigterm:
+            self._finished.add(producer)
+            if producer == self.build:
+                self._complete_build()
+                yield from self._drain()
+            # pass the end of the flow on once, after the joined records
+            if len(self._finished) == len(self.input_steps):
+                yield from self._drain_spilled()
+                yield data, context
+            return
+
+        if producer == self.build:
+            self._add_build_row(data)
+            return
+        self.probe_records += 1
+        if self._spilled is not None:
+            # the spilled partitions are joined once both steps have finished
+            self._spilled.add_probe(self._key(data), (data, context))
+            return
+        if self.build not in self._finished:
+            self._pending.append((data, context))
+            self._hold(_row_size(data))
+            return
+        yield from self._probe_row(data, context)
+
+    def execute_batch(self, data=None, context: dict = None) -> Generator:
+        producer = self._producer(context)
+        if producer == self.build:
+            self.build_records += data.num_rows
+            self._add_build_batch(data)
+            return
+        self.probe_records += data.num_rows
+        if self._spilled_batches is not None:
+            self._spilled_batches.add_probe(data, context)
+            return
+        if self.build not in self._finished:
+            self._pending.append((data, context))
+            self._hold(data.nbytes)
+            return
+        joined = self._probe_batch(data, self._build_table)
+        if joined.num_rows:
+            yield joined, context
+
+    def read_sensors(self):
+        response = super().read_sensors()
+        response["join"] = {
+            "build_records": self.build_records,
+            "probe_records": self.probe_records,
+            "spilled": self.spilled,
+            "peak_bytes": self.peak_bytes,
+        }
+        return response
+
+    def _hold(self, nbytes: int):
+        """
+        Count records held in memory, and spill them once they take more than
+        the memory limit.
+        """
+        self.held_bytes += nbytes
+        self.peak_bytes = max(self.peak_bytes, self.held_bytes)
+        if self.held_bytes > self.memory_limit:
+            self.spilled = True
+            if self._build_batches or any(type(data) is not dict for data, _ in self._pending):
+                self._spill_batches()
+            else:
+                self._spill_rows()
+            self.held_bytes = 0
+
+    def _producer(self, context) -> str:
+        if len(self.input_steps) != 2:
+            raise FlowError(f"{self.name} must be linked from exactly two steps.")
+        if self.build is None:
+            self.build = self.input_steps[1]
+        if self.build not in self.input_steps:
+            raise FlowError(f"{self.name} builds from '{self.build}', which doesn't link to it.")
+        producer = context.get(PRODUCER)
+        if producer not in self.input_steps:
+            raise FlowError(f"{self.name} can't tell which step a record came from.")
+        return producer
+
+    def _key(self, row: dict):
+        if len(self.keys) == 1:
+            return row.get(self.keys[0])
+        key = tuple(row.get(column) for column in self.keys)
+        return None if None in key else key
+
+    def _add_build_row(self, row: dict):
+        self.build_records += 1
+        key = self._key(row)
+        for column in row:
+            self._build_columns[column] = None
+        if key is None:
+            # rows without a key can't match
+            return
+        if self._spilled is not None:
+            self._spilled.add_build(key, row)
+            return
+        self._index.setdefault(key, []).append(row)
+        self._hold(_row_size(row))
+
+    def _spill_rows(self):
+        self._spilled = _SpilledPartitions(self.spill_path)
+        for key, rows in self._index.items():
+            for row in rows:
+                self._spilled.add_build(key, row)
+        for data, context in self._pending:
+            self._spilled.add_probe(self._key(data), (data, context))
+        self._index = {}
+        self._pending = []
+
+    def _add_build_batch(self, batch):
+        if self._build_schema is None:
+            self._build_schema = batch.schema
+        if self._spilled_batches is not None:
+            self._spilled_batches.add_build(batch)
+            return
+        self._build_batches.extend(batch.to_batches() if type(batch) is pyarrow.Table else [batch])
+        self._hold(batch.nbytes)
+
+    def _spill_batches(self):
+        self._spilled_batches = _SpilledBatches(self.spill_path, self.keys)
+        for batch in self._build_batches:
+            self._spilled_batches.add_build(batch)
+        for data, context in self._pending:
+            self._spilled_batches.add_probe(data, context)
+        self._build_batches = []
+        self._pending = []
+
+    def _complete_build(self):
+        """
+        Make the build side ready to probe, once all of its records are in.
+        """
+        if self._build_batches:
+            self._build_table = pyarrow.Table.from_batches(self._build_batches)
+            self._build_batches = []
+
+    def _drain(self) -> Generator:
+        """
+        Probe the build side with the records which arrived before it was
+        complete.
+        """
+        pending, self._pending = self._pending, []
+        for data, context in pending:
+            if type(data) in (pyarrow.Table, pyarrow.RecordBatch):
+                joined = self._probe_batch(data, self._build_table)
+                if joined.num_rows:
+                    yield joined, context
+            else:
+                yield from self._probe_row(data, context)
+
+    def _drain_spilled(self) -> Generator:
+        """
+        Join the spilled partitions, loading one partition of the build side
+        at a time.
+        """
+        if self._spilled is not None:
+            for partition in range(self._spilled.partitions):
+                index: dict = {}
+                for key, row in self._spilled.build_partition(partition):
+                    index.setdefault(key, []).append(row)
+                for key, (data, context) in self._spilled.probe_partition(partition):
+                    yield from self._probe_row(data, context, index, key)
+            self._spilled.close()
+            self._spilled = None
+        if self._spilled_batches is not None:
+            self._spilled_batches.finish()
+            for partition in range(self._spilled_batches.partitions):
+                build = self._spilled_batches.build_partition(partition)
+                if build is None and self._build_schema is not None:
+                    # so probe records without a match have the build columns
+                    build = self._build_schema.empty_table()
+                self.peak_bytes = max(self.peak_bytes, build.nbytes)
+                for data, context in self._spilled_batches.probe_partition(partition):
+                    joined = self._probe_batch(data, build)
+                    if joined.num_rows:
+                        yield joined, context
+            self._spilled_batches.close()
+            self._spilled_batches = None
+
+    def _probe_row(self, probe: dict, context, index=None, key=None) -> Generator:
+        if index is None:
+            index = self._index
+            key = self._key(probe)
+        matches = index.get(key) if key is not None else None
+        if self.how == "semi":
+            if matches:
+                yield probe, context
+            return
+        if not matches:
+            if self.how == "left":
+                yield self._combine(probe, dict.fromkeys(self._build_columns)), context
+            return
+        for build in matches:
+            yield self._combine(probe, build), context
+
+    def _combine(self, probe: dict, build: dict) -> dict:
+        row = dict(probe)
+        for column, value in build.items():
+            if column in self.keys:
+                continue
+            row[column + SUFFIX if column in probe else column] = value
+        return row
+
+    def _probe_batch(self, batch, build: Optional[pyarrow.Table]):
+        probe = pyarrow.Table.from_batches([batch]) if type(batch) is pyarrow.RecordBatch else batch
+        if build is None:
+            # nothing was built, only left joins return records
+            if self.how != "left":
+                return probe.slice(0, 0)
+            return probe
+        return probe.join(
+            build,
+            keys=self.keys,
+            join_type=JOIN_TYPES[self.how],
+            right_suffix=SUFFIX,
+            use_threads=False,
+        )
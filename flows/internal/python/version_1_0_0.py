@@ -1,11 +1,14 @@
 import json
+import select
 import subprocess  # nosec
 import tempfile
+import time
 from typing import IO
 from typing import Generator
 from typing import Optional
 
 from flows.engine import BaseOperator
+from flows.exceptions import TimeExceeded
 from flows.internal.python.python_scanner import scan_user_code
 
 
@@ -21,6 +24,11 @@ class PythonStep(BaseOperator):
         self._stdin: Optional[IO] = None
         self._stdout: Optional[IO] = None
 
+        # the most seconds the user code can run for over the flow, waits for
+        # the sandbox to respond are limited to the time remaining
+        self.time_budget: Optional[float] = config.get("time_budget")
+        self._sandbox_time = 0.0
+
         self._start_subprocess()
 
     def _start_subprocess(self):
@@ -59,13 +67,33 @@ class PythonStep(BaseOperator):
         self._stdin.write(json.dumps(payload) + "\n")
         self._stdin.flush()
 
-        line = self._stdout.readline()
+        line = self._read_response()
         if not line:
             raise RuntimeError("No response from sandbox")
 
         response = json.loads(line)
         yield response["data"], response["context"]
 
+    def _read_response(self) -> str:
+        """
+        Read the sandbox's response, stopping the sandbox if it runs over the
+        step's time budget.
+        """
+        start = time.monotonic()
+        if self.time_budget is not None:
+            remaining = max(self.time_budget - self._sandbox_time, 0)
+            ready, _, _ = select.select([self._stdout], [], [], remaining)
+            if not ready:
+                self._sandbox_time += time.monotonic() - start
+                self.close()
+                self._proc = None
+                raise TimeExceeded(
+                    f"Python step exceeded its time budget of {self.time_budget} seconds"
+                )
+        line = self._stdout.readline()
+        self._sandbox_time += time.monotonic() - start
+        return line
+
     def close(self):
         if self._proc:
             self._stdin.close()
@@ -2,12 +2,23 @@ from typing import Generator
 from typing import Optional
 
 from flows.engine import BaseOperator
+from flows.engine.checkpoint import SourceOffsets
 
 
-class ReadStep(BaseOperator):
+class ReadStep(SourceOffsets, BaseOperator):
     def execute(self, data: Optional[dict] = None, context: dict = None) -> Generator:
         import opteryx
 
+        if data == self.sigterm:
+            # the end of the flow, pass the signal on rather than reading again
+            yield data, context
+            return
+
         data = opteryx.query("SELECT * FROM $planets")
-        for row in data:
-            yield row.as_dict, context
+        if self.batch_size:
+            records = data.arrow().to_batches(max_chunksize=self.batch_size)
+        else:
+            records = (row.as_dict for row in data)
+        # when resuming a run, skip the records produced before the checkpoint
+        for record in self._offset_records(records):
+            yield record, context
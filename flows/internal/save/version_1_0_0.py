@@ -1,10 +1,61 @@
+import pickle  # nosec - only reads files written by this step
+import tempfile
 from typing import Generator
 from typing import Optional
 
 from flows.engine import BaseOperator
 
+# the most uncommitted records held in memory, the rest are written to a file
+BUFFER_SIZE = 10000
+
 
 class SaveStep(BaseOperator):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.buffer_size = self.config.get("buffer_size", BUFFER_SIZE)
+        self.spill_path = self.config.get("spill_path")
+        self._uncommitted: list = []
+        self._spill_file = None
+
     def execute(self, data: Optional[dict] = None, context: dict = None) -> Generator:
-        print(data)
+        if not self.checkpointing:
+            print(data)
+        elif data == self.sigterm:
+            # records which haven't been committed came after the last
+            # checkpoint, the run which resumes from it will write them
+            self._discard()
+        else:
+            # only write records when the flow commits, so a resumed run
+            # doesn't write them again
+            self._uncommitted.append(data)
+            if len(self._uncommitted) >= self.buffer_size:
+                self._spill()
         yield data, context
+
+    def _spill(self):
+        if self._spill_file is None:
+            # held open until the records are committed or discarded
+            self._spill_file = tempfile.TemporaryFile(  # noqa: SIM115
+                prefix="flows-save-", dir=self.spill_path
+            )
+        for record in self._uncommitted:
+            pickle.dump(record, self._spill_file)
+        self._uncommitted.clear()
+
+    def _discard(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+        self._uncommitted.clear()
+
+    def commit(self):
+        if self._spill_file is not None:
+            self._spill_file.seek(0)
+            while True:
+                try:
+                    print(pickle.load(self._spill_file))  # nosec - written by this step
+                except EOFError:
+                    break
+        for record in self._uncommitted:
+            print(record)
+        self._discard()
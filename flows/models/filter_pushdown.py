@@ -0,0 +1,183 @@
+"""
+Filter Pushdown
+
+Where a filter step reads only from an SQL step, and is the only step reading
+from it, the filter's conditions can be run by the query engine as a WHERE
+clause rather than by the filter step, so rows which would be discarded are
+never turned into records:
+
+    SELECT * FROM (<statement>) AS pushed_down WHERE (a AND b) OR (c)
+
+The filter step is then left without conditions, so it passes every record
+on. The rewrite is only made when the WHERE clause keeps exactly the records
+the filter step would keep, so conditions are only pushed down when:
+
+- every column the conditions test is declared in the flow's `schema` with a
+  type the condition's values can be compared to without conversion
+- every value can be written as an SQL literal (strings with quotes or
+  backslashes can't be, and nulls can only be tested with == and !=)
+- the statement is a single statement
+
+If any condition can't be pushed down the flow is left as it is; the
+conditions of a filter step are pushed down together or not at all.
+
+Projections are not pushed down. Nothing in a flow limits records to the
+columns in the schema, so later steps (such as a save step) see every column
+the statement returns, and dropping columns from the statement would change
+what they see.
+"""
+
+import math
+import re
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from flows.internal.filter.version_1_0_0 import FilterStep
+from flows.internal.filter.version_1_0_0 import parse_conditions
+from flows.internal.sql.version_1_0_0 import SqlStep
+
+# the Python types of values which compare the same way in the filter step
+# and the query engine, for each schema type
+SCHEMA_TYPES = {
+    "varchar": (str,),
+    "string": (str,),
+    "text": (str,),
+    "integer": (int,),
+    "int": (int,),
+    "bigint": (int,),
+    "double": (int, float),
+    "float": (int, float),
+    "boolean": (bool,),
+    "bool": (bool,),
+}
+SQL_COMPARISONS = {"==": "=", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+def _literal(value, types: tuple) -> Optional[str]:
+    """
+    The value as an SQL literal, or None if it can't be written as one which
+    compares the same way.
+    """
+    if type(value) not in types:
+        return None
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return repr(value) if math.isfinite(value) else None
+    if "'" in value or "\\" in value:
+        return None
+    return f"'{value}'"
+
+
+def _predicate(column, comparison, value, column_types: Dict[str, tuple]) -> Optional[str]:
+    """
+    A condition as an SQL predicate, or None if it can't be pushed down.
+    """
+    if not isinstance(column, str) or not IDENTIFIER.fullmatch(column):
+        return None
+    types = column_types.get(column)
+    if types is None:
+        return None
+    if value is None:
+        return f"`{column}` IS NULL" if comparison == "==" else f"`{column}` IS NOT NULL"
+    if comparison in SQL_COMPARISONS:
+        literal = _literal(value, types)
+        if literal is None:
+            return None
+        return f"`{column}` {SQL_COMPARISONS[comparison]} {literal}"
+    # an empty list isn't valid SQL, and nulls in the list don't compare the
+    # same way as they do in the filter step
+    literals = [_literal(item, types) for item in value]
+    if not literals or None in literals:
+        return None
+    operator = "IN" if comparison == "in" else "NOT IN"
+    return f"`{column}` {operator} ({', '.join(literals)})"
+
+
+def where_clause(conditions, schema: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+    """
+    The filter step conditions as an SQL WHERE clause, or None if they can't
+    all be pushed down.
+    """
+    column_types = {}
+    for column in schema or []:
+        types = SCHEMA_TYPES.get(str(column.get("type", "")).lower())
+        if column.get("name") and types:
+            column_types[column["name"]] = types
+    try:
+        groups = parse_conditions(conditions)
+    except ValueError:
+        # the filter step reports invalid conditions when it's created
+        return None
+    if not groups:
+        return None
+    clauses = []
+    for group in groups:
+        predicates = [_predicate(*condition, column_types) for condition in group]
+        if None in predicates:
+            return None
+        clauses.append("(" + " AND ".join(predicates) + ")")
+    return " OR ".join(clauses)
+
+
+def push_down_filters(steps: list, schema: Optional[List[Dict[str, Any]]]) -> Dict[str, dict]:
+    """
+    Find the filter steps whose conditions can be run by the SQL step before
+    them.
+
+    Parameters:
+        steps: list of PipelineStep
+            The steps of the pipeline, in order
+        schema: list of dictionaries
+            The columns declared in the flow's schema
+
+    Returns:
+        The rewritten configuration of the steps which were changed, by name
+    """
+    needs = {}
+    previous_step = None
+    for step in steps:
+        if step.needs is not None:
+            needs[step.name] = list(step.needs)
+        else:
+            needs[step.name] = [previous_step] if previous_step else []
+        previous_step = step.name
+    readers: Dict[str, list] = {}
+    for name, needed in needs.items():
+        for need in needed:
+            readers.setdefault(need, []).append(name)
+
+    by_name = {step.name: step for step in steps}
+    configs: Dict[str, dict] = {}
+    for step in steps:
+        if not issubclass(step.operator, FilterStep) or len(needs[step.name]) != 1:
+            continue
+        source = by_name[needs[step.name][0]]
+        if not issubclass(source.operator, SqlStep) or readers[source.name] != [step.name]:
+            continue
+        statement = source.config.get("statement")
+        if not isinstance(statement, str):
+            continue
+        statement = statement.strip()
+        if statement.endswith(";"):
+            statement = statement[:-1]
+        if ";" in statement:
+            continue
+        where = where_clause(step.config.get("conditions"), schema)
+        if where is None:
+            continue
+        # the statement is on its own lines so a trailing comment can't hide
+        # the end of the subquery
+        configs[source.name] = {
+            **source.config,
+            "statement": f"SELECT * FROM (\n{statement}\n) AS pushed_down WHERE {where}",
+        }
+        configs[step.name] = {
+            key: value for key, value in step.config.items() if key != "conditions"
+        }
+    return configs
@@ -1,9 +1,11 @@
 from typing import Any
 from typing import Dict
 from typing import List
+from typing import Optional
 
 from flows.engine import Flow
 from flows.engine.base_operator import BaseOperator
+from flows.engine.step_cache import DEFAULT_CACHE_SIZE
 from flows.internal import get_step
 from flows.utils.variable_resolver import variable_resolver
 
@@ -21,13 +23,24 @@ class PipelineStep:
             Step-specific configuration.
         step: BaseOperator
             Resolved Python class for execution.
+        needs: List[str] (optional)
+            The names of the steps this step receives records from, when not
+            set the step receives records from the step before it.
     """
 
-    def __init__(self, name: str, uses: str, config: Dict, operator: BaseOperator):
+    def __init__(
+        self,
+        name: str,
+        uses: str,
+        config: Dict,
+        operator: BaseOperator,
+        needs: Optional[List[str]] = None,
+    ):
         self.name = name
         self.uses = uses
         self.config = config
         self.operator = operator
+        self.needs = needs
 
 
 class FlowModel:
@@ -55,6 +68,7 @@ class FlowModel:
             "access_model": data.get("access_model"),
             "trigger": data.get("trigger"),
             "schema": data.get("schema", []),
+            "execution": data.get("execution", {}),
         }
 
         steps = []
@@ -62,6 +76,9 @@ class FlowModel:
             name = step["name"]
             uses = step["uses"]
             config = step.get("config", {})
+            needs = step.get("needs")
+            if isinstance(needs, str):
+                needs = [needs]
 
             version = "latest"
             module_name, attr_name = uses.rsplit("/", 1)
@@ -78,7 +95,19 @@ class FlowModel:
 
             operator = get_step(attr_name, version)
 
-            steps.append(PipelineStep(name=name, uses=uses, config=config, operator=operator))
+            steps.append(
+                PipelineStep(name=name, uses=uses, config=config, operator=operator, needs=needs)
+            )
+
+        names = {step.name for step in steps}
+        if len(names) != len(steps):
+            raise ValueError("Step names must be unique within a pipeline.")
+        for step in steps:
+            for need in step.needs or []:
+                if need == step.name:
+                    raise ValueError(f"Step '{step.name}' can't need itself.")
+                if need not in names:
+                    raise ValueError(f"Step '{step.name}' needs unknown step '{need}'.")
 
         return cls(steps=steps, flow_config=flow_config)
 
@@ -97,7 +126,13 @@ class FlowModel:
     def to_dict(self) -> Dict[str, Any]:
         return {
             "steps": [
-                {"name": step.name, "uses": step.uses, "config": step.config} for step in self.steps
+                {
+                    "name": step.name,
+                    "uses": step.uses,
+                    "config": step.config,
+                    **({} if step.needs is None else {"needs": step.needs}),
+                }
+                for step in self.steps
             ],
             **self.flow_config,
         }
@@ -121,18 +156,58 @@ class FlowModel:
     def runner(self) -> Flow:
         """
         Create a Flow object from the pipeline steps which can then be used to execute the pipeline.
+
+        Each step is linked from the steps it `needs`, or from the step before
+        it if it doesn't say what it needs, and steps which no other step needs
+        are linked to the end step.
+
+        Unless the `push_down_filters` execution option is false, the
+        conditions of filter steps which read from an SQL step are run as
+        part of the SQL statement where that keeps the same records.
         """
         from flows.engine import EndOperator
-
-        flow = Flow()
+        from flows.models.filter_pushdown import push_down_filters
+
+        execution = self.flow_config.get("execution") or {}
+
+        flow = Flow(
+            batch_size=execution.get("batch_size"),
+            branch_workers=execution.get("branch_workers"),
+            partition_workers=execution.get("partition_workers"),
+            partition_size=execution.get("partition_size", 1000),
+            pipeline_queue_size=execution.get("pipeline_queue_size"),
+            fuse_steps=execution.get("fuse_steps", False),
+            trace_path=execution.get("trace_path"),
+            profile_memory=execution.get("profile_memory", False),
+            deferred_retries=execution.get("deferred_retries", False),
+            error_batch_size=execution.get("error_batch_size", 100),
+            error_flush_interval=execution.get("error_flush_interval", 5.0),
+            time_budget=execution.get("time_budget"),
+            checkpoint_path=execution.get("checkpoint_path"),
+            checkpoint_interval=execution.get("checkpoint_interval", 60),
+            cache_path=execution.get("cache_path"),
+            cache_size=execution.get("cache_size", DEFAULT_CACHE_SIZE),
+            timings_path=execution.get("timings_path"),
+            definition=self.to_dict(),
+        )
+        configs = {}
+        if execution.get("push_down_filters", True):
+            configs = push_down_filters(self.steps, self.flow_config.get("schema"))
         previous_step = None
+        needed = set()
         for step in self.steps:
-            flow.add_step(name=step.name, operator=step.operator(**step.config))
-            if previous_step:
-                flow.link_steps(previous_step, step.name)
+            config = configs.get(step.name, step.config)
+            flow.add_step(name=step.name, operator=step.operator(**config))
+            needs = step.needs
+            if needs is None:
+                needs = [previous_step] if previous_step else []
+            for need in needs:
+                flow.link_steps(need, step.name)
+                needed.add(need)
             previous_step = step.name
         flow.add_step(name="end", operator=EndOperator())  # Add an end step
-        if previous_step:
-            flow.link_steps(previous_step, "end")
+        for step in self.steps:
+            if step.name not in needed:
+                flow.link_steps(step.name, "end")
 
         return flow
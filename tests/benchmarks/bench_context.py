@@ -0,0 +1,129 @@
+"""
+Micro-benchmark for the Context passed between steps.
+
+Compares the Context, a dictionary, with the layered copy-on-write mapping it
+replaced and with a plain dictionary - copying, reading keys which are and
+aren't in the context, on small and large contexts - and runs a linear flow
+whose steps each read from and write to the context with each of them.
+
+Run with:
+    python tests/benchmarks/bench_context.py
+"""
+
+import os
+import sys
+import time
+import timeit
+from collections import ChainMap
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from orso.logging import get_logger
+
+from flows.engine import BaseOperator
+from flows.engine import Context
+from flows.engine import EndOperator
+from flows.engine import Flow
+from flows.engine import FlowRunner
+from flows.engine import flow_runner
+
+CALLS = 200_000
+REPEATS = 5
+STEPS = 10
+RECORDS = 5000
+
+
+class PreviousContext(ChainMap):
+    """The layered copy-on-write Context, as the baseline."""
+
+    MAX_LAYERS = 16
+
+    def __init__(self, *maps):
+        super().__init__(*maps)
+        self._shared = False
+
+    def copy(self):
+        self._shared = True
+        child = self.__class__(*self.maps)
+        child._shared = True
+        return child
+
+    def __setitem__(self, key, value):
+        if self._shared:
+            if len(self.maps) >= self.MAX_LAYERS:
+                self.maps = [dict(self)]
+            else:
+                self.maps = [{}, *self.maps]
+            self._shared = False
+        self.maps[0][key] = value
+
+
+def time_statement(statement: str, context) -> float:
+    timings = timeit.repeat(statement, globals={"context": context}, number=CALLS, repeat=REPEATS)
+    return min(timings) / CALLS * 1e9
+
+
+def deep(context_type, keys: int, depth: int):
+    # a context which has been copied and written to on each of `depth` steps
+    context = context_type({f"key_{i}": i for i in range(keys)})
+    for i in range(depth):
+        context = context.copy()
+        context[f"step_{i}"] = i
+    return context
+
+
+class SourceStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        for i in range(RECORDS):
+            yield i, context
+
+
+class ContextStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        context["seen"] = context.get("tenant") and context.get("run_id")
+        return data, context
+
+
+def time_flow(context_type) -> float:
+    flow_runner.Context = context_type
+    flow = Flow()
+    flow.add_step("source", SourceStep())
+    previous = "source"
+    for i in range(STEPS):
+        flow.add_step(f"step_{i}", ContextStep())
+        flow.link_steps(previous, f"step_{i}")
+        previous = f"step_{i}"
+    flow.add_step("end", EndOperator())
+    flow.link_steps(previous, "end")
+    runner = FlowRunner(flow)
+
+    best = float("inf")
+    for _ in range(REPEATS):
+        context = {"tenant": "acme", **{f"key_{i}": i for i in range(20)}}
+        start = time.perf_counter()
+        runner(None, context)
+        best = min(best, time.perf_counter() - start)
+    flow_runner.Context = Context
+    return best / (RECORDS * STEPS) * 1e9
+
+
+if __name__ == "__main__":  # pragma: no cover
+    get_logger().setLevel(100)
+    types = (("dict", dict), ("previous", PreviousContext), ("Context", Context))
+
+    print(f"{CALLS} calls, best of {REPEATS}, ns per call")
+    print(f"{'':<34}" + "".join(f"{name:>10}" for name, _ in types))
+    for keys, depth in ((5, 0), (200, 0), (5, 15)):
+        contexts = [deep(context_type, keys, depth) for _, context_type in types]
+        for label, statement in (
+            ("copy", "context.copy()"),
+            ("get", "context.get('key_1')"),
+            ("get missing", "context.get('missing')"),
+        ):
+            timings = [time_statement(statement, context) for context in contexts]
+            name = f"{label} ({keys} keys, {depth} copies)"
+            print(f"{name:<34}" + "".join(f"{timing:>10.0f}" for timing in timings))
+
+    print(f"\n{STEPS} step flow, {RECORDS} records, ns per step per record")
+    for name, context_type in types[1:]:
+        print(f"{name:<34}{time_flow(context_type):>10.0f}")
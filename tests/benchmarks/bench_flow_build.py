@@ -0,0 +1,123 @@
+"""
+Benchmark for building and validating large flows.
+
+Builds a layered flow of 10,000 steps, each step linking to two steps in the
+next layer, and times linking the steps, validating the flow and compiling
+the execution plan. The list-based graph the Flow used to use is kept here as
+the baseline to compare against.
+
+Run with:
+    python tests/benchmarks/bench_flow_build.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from orso.logging import get_logger
+
+from flows.engine import EndOperator
+from flows.engine import ExecutionPlan
+from flows.engine import Flow
+from flows.internal.filter.version_1_0_0 import FilterStep
+
+NODES = 10_000
+WIDTH = 10
+REPEATS = 3
+
+
+class ListFlow(Flow):
+    """The list-based graph, kept here as the baseline to compare against."""
+
+    @property
+    def edges(self):
+        return self._edge_list
+
+    @edges.setter
+    def edges(self, edges):
+        self._edge_list = list(edges)
+
+    def link_steps(self, source_operator, target_operator):
+        edge = (source_operator, target_operator)
+        if edge not in self._edge_list:
+            self._edge_list.append(edge)
+
+    def get_outgoing_links(self, name):
+        return sorted({target for source, target in self._edge_list if source == name})
+
+    def get_exit_points(self):
+        sources = {source for source, target in self._edge_list}
+        return sorted({target for source, target in self._edge_list if target not in sources})
+
+    def get_entry_points(self):
+        targets = {target for source, target in self._edge_list}
+        return sorted({source for source, target in self._edge_list if source not in targets})
+
+    def find_cycle(self):
+        my_edges = self._edge_list.copy()
+        while len(my_edges) > 0:
+            sources = {source for source, target in my_edges}
+            exits = {target for source, target in my_edges if target not in sources}
+            if len(exits) == 0:
+                return []
+            my_edges = [(source, target) for source, target in my_edges if target not in exits]
+        return None
+
+
+def build_layers(nodes: int, width: int):
+    """
+    The names of the steps and the links between them, each step links to
+    two steps in the next layer and the last layer links to the end step.
+    """
+    names = [f"step_{i}" for i in range(nodes)]
+    links = []
+    for i in range(nodes - width):
+        layer, position = divmod(i, width)
+        next_layer = (layer + 1) * width
+        links.append((names[i], names[next_layer + position]))
+        links.append((names[i], names[next_layer + (position + 1) % width]))
+    for name in names[-width:]:
+        links.append((name, "end"))
+    return names, links
+
+
+def time_build(flow_class, operators: dict, links: list, plan: bool = True):
+    best = {"link": float("inf"), "validate": float("inf"), "plan": float("inf")}
+    for _ in range(REPEATS):
+        flow = flow_class()
+        start = time.perf_counter()
+        for name, operator in operators.items():
+            flow.add_step(name, operator)
+        for source, target in links:
+            flow.link_steps(source, target)
+        linked = time.perf_counter()
+        flow._validate_flow()
+        validated = time.perf_counter()
+        if plan:
+            ExecutionPlan(flow)
+        planned = time.perf_counter()
+        best["link"] = min(best["link"], linked - start)
+        best["validate"] = min(best["validate"], validated - linked)
+        best["plan"] = min(best["plan"], planned - validated)
+    return best
+
+
+if __name__ == "__main__":  # pragma: no cover
+    get_logger().setLevel(50)  # keep the operator audit messages out of the results
+
+    names, links = build_layers(NODES, WIDTH)
+    operators = {name: FilterStep() for name in names}
+    operators["end"] = EndOperator()
+
+    adjacency = time_build(Flow, operators, links)
+    baseline = time_build(ListFlow, operators, links, plan=False)
+
+    print(f"{len(operators)} step flow, {len(links)} links, best of {REPEATS}")
+    print(f"            {'list':>10} {'adjacency':>10}")
+    for stage in ("link", "validate"):
+        print(f"{stage:<10}: {baseline[stage]:>9.3f}s {adjacency[stage]:>9.3f}s")
+    print(f"{'plan':<10}: {'':>10} {adjacency['plan']:>9.3f}s")
+    total = baseline["link"] + baseline["validate"]
+    print(f"speed up  : {total / (adjacency['link'] + adjacency['validate']):.0f}x")
@@ -0,0 +1,103 @@
+"""
+Micro-benchmark for the FlowRunner scheduler.
+
+Compares the iterative, stack-based walk of the compiled execution plan with
+the recursive, name-based walk it replaced, and with the steps fused into a
+single step, on a long linear flow of trivial steps.
+
+Run with:
+    python tests/benchmarks/bench_flow_runner.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from orso.logging import get_logger
+
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import Flow
+from flows.engine import FlowRunner
+from flows.engine.base_operator import iterate_outcomes
+
+STEPS = 50
+RECORDS = 2000
+REPEATS = 5
+
+
+class SourceStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        for i in range(RECORDS):
+            yield {"value": i}, context
+
+
+class PassThroughStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        return data, context
+
+
+class FusablePassThroughStep(PassThroughStep):
+    fusable = True
+
+
+class RecursiveFlowRunner(FlowRunner):
+    """The recursive walker, kept here as the baseline to compare against."""
+
+    def _inner_runner(self, slot=None, data=None, context=None, operators=None):
+        self._recursive_runner(self.plan.names[slot], data, context)
+
+    def _recursive_runner(self, operator_name=None, data=None, context=None):
+        self.cycles += 1
+        if not context:
+            context = {}
+        operator = self.flow.get_operator(operator_name)
+        out_going_links = self.flow.get_outgoing_links(operator_name)
+        outcome = operator(data, context)
+        for outcome_data, outcome_context in iterate_outcomes(outcome):
+            for op_name in out_going_links:
+                self._recursive_runner(
+                    operator_name=op_name, data=outcome_data, context=outcome_context.copy()
+                )
+
+
+def build_flow(steps: int, fuse: bool = False) -> Flow:
+    flow = Flow(fuse_steps=fuse)
+    flow.add_step("source", SourceStep())
+    previous = "source"
+    for i in range(steps - 2):
+        flow.add_step(f"step_{i}", FusablePassThroughStep() if fuse else PassThroughStep())
+        flow.link_steps(previous, f"step_{i}")
+        previous = f"step_{i}"
+    flow.add_step("end", EndOperator())
+    flow.link_steps(previous, "end")
+    return flow
+
+
+def time_runner(runner_class, fuse: bool = False) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        flow = build_flow(STEPS, fuse)
+        flow._validate_flow()
+        runner = runner_class(flow)
+        start = time.perf_counter()
+        runner()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":  # pragma: no cover
+    get_logger().setLevel(50)  # keep the operator audit messages out of the results
+
+    recursive = time_runner(RecursiveFlowRunner)
+    iterative = time_runner(FlowRunner)
+    fused = time_runner(FlowRunner, fuse=True)
+    hops = STEPS * RECORDS
+
+    print(f"{STEPS} step flow, {RECORDS} records, best of {REPEATS}")
+    print(f"recursive : {recursive:.3f}s ({recursive / hops * 1e9:.0f}ns per hop)")
+    print(f"iterative : {iterative:.3f}s ({iterative / hops * 1e9:.0f}ns per hop)")
+    print(f"fused     : {fused:.3f}s ({fused / hops * 1e9:.0f}ns per hop)")
+    print(f"speed up  : {recursive / iterative:.2f}x, fused {recursive / fused:.2f}x")
@@ -0,0 +1,99 @@
+"""
+Micro-benchmark for the per-call overhead of BaseOperator.__call__.
+
+Compares the current call path, with and without sampled timing, with the
+previous implementation - a retry loop around every call, a list based
+failure window with append/pop(0), summing the window on every call and
+always timing - on an Operator which does no work, so the figures are the
+overhead of the wrapper.
+
+Run with:
+    python tests/benchmarks/bench_operator_call.py
+"""
+
+import asyncio
+import datetime
+import inspect
+import os
+import sys
+import time
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.engine import BaseOperator
+from flows.engine.base_operator import BATCH_TYPES
+
+CALLS = 500_000
+REPEATS = 5
+
+
+class NoOpStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        return data, context
+
+
+class PreviousNoOpStep(NoOpStep):
+    """The bookkeeping __call__ did before the fast path, as the baseline."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.previous_results = [1] * 10
+
+    def __call__(self, data=None, context=None):
+        if self.commencement_time is None:
+            self.commencement_time = datetime.datetime.now()
+        self.records_processed += 1
+        attempts_to_go = self.retry_count
+        while attempts_to_go > 0:
+            try:
+                start_time = time.perf_counter_ns()
+                if isinstance(data, BATCH_TYPES):
+                    outcome = self.execute_batch(data, context)
+                else:
+                    outcome = self.execute(data, context)
+                if inspect.iscoroutine(outcome) or inspect.isasyncgen(outcome):  # pragma: no cover
+                    outcome = asyncio.run(self._await_outcome(outcome))
+                self.execution_time_ns += time.perf_counter_ns() - start_time
+                self.previous_results.append(1)
+                self.previous_results.pop(0)
+                break
+            except Exception:  # pragma: no cover
+                attempts_to_go -= 1
+        if sum(self.previous_results) < (len(self.previous_results) / 2):  # pragma: no cover
+            sys.exit(1)
+        return outcome
+
+
+def time_calls(operator) -> float:
+    context: dict = {}
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for i in range(CALLS):
+            operator(i, context)
+        best = min(best, time.perf_counter() - start)
+    return best / CALLS * 1e9
+
+
+def time_execute(operator) -> float:
+    context: dict = {}
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for i in range(CALLS):
+            operator.execute(i, context)
+        best = min(best, time.perf_counter() - start)
+    return best / CALLS * 1e9
+
+
+if __name__ == "__main__":  # pragma: no cover
+    bare = time_execute(NoOpStep())
+    previous = time_calls(PreviousNoOpStep())
+    current = time_calls(NoOpStep())
+    sampled = time_calls(NoOpStep(timing_sample_rate=16))
+
+    print(f"{CALLS} calls, best of {REPEATS}, overhead over calling execute directly")
+    print(f"execute only      : {bare:.0f}ns per call")
+    print(f"previous __call__ : {previous - bare:.0f}ns per call")
+    print(f"__call__          : {current - bare:.0f}ns per call")
+    print(f"__call__ sampled  : {sampled - bare:.0f}ns per call (timing 1 in 16)")
@@ -0,0 +1,235 @@
+"""
+Test cases for asynchronous Operators and the AsyncFlowRunner.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+import pyarrow
+
+from flows.engine import AsyncFlowRunner
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import Flow
+from flows.engine import FlowRunner
+from flows.exceptions import FlowError
+
+
+class SourceStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            yield data, context
+            return
+        if self.batch_size:
+            table = pyarrow.table({"value": list(range(20))})
+            for batch in table.to_batches(max_chunksize=self.batch_size):
+                yield batch, context
+            return
+        for i in range(20):
+            yield i, context
+
+
+class SlowUploadStep(BaseOperator):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.uploaded = []
+        self.failed_once = set()
+
+    async def execute(self, data=None, context=None):
+        await asyncio.sleep(0.05)
+        if data in self.failed_once or data != 3:
+            self.uploaded.append(data)
+            return data, context
+        # fail record 3 once, it will be retried
+        self.failed_once.add(data)
+        raise ConnectionError("endpoint unavailable")
+
+
+class AsyncFanOutStep(BaseOperator):
+    async def execute(self, data=None, context=None):
+        for i in range(2):
+            await asyncio.sleep(0)
+            yield (data, i), context
+
+
+def _build_flow():
+    flow = Flow()
+    flow.add_step("source", SourceStep())
+    flow.add_step("upload", SlowUploadStep(retry_wait=1))
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "upload")
+    flow.link_steps("upload", "end")
+    return flow
+
+
+def test_async_runner_processes_records_concurrently():
+    flow = _build_flow()
+    runner = AsyncFlowRunner(flow, max_in_flight=20)
+
+    start = time.monotonic()
+    asyncio.run(runner())
+    elapsed = time.monotonic() - start
+
+    upload = flow.get_operator("upload")
+    assert sorted(upload.uploaded) == list(range(20))
+    assert upload.errors == 1
+    # serially this would be over 2s, the retry wait does not block the others
+    assert elapsed < 1.5, elapsed
+    assert flow.get_operator("end").records_processed == 20
+
+
+def test_async_runner_limits_records_in_flight():
+    flow = _build_flow()
+    runner = AsyncFlowRunner(flow, max_in_flight=5)
+
+    start = time.monotonic()
+    asyncio.run(runner())
+    elapsed = time.monotonic() - start
+
+    # four waves of five records at 0.05s, plus the retry
+    assert elapsed >= 0.2, elapsed
+    assert len(flow.get_operator("upload").uploaded) == 20
+
+
+def test_sync_runner_runs_async_operators():
+    step = AsyncFanOutStep()
+    assert step("a", {}) == [(("a", 0), {}), (("a", 1), {})]
+
+    flow = Flow()
+    flow.add_step("source", SourceStep())
+    flow.add_step("fan", AsyncFanOutStep())
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "fan")
+    flow.link_steps("fan", "end")
+    FlowRunner(flow)()
+    assert flow.get_operator("end").records_processed == 40
+
+
+class AsyncDoublingStep(BaseOperator):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+
+    async def execute(self, data=None, context=None):
+        await asyncio.sleep(0)
+        if data == self.sigterm:
+            return data, context
+        if data["value"] % 2:
+            return None
+        return {"value": data["value"] * 2}, context
+
+
+class BatchSinkStep(BaseOperator):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.values = []
+
+    def execute(self, data=None, context=None):
+        return data, context
+
+    def execute_batch(self, data=None, context=None):
+        self.values.extend(data.column("value").to_pylist())
+        yield data, context
+
+
+def _build_batch_flow():
+    flow = Flow(batch_size=8)
+    flow.add_step("source", SourceStep())
+    flow.add_step("double", AsyncDoublingStep())
+    flow.add_step("sink", BatchSinkStep())
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "double")
+    flow.link_steps("double", "sink")
+    flow.link_steps("sink", "end")
+    return flow
+
+
+def test_async_operators_run_in_batch_mode():
+    expected = [i * 2 for i in range(20) if i % 2 == 0]
+
+    flow = _build_batch_flow()
+    with flow as runner:
+        runner()
+        assert flow.get_operator("double").errors == 0
+        assert flow.get_operator("sink").values == expected
+
+    async def run_flow():
+        async with flow as runner:
+            await runner()
+
+    flow = _build_batch_flow()
+    asyncio.run(run_flow())
+    assert flow.get_operator("double").errors == 0
+    assert sorted(flow.get_operator("sink").values) == expected
+
+
+class AsyncPassStep(BaseOperator):
+    async def execute(self, data=None, context=None):
+        await asyncio.sleep(0.01)
+        return data, context
+
+
+def test_async_flows_are_entered_and_exited_in_a_coroutine(monkeypatch):
+    audited = []
+    monkeypatch.setattr("flows.engine.flow.logger.audit", audited.append)
+
+    async def run_flow(flow):
+        async with flow as runner:
+            assert isinstance(runner, AsyncFlowRunner)
+            await runner()
+
+    flow = Flow(batch_size=8)
+    flow.add_step("source", SourceStep())
+    flow.add_step("double", AsyncDoublingStep())
+    flow.add_step("upload", AsyncPassStep())
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "double")
+    flow.link_steps("double", "upload")
+    flow.link_steps("upload", "end")
+    start = time.monotonic()
+    asyncio.run(run_flow(flow))
+    # the shut down is awaited on the loop, no step fails or waits to retry
+    assert time.monotonic() - start < 1
+    assert flow.has_run
+    sensors = {entry["operator"]: entry for entry in audited}
+    assert sensors["AsyncDoublingStep"]["error_count"] == 0
+    assert sensors["AsyncPassStep"]["error_count"] == 0
+    # three batches, then the sigterm
+    assert sensors["AsyncPassStep"]["records_processed"] == 4
+
+    # entering without awaiting would have to run the steps with asyncio.run
+    async def enter_synchronously(flow):
+        with flow:
+            pass  # pragma: no cover
+
+    try:
+        asyncio.run(enter_synchronously(_build_batch_flow()))
+    except FlowError as err:
+        assert "async with" in str(err)
+    else:  # pragma: no cover
+        assert False, "Expected FlowError for entering an async flow synchronously"
+
+
+def test_async_runner_refuses_options_it_does_not_honour():
+    with tempfile.TemporaryDirectory() as tmp:
+        for options in ({"time_budget": 10}, {"checkpoint_path": tmp}, {"profile_memory": True}):
+            flow = _build_flow()
+            for option, value in options.items():
+                setattr(flow, option, value)
+            try:
+                AsyncFlowRunner(flow)
+            except FlowError as err:
+                assert next(iter(options)) in str(err), err
+            else:  # pragma: no cover
+                assert False, f"Expected FlowError for {options}"
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
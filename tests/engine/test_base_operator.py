@@ -0,0 +1,92 @@
+"""
+Test cases for the management BaseOperator wraps around `execute`.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.engine import BaseOperator
+
+
+class SometimesFailingStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data < 0:
+            raise ValueError("negative")
+        return data, context
+
+
+class SlowGeneratorStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        for i in range(3):
+            time.sleep(0.01)
+            yield i, context
+
+
+def test_generator_time_is_charged_to_the_operator():
+    step = SlowGeneratorStep()
+    outcome = step(None, {})
+    assert step.execution_time_ns == 0  # nothing has run yet
+
+    for _ in outcome:
+        # time spent by the steps consuming the records isn't charged
+        time.sleep(0.05)
+
+    assert 0.03 <= step.execution_time_ns / 1e9 < 0.15
+    assert step.records_yielded == 3
+    assert step.latency_histogram.count == 1
+    assert step.read_sensors()["records_yielded"] == 3
+
+
+def test_returned_records_are_counted():
+    step = SometimesFailingStep()
+    step(1, {})
+    step(2, {})
+    assert step.records_yielded == 2
+
+
+def test_failure_window_tracks_the_last_results():
+    step = SometimesFailingStep(retry_count=1, rolling_failure_window=4)
+    assert step.last_few_results == [1, 1, 1, 1]
+
+    step(-1, {})
+    step(1, {})
+    assert step.last_few_results == [1, 1, 0, 1]
+    step(2, {})
+    step(3, {})
+    assert step.last_few_results == [0, 1, 1, 1]
+    step(4, {})
+    assert step.last_few_results == [1, 1, 1, 1]
+    assert step.errors == 1
+    assert step.records_processed == 5
+
+
+def test_high_failure_rates_abort():
+    step = SometimesFailingStep(retry_count=1, rolling_failure_window=4)
+    step(-1, {})
+    step(-1, {})
+    try:
+        # three failures in the last four results is over 50%
+        step(-1, {})
+    except SystemExit:
+        pass
+    else:  # pragma: no cover
+        assert False, "Expected SystemExit when the failure rate is over 50%"
+
+
+def test_sampled_timing_extrapolates():
+    step = SometimesFailingStep(timing_sample_rate=4)
+    for i in range(3):
+        step(i, {})
+    assert step.execution_time_ns == 0
+    step(3, {})
+    assert step.execution_time_ns > 0
+    assert step.records_processed == 4
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
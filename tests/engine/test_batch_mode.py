@@ -0,0 +1,94 @@
+"""
+Test cases for running flows in batch mode, where Arrow batches rather than
+individual records are passed between Operators.
+"""
+
+import os
+import sys
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+import pyarrow
+
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import Flow
+from flows.internal.sql.version_1_0_0 import SqlStep
+
+
+class UpperCaseStep(BaseOperator):
+    def execute(self, data: dict = None, context: dict = None):
+        if data == self.sigterm:
+            return data, context
+        if data["name"] == "Mars":
+            return None
+        return {"name": data["name"].upper()}, context
+
+
+class CollectStep(BaseOperator):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.collected = []
+
+    def execute(self, data=None, context: dict = None):
+        if data != self.sigterm:
+            self.collected.append(data)
+        yield data, context
+
+    def execute_batch(self, data=None, context: dict = None):
+        # batch-native, receive the whole batch rather than adapted rows
+        self.collected.append(data)
+        yield data, context
+
+
+def _build_flow(batch_size=None):
+    flow = Flow(batch_size=batch_size)
+    flow.add_step("read", SqlStep(statement="SELECT name FROM $planets"))
+    flow.add_step("upper", UpperCaseStep())
+    flow.add_step("collect", CollectStep())
+    flow.add_step("end", EndOperator())
+    flow.link_steps("read", "upper")
+    flow.link_steps("upper", "collect")
+    flow.link_steps("collect", "end")
+    return flow
+
+
+def test_batch_mode_yields_arrow_batches():
+    flow = _build_flow(batch_size=4)
+    with flow as runner:
+        runner()
+        collected = flow.get_operator("collect").collected
+
+        # 9 planets in batches of 4, each batch is adapted row by row
+        assert len(collected) == 3, len(collected)
+        assert all(isinstance(batch, pyarrow.Table) for batch in collected)
+        assert flow.get_operator("upper").records_processed == 3
+
+
+def test_batch_mode_matches_row_mode():
+    row_flow = _build_flow()
+    with row_flow as runner:
+        runner()
+        rows = list(row_flow.get_operator("collect").collected)
+
+    batch_flow = _build_flow(batch_size=4)
+    with batch_flow as runner:
+        runner()
+        batches = batch_flow.get_operator("collect").collected
+        batch_rows = [row for batch in batches for row in batch.to_pylist()]
+
+    assert len(rows) == 8
+    assert batch_rows == rows
+    assert "MARS" not in {row["name"] for row in batch_rows}
+
+
+def test_batch_adapter_drops_empty_batches():
+    step = UpperCaseStep()
+    batch = pyarrow.Table.from_pylist([{"name": "Mars"}])
+    assert list(step(batch, {})) == []
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
@@ -0,0 +1,177 @@
+"""
+Test cases for checkpointing runs and resuming them.
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import Flow
+from flows.engine.checkpoint import SourceOffsets
+from flows.exceptions import FlowError
+
+
+class SourceStep(SourceOffsets, BaseOperator):
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            yield data, context
+            return
+        for record in self._offset_records(range(20)):
+            yield record, context
+
+
+class CrashingStep(BaseOperator):
+    def __init__(self, crash_at=None, **kwargs):
+        super().__init__(**kwargs)
+        self.crash_at = crash_at
+
+    def execute(self, data=None, context=None):
+        if data == self.crash_at:
+            # not an Exception, so isn't retried, like the process being killed
+            raise KeyboardInterrupt()
+        return data, context
+
+
+class CountingStep(BaseOperator):
+    """a stateful step, counts the records it has seen"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.seen = 0
+
+    def execute(self, data=None, context=None):
+        if data != self.sigterm:
+            self.seen += 1
+        return data, context
+
+    def checkpoint_state(self):
+        return {"seen": self.seen}
+
+    def restore_checkpoint(self, state):
+        self.seen = state["seen"]
+
+
+class SinkStep(BaseOperator):
+    def __init__(self, written, **kwargs):
+        super().__init__(**kwargs)
+        self.written = written
+        self.uncommitted = []
+
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            self.uncommitted.clear()
+        else:
+            self.uncommitted.append(data)
+        return data, context
+
+    def commit(self):
+        self.written.extend(self.uncommitted)
+        self.uncommitted.clear()
+
+
+class CrashingSinkStep(SinkStep):
+    """dies part way through a commit, after writing its records"""
+
+    def __init__(self, written, crash_on_commit, **kwargs):
+        super().__init__(written, **kwargs)
+        self.crash_on_commit = crash_on_commit
+        self.commits = 0
+
+    def commit(self):
+        super().commit()
+        self.commits += 1
+        if self.commits == self.crash_on_commit:
+            raise KeyboardInterrupt()
+
+
+def _build_flow(path, written, crash_at=None, resume_run_id=None, sink=None):
+    flow = Flow(checkpoint_path=path, checkpoint_interval=0, resume_run_id=resume_run_id)
+    flow.add_step("source", SourceStep())
+    flow.add_step("crash", CrashingStep(crash_at=crash_at))
+    flow.add_step("count", CountingStep())
+    flow.add_step("sink", sink or SinkStep(written))
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "crash")
+    flow.link_steps("crash", "count")
+    flow.link_steps("count", "sink")
+    flow.link_steps("sink", "end")
+    return flow
+
+
+def test_resumed_runs_neither_skip_nor_repeat_records():
+    written = []
+    with tempfile.TemporaryDirectory() as tmp:
+        flow = _build_flow(tmp, written, crash_at=12)
+        try:
+            with flow as runner:
+                runner(None, {"run_id": "interrupted"})
+            assert False, "the run should have crashed"  # pragma: no cover
+        except KeyboardInterrupt:
+            pass
+        assert written == list(range(12))
+
+        flow = _build_flow(tmp, written, resume_run_id="interrupted")
+        with flow as runner:
+            runner(None, {"run_id": "ignored"})
+        assert written == list(range(20))
+        # the state of the stateful step carried over
+        assert flow.get_operator("count").seen == 20
+        assert flow.checkpointer.store.load("interrupted")["complete"]
+
+        # resuming a completed run does nothing
+        flow = _build_flow(tmp, written, resume_run_id="interrupted")
+        with flow as runner:
+            runner()
+        assert written == list(range(20))
+
+
+def test_runs_stopped_while_committing_write_records_at_least_once():
+    written = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # a checkpoint is taken before each record, the sink commits record 7
+        # then the run dies before the checkpoint is marked as committed
+        flow = _build_flow(tmp, written, sink=CrashingSinkStep(written, crash_on_commit=9))
+        try:
+            with flow as runner:
+                runner(None, {"run_id": "interrupted"})
+            assert False, "the run should have crashed"  # pragma: no cover
+        except KeyboardInterrupt:
+            pass
+        assert written == list(range(8))
+        assert not flow.checkpointer.store.load("interrupted")["committed"]
+
+        flow = _build_flow(tmp, written, resume_run_id="interrupted")
+        with flow as runner:
+            runner(None, {"run_id": "ignored"})
+        # resumed from the checkpoint before, so record 7 is written again
+        assert written == list(range(8)) + list(range(7, 20))
+        assert flow.get_operator("count").seen == 20
+
+
+def test_runs_can_only_be_resumed_from_checkpoints():
+    with tempfile.TemporaryDirectory() as tmp:
+        flow = _build_flow(tmp, [], resume_run_id="missing")
+        try:
+            with flow:
+                pass  # pragma: no cover
+            assert False, "there is no checkpoint to resume"  # pragma: no cover
+        except FlowError:
+            pass
+
+    flow = _build_flow(None, [], resume_run_id="missing")
+    try:
+        with flow:
+            pass  # pragma: no cover
+        assert False, "the flow isn't checkpointed"  # pragma: no cover
+    except FlowError:
+        pass
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
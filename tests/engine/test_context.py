@@ -0,0 +1,114 @@
+"""
+Test cases for the Context passed between steps.
+"""
+
+import copy
+import json
+import os
+import pickle
+import sys
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.engine import BaseOperator
+from flows.engine import Context
+from flows.engine import EndOperator
+from flows.engine import Flow
+from flows.engine import FlowRunner
+
+
+def test_copies_are_independent():
+    parent = Context({"tenant": "acme", "run_id": "abc"})
+    child = parent.copy()
+
+    assert child == {"tenant": "acme", "run_id": "abc"}
+    assert isinstance(child, Context)
+
+    child["step"] = "filter"
+    assert "step" not in parent
+    assert child["step"] == "filter"
+    assert child["tenant"] == "acme"
+
+    # the parent can't change what the child sees
+    parent["tenant"] = "globex"
+    assert child["tenant"] == "acme"
+    assert parent["tenant"] == "globex"
+
+
+def test_deletes_do_not_leak_between_copies():
+    parent = Context({"a": 1, "b": 2})
+    child = parent.copy()
+
+    del child["a"]
+    assert "a" not in child
+    assert parent["a"] == 1
+    assert child.pop("b") == 2
+    assert child.pop("b", None) is None
+    assert parent == {"a": 1, "b": 2}
+
+
+def test_merges_do_not_leak_between_copies():
+    parent = Context({"a": 1})
+    sibling = parent.copy()
+    child = parent.copy()
+
+    child |= {"b": 2}
+    child.update(c=3)
+    merged = sibling | {"d": 4}
+
+    assert child == {"a": 1, "b": 2, "c": 3}
+    assert merged == {"a": 1, "d": 4}
+    assert isinstance(merged, Context)
+    assert parent == {"a": 1}
+    assert sibling == {"a": 1}
+
+
+def test_context_behaves_like_a_dict():
+    context = Context({"a": 1})
+    context.update({"b": 2})
+    context.setdefault("c", 3)
+
+    assert isinstance(context, dict)
+    assert dict(context) == {"a": 1, "b": 2, "c": 3}
+    assert repr(context) == repr({"a": 1, "b": 2, "c": 3})
+    assert json.loads(json.dumps(context)) == {"a": 1, "b": 2, "c": 3}
+    assert type(pickle.loads(pickle.dumps(context))) is Context
+    assert pickle.loads(pickle.dumps(context)) == context
+    assert type(copy.copy(context)) is Context
+
+
+class ContextWriterStep(BaseOperator):
+    def __init__(self, key, **kwargs):
+        super().__init__(**kwargs)
+        self.key = key
+        self.seen = []
+
+    def execute(self, data=None, context=None):
+        self.seen.append(dict(context))
+        context[self.key] = True
+        return data, context
+
+
+def test_branches_do_not_see_each_others_writes():
+    flow = Flow()
+    flow.add_step("source", ContextWriterStep("source"))
+    flow.add_step("left", ContextWriterStep("left"))
+    flow.add_step("right", ContextWriterStep("right"))
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "left")
+    flow.link_steps("source", "right")
+    flow.link_steps("left", "end")
+    flow.link_steps("right", "end")
+
+    FlowRunner(flow)(data=1, context={"run_id": "test"})
+
+    (left,) = flow.get_operator("left").seen
+    (right,) = flow.get_operator("right").seen
+    assert left == {"run_id": "test", "source": True}
+    assert right == {"run_id": "test", "source": True}
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
@@ -0,0 +1,108 @@
+"""
+Test cases for running the branches with the longest critical path first.
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import ExecutionPlan
+from flows.engine import Flow
+from flows.engine.critical_path import TIMING_WEIGHT
+from flows.engine.critical_path import critical_paths
+from flows.engine.critical_path import load_step_timings
+
+
+class RecordingStep(BaseOperator):
+    def __init__(self, visits, **kwargs):
+        super().__init__(**kwargs)
+        self.visits = visits
+
+    def execute(self, data=None, context=None):
+        if data != self.sigterm:
+            self.visits.append(self.name)
+        return data, context
+
+
+def _wide_flow(visits, **kwargs):
+    flow = Flow(**kwargs)
+    for name in ("read", "enrich_a", "enrich_b", "enrich_c", "save_c"):
+        step = RecordingStep(visits)
+        step.name = name
+        flow.add_step(name, step)
+    flow.add_step("end", EndOperator())
+    flow.link_steps("read", "enrich_a")
+    flow.link_steps("read", "enrich_b")
+    flow.link_steps("read", "enrich_c")
+    flow.link_steps("enrich_c", "save_c")
+    flow.link_steps("enrich_a", "end")
+    flow.link_steps("enrich_b", "end")
+    flow.link_steps("save_c", "end")
+    return flow
+
+
+def test_critical_paths():
+    # 0 -> 1 -> 3, 0 -> 2 -> 3
+    paths = critical_paths([1.0, 5.0, 2.0, 1.0], [(1, 2), (3,), (3,), ()])
+    assert paths == (7.0, 6.0, 3.0, 1.0)
+
+
+def test_links_are_ordered_by_critical_path():
+    flow = _wide_flow([])
+    plan = ExecutionPlan(flow)
+    # without timings, links are in name order
+    assert [plan.names[slot] for slot in plan.links[0]] == ["enrich_a", "enrich_b", "enrich_c"]
+    assert set(plan.critical_path) == {0.0}
+
+    timings = {"enrich_a": 0.5, "enrich_b": 2.0, "save_c": 1.0, "end": 0.0}
+    plan = ExecutionPlan(flow, step_timings=timings)
+    # enrich_c has no timing so is estimated at the average, and is followed by save_c
+    assert [plan.names[slot] for slot in plan.links[0]] == ["enrich_b", "enrich_c", "enrich_a"]
+    assert plan.critical_path[plan.slot_of("enrich_c")] == 1.875
+
+
+def test_longest_branches_run_first():
+    visits: list = []
+    with tempfile.TemporaryDirectory() as tmp:
+        timings_path = os.path.join(tmp, "timings.json")
+        with open(timings_path, "w", encoding="utf-8") as timings_file:
+            json.dump({"enrich_a": 3.0, "enrich_b": 1.0, "enrich_c": 1.0}, timings_file)
+
+        flow = _wide_flow(visits, timings_path=timings_path)
+        with flow as runner:
+            runner()
+        assert visits == ["read", "enrich_a", "enrich_c", "save_c", "enrich_b"]
+
+        # the timings of this run are blended into the saved timings
+        timings = load_step_timings(timings_path)
+        enrich_a = flow.get_operator("enrich_a")
+        measured = enrich_a.execution_time_ns / enrich_a.records_processed / 1e9
+        assert abs(timings["enrich_a"] - (3.0 + (measured - 3.0) * TIMING_WEIGHT)) < 1e-9
+        assert "save_c" in timings and "end" in timings
+
+
+def test_unreadable_timings_are_ignored():
+    visits: list = []
+    with tempfile.TemporaryDirectory() as tmp:
+        timings_path = os.path.join(tmp, "timings.json")
+        for content in ('{"enrich_a": 3.0, "enr', "\xff\xfe", "[1, 2]"):
+            with open(timings_path, "w", encoding="latin-1") as timings_file:
+                timings_file.write(content)
+            assert load_step_timings(timings_path) == {}
+
+        # the flow runs without them, and saves the timings of this run
+        flow = _wide_flow(visits, timings_path=timings_path)
+        with flow as runner:
+            runner()
+        assert "enrich_a" in load_step_timings(timings_path)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
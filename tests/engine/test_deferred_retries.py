@@ -0,0 +1,124 @@
+"""
+Test cases for retrying failed records without holding up the flow.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import Flow
+
+
+class SourceStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            yield data, context
+            return
+        for i in range(6):
+            yield i, context
+
+
+class FlakyStep(BaseOperator):
+    """fails the first `failures` attempts for the records in `failing`"""
+
+    def __init__(self, failing=(), failures=1, **kwargs):
+        super().__init__(**kwargs)
+        self.failing = set(failing)
+        self.failures = failures
+        self.attempts = {}
+
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            return data, context
+        self.attempts[data] = self.attempts.get(data, 0) + 1
+        if data in self.failing and self.attempts[data] <= self.failures:
+            raise ConnectionError(f"{data} failed")
+        return data, context
+
+
+class CollectStep(BaseOperator):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.collected = []
+
+    def execute(self, data=None, context=None):
+        if data != self.sigterm:
+            self.collected.append(data)
+        return data, context
+
+
+def _build_flow(flaky, deferred_retries=True):
+    # waits are clamped to at least a second, shorten them for the tests
+    flaky.retry_wait = 0.05
+    collect = CollectStep()
+    flow = Flow(deferred_retries=deferred_retries)
+    flow.add_step("source", SourceStep())
+    flow.add_step("flaky", flaky)
+    flow.add_step("collect", collect)
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "flaky")
+    flow.link_steps("flaky", "collect")
+    flow.link_steps("collect", "end")
+    return flow, collect
+
+
+def test_failed_records_do_not_hold_up_other_records():
+    flaky = FlakyStep(failing={1}, retry_count=3)
+    flow, collect = _build_flow(flaky)
+    with flow as runner:
+        start = time.monotonic()
+        runner()
+        assert time.monotonic() - start >= 0.05
+
+    # the failed record was retried after the others had been processed
+    assert collect.collected == [0, 2, 3, 4, 5, 1]
+    assert flaky.errors == 1
+    assert flaky.attempts[1] == 2
+
+
+def test_retries_wait_by_default():
+    flaky = FlakyStep(failing={1}, retry_count=3)
+    flow, collect = _build_flow(flaky, deferred_retries=False)
+    with flow as runner:
+        runner()
+    assert collect.collected == [0, 1, 2, 3, 4, 5]
+
+
+def test_records_are_dropped_when_attempts_run_out():
+    flaky = FlakyStep(failing={1, 2}, failures=5, retry_count=3, rolling_failure_window=100)
+    flow, collect = _build_flow(flaky)
+    with flow as runner:
+        runner()
+    assert collect.collected == [0, 3, 4, 5]
+    assert flaky.attempts[1] == 3
+    assert flaky.errors == 6
+
+
+def test_retry_budget_limits_retries():
+    flaky = FlakyStep(failing={1, 2}, retry_count=3, retry_budget=1, rolling_failure_window=100)
+    flow, collect = _build_flow(flaky)
+    with flow as runner:
+        runner()
+    assert collect.collected == [0, 3, 4, 5, 1]
+    assert flaky.attempts[2] == 1
+    assert flaky.retry_budget == 0
+
+
+def test_exponential_backoff_with_jitter():
+    step = FlakyStep(retry_wait=2, retry_backoff=2)
+    assert [step._retry_delay(attempt) for attempt in (1, 2, 3, 10)] == [2, 4, 8, 300]
+
+    step = FlakyStep(retry_wait=2, retry_backoff=2, retry_jitter=True)
+    for attempt in (1, 2, 3):
+        delay = step._retry_delay(attempt)
+        assert 2 ** (attempt - 1) <= delay <= 2**attempt
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
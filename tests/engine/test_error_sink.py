@@ -0,0 +1,120 @@
+"""
+Test cases for writing failed records to the error bin in the background.
+"""
+
+import gzip
+import os
+import sys
+import time
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import Flow
+from flows.engine.error_sink import FIELD_LIMIT
+from flows.engine.error_sink import ErrorSink
+from flows.engine.error_sink import render_error
+
+
+class SourceStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            yield data, context
+            return
+        for i in range(5):
+            yield {"id": i, "payload": "x" * 100_000}, context
+
+
+class FailingStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data != self.sigterm and data["id"] % 2:
+            raise ValueError(f"odd record {data['id']}")
+        return data, context
+
+
+class BatchCollector:
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, payload: bytes):
+        self.batches.append(gzip.decompress(payload).decode())
+        return "written"
+
+
+def _raised(err):
+    try:
+        raise err
+    except Exception as caught:
+        return caught
+
+
+def test_large_records_are_capped():
+    text = render_error(
+        "operator", "Step", _raised(ValueError("bad")), {"big": "x" * 100_000}, {"run_id": "1"}
+    )
+    assert len(text) < FIELD_LIMIT * 2
+    assert "ValueError: bad" in text
+    assert "operator   : Step" in text
+
+
+def test_failures_are_written_in_batches_at_shutdown():
+    collector = BatchCollector()
+    flow = Flow(error_writer=collector, error_batch_size=10, error_flush_interval=60)
+    failing = FailingStep(retry_count=1, rolling_failure_window=100)
+    flow.add_step("source", SourceStep())
+    flow.add_step("failing", failing)
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "failing")
+    flow.link_steps("failing", "end")
+
+    with flow as runner:
+        runner()
+        # nothing is written while the batch is filling
+        assert collector.batches == []
+
+    assert len(collector.batches) == 1
+    batch = collector.batches[0]
+    assert batch.count("reference  : ") == 2
+    assert "odd record 1" in batch and "odd record 3" in batch
+    assert failing.errors == 2
+
+
+def test_failures_are_written_when_batches_fill():
+    collector = BatchCollector()
+    sink = ErrorSink(collector, batch_size=2, flush_interval=60)
+    for i in range(4):
+        reference = sink.submit("operator", "Step", _raised(ValueError(str(i))), i, {})
+        assert len(reference) == 16
+    for _ in range(100):
+        if len(collector.batches) == 2:
+            break
+        time.sleep(0.01)
+    assert len(collector.batches) == 2
+    sink.close()
+    assert sink.written == 4
+
+
+def test_failures_are_written_on_a_timer():
+    collector = BatchCollector()
+    sink = ErrorSink(collector, batch_size=100, flush_interval=0.05)
+    sink.submit("operator", "Step", _raised(ValueError("late")), 1, {})
+    time.sleep(0.3)
+    assert len(collector.batches) == 1
+    sink.close()
+
+
+def test_failures_over_the_limit_are_dropped():
+    collector = BatchCollector()
+    sink = ErrorSink(collector, batch_size=100, flush_interval=60, max_pending=1)
+    sink.submit("operator", "Step", _raised(ValueError("kept")), 1, {})
+    assert sink.submit("operator", "Step", _raised(ValueError("dropped")), 2, {}) == "NOT LOGGED"
+    sink.close()
+    assert sink.written == 1
+    assert sink.dropped == 1
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
@@ -0,0 +1,73 @@
+"""
+Test cases for compiling Flows into ExecutionPlans.
+"""
+
+import os
+import sys
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.engine import EndOperator
+from flows.engine import ExecutionPlan
+from flows.engine import Flow
+from flows.exceptions import FlowError
+from flows.internal.filter.version_1_0_0 import FilterStep
+
+
+def _diamond_flow():
+    flow = Flow()
+    flow.add_step("end", EndOperator())
+    flow.add_step("right", FilterStep())
+    flow.add_step("left", FilterStep())
+    flow.add_step("source", FilterStep())
+    flow.link_steps("source", "right")
+    flow.link_steps("source", "left")
+    flow.link_steps("left", "end")
+    flow.link_steps("right", "end")
+    return flow
+
+
+def test_plan_is_topologically_ordered():
+    flow = _diamond_flow()
+    plan = ExecutionPlan(flow)
+
+    assert plan.topological_order == ("source", "right", "left", "end")
+    assert plan.entry_points == (0,)
+    # links are ordered by target name, as Flow.get_outgoing_links
+    assert plan.links == ((2, 1), (3,), (3,), ())
+    assert plan.operators[plan.slot_of("end")] is flow.get_operator("end")
+
+
+def test_plan_is_built_when_the_flow_is_entered():
+    flow = _diamond_flow()
+    assert flow.plan is None
+    with flow as runner:
+        assert runner.plan is flow.plan
+        assert isinstance(flow.plan, ExecutionPlan)
+
+
+def test_plan_is_immutable():
+    plan = ExecutionPlan(_diamond_flow())
+    try:
+        plan.links = ()
+    except AttributeError:
+        pass
+    else:  # pragma: no cover
+        assert False, "Expected AttributeError when modifying a plan"
+
+
+def test_plan_rejects_missing_operators():
+    flow = _diamond_flow()
+    flow.link_steps("left", "missing")
+    try:
+        ExecutionPlan(flow)
+    except FlowError:
+        pass
+    else:  # pragma: no cover
+        assert False, "Expected FlowError for a link to a missing step"
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
@@ -0,0 +1,73 @@
+"""
+Test cases for building and validating the graph of a Flow.
+"""
+
+import os
+import sys
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.engine import EndOperator
+from flows.engine import Flow
+from flows.exceptions import FlowError
+from flows.internal.filter.version_1_0_0 import FilterStep
+
+
+def _flow(*edges):
+    flow = Flow()
+    for edge in edges:
+        for name in edge:
+            if name not in flow.nodes:
+                flow.add_step(name, EndOperator() if name == "end" else FilterStep())
+        flow.link_steps(*edge)
+    return flow
+
+
+def test_links():
+    flow = _flow(("a", "c"), ("a", "b"), ("b", "end"), ("c", "end"), ("a", "b"))
+    # links are only added once, and edges keep the order they were added
+    assert flow.edges == (("a", "c"), ("a", "b"), ("b", "end"), ("c", "end"))
+    assert flow.get_outgoing_links("a") == ["b", "c"]
+    assert flow.get_incoming_links("end") == ["b", "c"]
+    assert flow.get_entry_points() == ["a"]
+    assert flow.get_exit_points() == ["end"]
+    assert flow.is_acyclic()
+    assert flow.find_cycle() is None
+
+
+def test_edges_can_be_replaced():
+    flow = _flow(("a", "b"), ("b", "end"))
+    flow.edges = [("a", "end")]
+    assert flow.get_outgoing_links("a") == ["end"]
+    assert flow.get_incoming_links("b") == []
+    # edges are a snapshot, so can't be changed in place
+    assert not hasattr(flow.edges, "append")
+
+
+def test_cycles_are_reported():
+    flow = _flow(("a", "b"), ("b", "c"), ("c", "d"), ("d", "b"), ("c", "end"))
+    assert not flow.is_acyclic()
+    assert flow.find_cycle() == ["b", "c", "d", "b"]
+    try:
+        flow.__enter__()
+    except FlowError as err:
+        assert "b -> c -> d -> b" in str(err)
+    else:  # pragma: no cover
+        assert False, "Expected FlowError for a cyclic flow"
+
+    assert _flow(("a", "a")).find_cycle() == ["a", "a"]
+
+
+def test_merge_keeps_the_order_of_edges():
+    flow = _flow(("a", "b"), ("b", "end"))
+    other = _flow(("x", "y"), ("a", "b"), ("y", "end"))
+    flow.merge(other)
+    assert flow.edges == (("a", "b"), ("b", "end"), ("x", "y"), ("y", "end"))
+    assert set(flow.nodes) == {"a", "b", "x", "y", "end"}
+    assert flow.get_entry_points() == ["a", "x"]
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
@@ -0,0 +1,92 @@
+"""
+Test cases for the FlowRunner, the component which walks a flow passing
+records between Operators.
+"""
+
+import os
+import sys
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import Flow
+from flows.engine import FlowRunner
+
+VISITS: list = []
+
+
+class SourceStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        for i in range(3):
+            yield i, context
+
+
+class RecordStep(BaseOperator):
+    def __init__(self, label, **kwargs):
+        super().__init__(**kwargs)
+        self.label = label
+
+    def execute(self, data=None, context=None):
+        VISITS.append((self.label, data))
+        return data, context
+
+
+def _recursive_order(flow, name, data, visits):
+    """Reference depth-first order, as produced by the recursive walker."""
+    operator = flow.get_operator(name)
+    if isinstance(operator, RecordStep):
+        visits.append((operator.label, data))
+    outcomes = [(i, {}) for i in range(3)] if isinstance(operator, SourceStep) else [(data, {})]
+    for outcome_data, _ in outcomes:
+        for target in flow.get_outgoing_links(name):
+            _recursive_order(flow, target, outcome_data, visits)
+
+
+def test_runner_keeps_depth_first_order():
+    flow = Flow()
+    flow.add_step("source", SourceStep())
+    for label in ("a", "b", "c", "d"):
+        flow.add_step(label, RecordStep(label))
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "a")
+    flow.link_steps("source", "b")
+    flow.link_steps("b", "c")
+    flow.link_steps("b", "d")
+    flow.link_steps("a", "end")
+    flow.link_steps("c", "end")
+    flow.link_steps("d", "end")
+
+    expected: list = []
+    _recursive_order(flow, "source", None, expected)
+
+    VISITS.clear()
+    FlowRunner(flow)()
+    assert expected == VISITS, VISITS
+
+
+def test_runner_handles_flows_deeper_than_the_recursion_limit():
+    depth = sys.getrecursionlimit() + 500
+
+    flow = Flow()
+    flow.add_step("source", SourceStep())
+    previous = "source"
+    for i in range(depth):
+        flow.add_step(f"step_{i}", RecordStep(i))
+        flow.link_steps(previous, f"step_{i}")
+        previous = f"step_{i}"
+    flow.add_step("end", EndOperator())
+    flow.link_steps(previous, "end")
+
+    VISITS.clear()
+    runner = FlowRunner(flow)
+    runner()
+    assert len(VISITS) == depth * 3
+    assert VISITS[-1] == (depth - 1, 2)
+    assert runner.cycles == (depth + 1) * 3 + 1
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
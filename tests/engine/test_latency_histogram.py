@@ -0,0 +1,103 @@
+"""
+Test cases for the per-step latency histograms.
+"""
+
+import os
+import sys
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.engine import BaseOperator
+from flows.engine.latency_histogram import EXACT_VALUES
+from flows.engine.latency_histogram import LatencyHistogram
+
+
+class PassThroughStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        return data, context
+
+
+def test_percentiles_are_within_the_bucket_precision():
+    histogram = LatencyHistogram()
+    for value in range(1, 1001):
+        histogram.record(value * 1000)
+
+    assert histogram.count == 1000
+    assert histogram.max == 1_000_000
+    for percentile, expected in ((50, 500_000), (90, 900_000), (99, 990_000)):
+        value = histogram.percentile(percentile)
+        assert expected <= value <= expected * 1.125, (percentile, value)
+    assert histogram.percentile(100) == 1_000_000
+
+
+def test_small_and_large_values():
+    histogram = LatencyHistogram()
+    histogram.record(0)
+    histogram.record(3)
+    histogram.record(2**62)
+    assert histogram.percentile(1) == 0
+    assert histogram.percentile(50) == 3
+    assert histogram.percentile(100) == 2**62
+
+
+def test_histograms_sample_once_they_have_enough_values():
+    histogram = LatencyHistogram()
+    values = EXACT_VALUES * 10
+    for value in range(values):
+        histogram.record(1_000 if value % 10 else 1_000_000 + value)
+
+    # skipped values are counted by the values which stand for them
+    assert abs(histogram.count - values) < values * 0.1, histogram.count
+    assert histogram.max == 1_000_000 + values - 10
+    assert histogram.percentile(50) <= 1_000 * 1.125
+    assert histogram.percentile(95) >= 1_000_000
+
+
+def test_histograms_merge():
+    first = LatencyHistogram()
+    second = LatencyHistogram()
+    for value in range(100):
+        first.record(1_000)
+        second.record(1_000_000)
+
+    first.merge(LatencyHistogram.from_state(second.to_state()))
+    assert first.count == 200
+    assert first.max == 1_000_000
+    assert first.percentile(50) <= 1_000 * 1.125
+    assert first.percentile(99) >= 1_000_000
+
+
+def test_operator_sensors_report_percentiles():
+    step = PassThroughStep()
+    for i in range(10):
+        step(i, {})
+
+    sensors = step.read_sensors()
+    latency = sensors["latency_sec"]
+    assert set(latency) == {"p50", "p90", "p99", "max"}
+    assert 0 <= latency["p50"] <= latency["p90"] <= latency["p99"] <= latency["max"]
+
+
+def test_sampled_timings_are_weighted():
+    step = PassThroughStep(timing_sample_rate=5)
+    for i in range(10):
+        step(i, {})
+    assert step.latency_histogram.count == 10
+
+
+def test_operator_sensor_states_merge_histograms():
+    step = PassThroughStep()
+    copy = PassThroughStep()
+    for i in range(3):
+        step(i, {})
+        copy(i, {})
+
+    step.merge_sensor_state(copy.sensor_state())
+    assert step.records_processed == 6
+    assert step.latency_histogram.count == 6
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
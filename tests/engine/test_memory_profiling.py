@@ -0,0 +1,124 @@
+"""
+Test cases for attributing memory to the steps of a flow.
+"""
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+import pyarrow
+
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import Flow
+
+
+class SourceStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            yield data, context
+            return
+        for i in range(5):
+            yield i, context
+
+
+class HoardingStep(BaseOperator):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.hoard = []
+
+    def execute(self, data=None, context=None):
+        if data != self.sigterm:
+            self.hoard.append(bytearray(100_000))
+        return data, context
+
+
+class TemporaryStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data != self.sigterm:
+            scratch = bytearray(1_000_000)
+            del scratch
+        return data, context
+
+
+class ArrowStep(BaseOperator):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.tables = []
+
+    def execute(self, data=None, context=None):
+        if data != self.sigterm:
+            self.tables.append(pyarrow.array(range(10_000), type=pyarrow.int64()))
+        return data, context
+
+
+def _build_flow(**kwargs):
+    flow = Flow(**kwargs)
+    flow.add_step("source", SourceStep())
+    flow.add_step("hoard", HoardingStep())
+    flow.add_step("temporary", TemporaryStep())
+    flow.add_step("arrow", ArrowStep())
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "hoard")
+    flow.link_steps("hoard", "temporary")
+    flow.link_steps("temporary", "arrow")
+    flow.link_steps("arrow", "end")
+    return flow
+
+
+def test_memory_is_attributed_to_steps():
+    flow = _build_flow(profile_memory=True)
+    with flow as runner:
+        runner()
+    assert not tracemalloc.is_tracing()
+
+    hoard = flow.get_operator("hoard").read_sensors()["memory"]
+    assert hoard["net_bytes"] >= 500_000
+    assert hoard["peak_bytes"] >= 100_000
+
+    temporary = flow.get_operator("temporary").read_sensors()["memory"]
+    assert temporary["peak_bytes"] >= 1_000_000
+    assert temporary["net_bytes"] < 100_000
+
+    arrow = flow.get_operator("arrow").read_sensors()["memory"]
+    assert arrow["arrow_net_bytes"] >= 5 * 80_000
+    assert hoard["arrow_net_bytes"] == 0
+
+
+def test_memory_is_not_profiled_by_default():
+    flow = _build_flow()
+    with flow as runner:
+        runner()
+    assert "memory" not in flow.get_operator("hoard").read_sensors()
+
+
+def test_memory_sensors_merge():
+    step = HoardingStep()
+    copy = HoardingStep()
+    step.memory_sensors = {
+        "peak_bytes": 10,
+        "net_bytes": 5,
+        "arrow_peak_bytes": 0,
+        "arrow_net_bytes": 0,
+    }
+    copy.memory_sensors = {
+        "peak_bytes": 20,
+        "net_bytes": 5,
+        "arrow_peak_bytes": 7,
+        "arrow_net_bytes": 3,
+    }
+    step.merge_sensor_state(copy.sensor_state())
+    assert step.memory_sensors == {
+        "peak_bytes": 20,
+        "net_bytes": 10,
+        "arrow_peak_bytes": 7,
+        "arrow_net_bytes": 3,
+    }
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
@@ -0,0 +1,205 @@
+"""
+Test cases for fusing runs of consecutive stateless steps into one step.
+"""
+
+import os
+import sys
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import ExecutionPlan
+from flows.engine import Flow
+from flows.engine.operator_fusion import FusedOperator
+
+
+class SourceStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            yield data, context
+            return
+        for i in range(10):
+            yield i, context
+
+
+class AddOneStep(BaseOperator):
+    fusable = True
+
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            return data, context
+        return data + 1, context
+
+
+class DropOddStep(BaseOperator):
+    fusable = True
+
+    def execute(self, data=None, context=None):
+        if data == self.sigterm or data % 2 == 0:
+            yield data, context
+
+
+class CollectStep(BaseOperator):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.collected = []
+
+    def execute(self, data=None, context=None):
+        if data != self.sigterm:
+            self.collected.append(data)
+        return data, context
+
+
+class BrokenStep(BaseOperator):
+    fusable = True
+
+    def execute(self, data=None, context=None):
+        if data == 6:
+            raise ValueError("six is not allowed")
+        return data, context
+
+
+def _build_flow(fuse_steps, middle=None):
+    flow = Flow(fuse_steps=fuse_steps)
+    flow.add_step("source", SourceStep())
+    flow.add_step("add_one", AddOneStep())
+    flow.add_step("drop_odd", DropOddStep())
+    flow.add_step("middle", middle or AddOneStep())
+    flow.add_step("collect", CollectStep())
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "add_one")
+    flow.link_steps("add_one", "drop_odd")
+    flow.link_steps("drop_odd", "middle")
+    flow.link_steps("middle", "collect")
+    flow.link_steps("collect", "end")
+    return flow
+
+
+def test_fusable_runs_are_combined():
+    plan = ExecutionPlan(_build_flow(fuse_steps=True), fuse=True)
+    add_one = plan.slot_of("add_one")
+
+    fused = plan.operators[add_one]
+    assert isinstance(fused, FusedOperator)
+    assert [operator.name for operator in fused.operators] == [
+        "AddOneStep",
+        "DropOddStep",
+        "AddOneStep",
+    ]
+    assert plan.links[add_one] == (plan.slot_of("collect"),)
+    # collect isn't fusable, so the end step isn't fused with anything
+    assert not isinstance(plan.operators[plan.slot_of("end")], FusedOperator)
+
+
+def test_fused_flows_match_unfused_flows():
+    results = {}
+    for fuse_steps in (False, True):
+        flow = _build_flow(fuse_steps)
+        with flow as runner:
+            runner()
+        results[fuse_steps] = flow
+
+    unfused, fused = results[False], results[True]
+    assert fused.get_operator("collect").collected == [3, 5, 7, 9, 11]
+    assert fused.get_operator("collect").collected == unfused.get_operator("collect").collected
+    for name in unfused.nodes:
+        expected = unfused.get_operator(name).read_sensors()
+        actual = fused.get_operator(name).read_sensors()
+        assert expected["records_processed"] == actual["records_processed"], name
+    assert fused.get_operator("drop_odd").execution_time_ns > 0
+
+
+def test_fused_failures_take_the_full_path():
+    flow = _build_flow(fuse_steps=True, middle=BrokenStep(retry_count=1))
+    with flow as runner:
+        runner()
+
+    broken = flow.get_operator("middle")
+    assert broken.errors == 1
+    assert broken.records_processed == 6  # five records and the sigterm
+    assert flow.get_operator("collect").collected == [2, 4, 8, 10]
+
+
+class FlakyStep(BaseOperator):
+    fusable = True
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.attempts = 0
+
+    def execute(self, data=None, context=None):
+        if data == 6:
+            self.attempts += 1
+            raise ValueError("six is not allowed")
+        return data, context
+
+
+def test_fused_failures_make_the_same_attempts(monkeypatch):
+    monkeypatch.setattr("flows.engine.base_operator.time.sleep", lambda seconds: None)
+    attempts = {}
+    for fuse_steps in (False, True):
+        flow = _build_flow(fuse_steps=fuse_steps, middle=FlakyStep(retry_count=2))
+        with flow as runner:
+            runner()
+        flaky = flow.get_operator("middle")
+        attempts[fuse_steps] = (flaky.attempts, flaky.errors, flaky.records_processed)
+        assert flow.get_operator("collect").collected == [2, 4, 8, 10]
+
+    assert attempts[True] == attempts[False] == (2, 2, 6)
+
+
+class FanOutStep(BaseOperator):
+    fusable = True
+
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            return data, context
+        return [(data, context), (data + 100, context)]
+
+
+class TagStep(BaseOperator):
+    fusable = True
+
+    def execute(self, data=None, context=None):
+        if data != self.sigterm:
+            context["tag"] = data
+        return data, context
+
+
+class ContextCollectStep(CollectStep):
+    fusable = True
+
+    def execute(self, data=None, context=None):
+        # keeps the context, so would see it change if it was shared
+        if data != self.sigterm:
+            self.collected.append((data, context))
+        return data, context
+
+
+def test_fanned_out_records_get_their_own_contexts():
+    flow = Flow(fuse_steps=True)
+    flow.add_step("source", SourceStep())
+    flow.add_step("fan", FanOutStep())
+    flow.add_step("tag", TagStep())
+    flow.add_step("untouched", AddOneStep())
+    flow.add_step("collect", ContextCollectStep())
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "fan")
+    flow.link_steps("fan", "tag")
+    flow.link_steps("tag", "untouched")
+    flow.link_steps("untouched", "collect")
+    flow.link_steps("collect", "end")
+    with flow as runner:
+        assert isinstance(runner.plan.operators[runner.plan.slot_of("fan")], FusedOperator)
+        runner()
+
+    collected = [(data, context["tag"]) for data, context in flow.get_operator("collect").collected]
+    assert collected[:4] == [(1, 0), (101, 100), (2, 1), (102, 101)]
+    assert len(collected) == 20
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
@@ -0,0 +1,110 @@
+"""
+Test cases for running the branches of a flow in parallel in a thread pool.
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import Flow
+from flows.engine import FlowRunner
+
+
+class SourceStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            yield data, context
+            return
+        for i in range(3):
+            yield i, context
+
+
+class SlowSinkStep(BaseOperator):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.seen = []
+
+    def execute(self, data=None, context=None):
+        if data != self.sigterm:
+            time.sleep(0.05)
+            self.seen.append(data)
+        yield data, context
+
+
+class FailingStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        raise SystemExit(1)
+
+
+def _build_flow(branch_workers=None, sink_count=4):
+    flow = Flow(branch_workers=branch_workers)
+    flow.add_step("source", SourceStep())
+    flow.add_step("end", EndOperator())
+    for i in range(sink_count):
+        flow.add_step(f"sink_{i}", SlowSinkStep())
+        flow.link_steps("source", f"sink_{i}")
+        flow.link_steps(f"sink_{i}", "end")
+    return flow
+
+
+def test_branches_run_in_parallel():
+    flow = _build_flow(branch_workers=4)
+    with flow as runner:
+        start = time.monotonic()
+        runner()
+        elapsed = time.monotonic() - start
+
+    # 3 records x 4 sinks x 0.05s would be 0.6s serially
+    assert elapsed < 0.4, elapsed
+    for i in range(4):
+        sink = flow.get_operator(f"sink_{i}")
+        assert sink.seen == [0, 1, 2], sink.seen
+        assert sink.records_processed == 4  # three records and the sigterm
+    assert flow.get_operator("end").records_processed == 16
+    assert flow.executor is None
+
+
+def test_branches_match_serial_sensors():
+    serial = _build_flow()
+    with serial as runner:
+        runner()
+    parallel = _build_flow(branch_workers=3)
+    with parallel as runner:
+        runner()
+
+    for name in serial.nodes:
+        expected = serial.get_operator(name).read_sensors()
+        actual = parallel.get_operator(name).read_sensors()
+        assert expected["records_processed"] == actual["records_processed"], name
+        assert expected["error_count"] == actual["error_count"], name
+
+
+def test_branch_errors_are_raised_after_joining():
+    flow = _build_flow(sink_count=1)
+    flow.add_step("failing", FailingStep())
+    flow.link_steps("source", "failing")
+    flow.link_steps("failing", "end")
+
+    flow.executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        FlowRunner(flow)()
+    except SystemExit:
+        pass
+    else:  # pragma: no cover
+        assert False, "Expected the failing branch to abort the flow"
+    finally:
+        flow.executor.shutdown()
+
+    # the other branch ran to completion before the error was raised
+    assert flow.get_operator("sink_0").seen == [0]
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
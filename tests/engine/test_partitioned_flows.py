@@ -0,0 +1,131 @@
+"""
+Test cases for running flows over partitions of their input in a pool of
+worker processes.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+import pytest
+
+from flows.engine import Flow
+from flows.engine.flow_runner import _run_partition
+from flows.exceptions import FlowError
+from flows.exceptions import TimeExceeded
+from flows.models import FlowModel
+
+
+def _model(save_config=None, **execution):
+    return FlowModel.from_dict(
+        {
+            "execution": execution,
+            "steps": [
+                {
+                    "name": "load",
+                    "uses": "internal/sql@1.0.0",
+                    "config": {"statement": "SELECT name FROM $planets"},
+                },
+                {"name": "filter", "uses": "internal/filter@latest", "config": {}},
+                {"name": "save", "uses": "internal/save@1.0.0", "config": save_config or {}},
+            ],
+        }
+    )
+
+
+def test_partitioned_sensors_match_serial_run():
+    serial = _model().runner()
+    with serial as runner:
+        runner()
+
+    partitioned = _model(partition_workers=2, partition_size=2).runner()
+    with partitioned as runner:
+        runner()
+
+    for name in serial.nodes:
+        expected = serial.get_operator(name).read_sensors()
+        actual = partitioned.get_operator(name).read_sensors()
+        assert expected["records_processed"] == actual["records_processed"], name
+        assert expected["error_count"] == actual["error_count"], name
+    assert partitioned.get_operator("save").execution_time_ns > 0
+    assert partitioned.process_pool is None
+
+
+def test_partitioned_flows_need_a_definition():
+    flow = Flow(partition_workers=2)
+    flow.nodes = _model().runner().nodes
+    flow.edges = [("load", "filter"), ("filter", "save"), ("save", "end")]
+    try:
+        flow.__enter__()
+    except FlowError:
+        pass
+    else:  # pragma: no cover
+        assert False, "Expected FlowError for a partitioned flow without a definition"
+
+
+def test_failing_to_enter_a_flow_starts_nothing():
+    assert not tracemalloc.is_tracing()
+    with tempfile.TemporaryDirectory() as tmp:
+        # invalid options are refused before any pool or profiler is started
+        flow = _model(partition_workers=2, checkpoint_path=tmp, profile_memory=True).runner()
+        with pytest.raises(FlowError, match="checkpointed"):
+            flow.__enter__()
+        assert flow.process_pool is None
+        assert not tracemalloc.is_tracing()
+
+        # and anything started before entering fails is shut down
+        flow = _model(
+            branch_workers=2, checkpoint_path=tmp, profile_memory=True, trace_path=f"{tmp}/t.json"
+        ).runner()
+        flow.resume_run_id = "missing"
+        with pytest.raises(FlowError, match="no checkpoint"):
+            flow.__enter__()
+        assert flow.executor is None
+        assert flow.trace_sink is None
+        assert not tracemalloc.is_tracing()
+
+
+def test_partitioned_flows_keep_to_their_time_budgets():
+    # a generous budget doesn't stop the run
+    flow = _model(partition_workers=2, partition_size=2, time_budget=60).runner()
+    with flow as runner:
+        runner()
+    save = flow.get_operator("save").read_sensors()
+    assert (
+        save["records_processed"] == flow.get_operator("filter").read_sensors()["records_processed"]
+    )
+    assert save["error_count"] == 0
+
+    # steps running in the workers are stopped when over their budget
+    flow = _model({"time_budget": 0}, partition_workers=2, partition_size=2).runner()
+    with pytest.raises(TimeExceeded, match="Step 'save'"), flow as runner:
+        runner()
+
+    # and partitions are stopped at the deadline of the run
+    model = _model(partition_workers=2, time_budget=60)
+    with pytest.raises(TimeExceeded, match="Flow exceeded"):
+        _run_partition(model.to_dict(), "load", [({"name": "Mars"}, {})], time.monotonic() - 1)
+
+
+def test_partition_workers_do_not_write_the_trace():
+    with tempfile.TemporaryDirectory() as tmp:
+        trace_path = os.path.join(tmp, "trace.json")
+        with open(trace_path, "w", encoding="utf-8") as trace_file:
+            trace_file.write("[written by the parent")
+
+        model = _model(partition_workers=2, trace_path=trace_path)
+        sensors = _run_partition(model.to_dict(), "load", [({"name": "Mars"}, {})])
+
+        assert sensors["filter"]["records_processed"] == 1
+        with open(trace_path, encoding="utf-8") as trace_file:
+            assert trace_file.read() == "[written by the parent"
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
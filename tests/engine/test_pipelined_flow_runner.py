@@ -0,0 +1,138 @@
+"""
+Test cases for running linear flows as a pipeline, with each step in its own
+thread and bounded queues between the steps.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+import pytest
+
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import Flow
+from flows.engine import PipelinedFlowRunner
+from flows.exceptions import FlowError
+
+PRODUCED: list = []
+
+
+class SourceStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            yield data, context
+            return
+        for i in range(20):
+            time.sleep(0.01)
+            PRODUCED.append(i)
+            yield i, context
+
+
+class SinkStep(BaseOperator):
+    def __init__(self, fail_on=None, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_on = fail_on
+        self.seen = []
+        self.max_ahead = 0
+
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            return data, context
+        if data == self.fail_on:
+            raise SystemExit(1)
+        time.sleep(0.01)
+        self.seen.append(data)
+        self.max_ahead = max(self.max_ahead, len(PRODUCED) - len(self.seen))
+        return data, context
+
+
+def _build_flow(queue_size=None, fail_on=None):
+    flow = Flow(pipeline_queue_size=queue_size)
+    flow.add_step("source", SourceStep())
+    flow.add_step("sink", SinkStep(fail_on=fail_on))
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "sink")
+    flow.link_steps("sink", "end")
+    return flow
+
+
+def test_pipelined_steps_overlap():
+    PRODUCED.clear()
+    flow = _build_flow(queue_size=4)
+    with flow as runner:
+        assert isinstance(runner, PipelinedFlowRunner)
+        start = time.monotonic()
+        runner()
+        elapsed = time.monotonic() - start
+        # the source once, then each record through the sink and the end
+        assert runner.cycles == 1 + 20 + 20, runner.cycles
+
+    sink = flow.get_operator("sink")
+    assert sink.seen == list(range(20))
+    # in lockstep this takes at least 0.4s
+    assert elapsed < 0.35, elapsed
+    # the source never gets more than the queue capacity (plus the records
+    # being handled by each step) ahead of the sink
+    assert sink.max_ahead <= 4 + 2, sink.max_ahead
+
+    sensors = sink.read_sensors()
+    assert sensors["inbound_queue"]["capacity"] == 4
+    assert sensors["inbound_queue"]["max_depth"] <= 4
+    assert "upstream_stall_sec" in sensors["inbound_queue"]
+    assert flow.get_operator("end").records_processed == 21  # the records and the sigterm
+
+
+def test_pipelined_failures_are_raised():
+    PRODUCED.clear()
+    flow = _build_flow(queue_size=2, fail_on=5)
+    runner = PipelinedFlowRunner(flow, queue_size=2)
+    try:
+        runner()
+    except SystemExit:
+        pass
+    else:  # pragma: no cover
+        assert False, "Expected the failing step to abort the run"
+    assert flow.get_operator("sink").seen == [0, 1, 2, 3, 4]
+
+
+def test_only_linear_flows_can_be_pipelined():
+    flow = _build_flow()
+    flow.add_step("other", EndOperator())
+    flow.link_steps("source", "other")
+    try:
+        PipelinedFlowRunner(flow)
+    except FlowError:
+        pass
+    else:  # pragma: no cover
+        assert False, "Expected FlowError for a flow with branches"
+
+
+@pytest.mark.parametrize(
+    "option, value",
+    [
+        ("time_budget", 10),
+        ("trace_path", "trace.json"),
+        ("profile_memory", True),
+        ("checkpoint_path", "checkpoints"),
+        ("deferred_retries", True),
+        ("partition_workers", 2),
+    ],
+)
+def test_pipelined_flows_refuse_options_they_do_not_honour(option, value):
+    flow = _build_flow(queue_size=2)
+    setattr(flow, option, value)
+    with pytest.raises(FlowError, match=option):
+        flow.__enter__()
+    # nothing was started for the flow
+    assert flow.trace_sink is None
+    assert flow.checkpointer is None
+    assert flow.process_pool is None
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
@@ -0,0 +1,82 @@
+"""
+Test cases for caching the hashes of Operator source code.
+"""
+
+import importlib.util
+import inspect
+import os
+import sys
+import tempfile
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.engine import EndOperator
+from flows.engine import source_hash as source_hash_module
+from flows.engine.source_hash import source_hash
+
+
+def _load_module(path):
+    spec = importlib.util.spec_from_file_location("hashed_module", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_hashes_are_cached_per_code_object():
+    first = EndOperator()
+    second = EndOperator()
+    assert first.version() == second.version()
+    assert (EndOperator.execute.__code__, True) in source_hash_module._hashes
+
+
+def test_hashes_only_depend_on_alpha_nums():
+    def spaced(a, b):
+        return a + b
+
+    assert source_hash(spaced) != source_hash(spaced, alpha_nums_only=True)
+    assert len(source_hash(spaced)) == 64
+
+
+def test_hashes_are_saved_next_to_the_bytecode():
+    original_getsource = inspect.getsource
+    original_dont_write_bytecode = sys.dont_write_bytecode
+    os.environ["FLOWS_SOURCE_HASH_CACHE"] = "1"
+    sys.dont_write_bytecode = False
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "hashed_module.py")
+            with open(path, "w", encoding="utf-8") as module_file:
+                module_file.write("def function():\n    return 1\n")
+
+            expected = source_hash(_load_module(path).function)
+            saved_path = source_hash_module._saved_path(path)
+            assert os.path.exists(saved_path)
+
+            # a new process wouldn't have the hashes in memory, or be able
+            # to read the source without it being read from disk
+            source_hash_module._hashes.clear()
+            source_hash_module._saved.clear()
+
+            def _fail(*args, **kwargs):
+                raise AssertionError("source was read")
+
+            inspect.getsource = _fail
+            assert source_hash(_load_module(path).function) == expected
+            inspect.getsource = original_getsource
+
+            # changing the file invalidates the saved hashes
+            with open(path, "w", encoding="utf-8") as module_file:
+                module_file.write("def function():\n    return 12\n")
+            source_hash_module._hashes.clear()
+            source_hash_module._saved.clear()
+            assert source_hash(_load_module(path).function) != expected
+    finally:
+        inspect.getsource = original_getsource
+        os.environ.pop("FLOWS_SOURCE_HASH_CACHE", None)
+        sys.dont_write_bytecode = original_dont_write_bytecode
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
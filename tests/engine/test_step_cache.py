@@ -0,0 +1,143 @@
+"""
+Test cases for replaying the output of steps from the step cache.
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+import pyarrow
+
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import Flow
+from flows.engine.step_cache import StepCache
+
+
+class SourceStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            yield data, context
+            return
+        if self.batch_size:
+            table = pyarrow.table({"value": list(range(10))})
+            for batch in table.to_batches(max_chunksize=self.batch_size):
+                yield batch, context
+            return
+        for i in range(5):
+            yield {"value": i}, context
+
+
+class FailingStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            return data, context
+        raise ValueError("always fails")
+
+
+class SinkStep(BaseOperator):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.records = []
+
+    def execute(self, data=None, context=None):
+        if data != self.sigterm:
+            self.records.append(data)
+        return data, context
+
+    def execute_batch(self, data=None, context=None):
+        self.records.append(data)
+        yield data, context
+
+
+def _run(path, source, batch_size=None):
+    flow = Flow(cache_path=path, batch_size=batch_size)
+    flow.add_step("source", source)
+    flow.add_step("sink", SinkStep())
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "sink")
+    flow.link_steps("sink", "end")
+    with flow as runner:
+        runner({"query": "planets"})
+    return flow
+
+
+def test_outputs_are_replayed():
+    with tempfile.TemporaryDirectory() as tmp:
+        first = _run(tmp, SourceStep(cache=True))
+        second = _run(tmp, SourceStep(cache=True))
+
+        source = second.get_operator("source")
+        # the source was only given the end of the flow
+        assert source.records_processed == 1
+        assert source.read_sensors()["cache"] == {"hits": 1, "misses": 0}
+        assert first.get_operator("source").cache_sensors == {"hits": 0, "misses": 1}
+        assert second.get_operator("sink").records == [{"value": i} for i in range(5)]
+
+        # different config is a different entry
+        third = _run(tmp, SourceStep(cache=True, retry_count=3))
+        assert third.get_operator("source").cache_sensors == {"hits": 0, "misses": 1}
+
+
+def test_batches_are_saved_as_arrow():
+    with tempfile.TemporaryDirectory() as tmp:
+        first = _run(tmp, SourceStep(cache=True), batch_size=4)
+        assert any(name.endswith(".arrow") for name in os.listdir(tmp))
+        second = _run(tmp, SourceStep(cache=True), batch_size=4)
+
+        assert second.get_operator("source").cache_sensors["hits"] == 1
+        replayed = second.get_operator("sink").records
+        assert [batch.num_rows for batch in replayed] == [4, 4, 2]
+        assert pyarrow.Table.from_batches(replayed).equals(
+            pyarrow.Table.from_batches(first.get_operator("sink").records)
+        )
+
+
+def test_steps_are_only_cached_when_opted_in():
+    with tempfile.TemporaryDirectory() as tmp:
+        flow = _run(tmp, SourceStep())
+        assert flow.get_operator("source").cache_sensors is None
+        assert os.listdir(tmp) == []
+
+
+def test_failures_are_not_cached():
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(2):
+            flow = Flow(cache_path=tmp)
+            flow.add_step("fails", FailingStep(cache=True, retry_count=1))
+            flow.add_step("end", EndOperator())
+            flow.link_steps("fails", "end")
+            with flow as runner:
+                runner({"value": 1})
+        assert flow.get_operator("fails").cache_sensors == {"hits": 0, "misses": 1}
+        assert os.listdir(tmp) == []
+
+
+def test_least_recently_used_entries_are_evicted():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = StepCache(tmp, max_bytes=350)
+        for key in ("a", "b", "c"):
+            writer = cache.writer(key)
+            writer.add(b"x" * 90)
+            writer.commit()
+        # reading "a" makes "b" the least recently used entry
+        assert list(cache.replay("a", {})) == [(b"x" * 90, {})]
+        writer = cache.writer("d")
+        writer.add(b"x" * 90)
+        writer.commit()
+
+        assert cache.replay("b", {}) is None
+        assert cache.evictions == 1
+        assert sorted(os.listdir(tmp)) == ["a.pickle", "c.pickle", "d.pickle"]
+        assert cache.total_bytes <= 350
+
+        # a new cache picks up the entries already in the folder
+        assert StepCache(tmp, max_bytes=350).total_bytes == cache.total_bytes
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
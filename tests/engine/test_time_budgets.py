@@ -0,0 +1,117 @@
+"""
+Test cases for stopping flows which run over their time budgets.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import Flow
+from flows.exceptions import TimeExceeded
+
+
+class SourceStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            yield data, context
+            return
+        for i in range(100):
+            yield i, context
+
+
+class SlowStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data != self.sigterm:
+            time.sleep(0.01)
+        return data, context
+
+
+class CollectStep(BaseOperator):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.collected = []
+        self.flushed = False
+
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            self.flushed = True
+        else:
+            self.collected.append(data)
+        return data, context
+
+
+class OutOfTimeStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data != self.sigterm:
+            raise TimeExceeded("out of time")
+        return data, context
+
+
+def _build_flow(middle, **kwargs):
+    source = SourceStep()
+    collect = CollectStep()
+    flow = Flow(**kwargs)
+    flow.add_step("source", source)
+    flow.add_step("middle", middle)
+    flow.add_step("collect", collect)
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "middle")
+    flow.link_steps("middle", "collect")
+    flow.link_steps("collect", "end")
+    return flow, source, collect
+
+
+def test_flows_stop_when_over_their_time_budget():
+    flow, source, collect = _build_flow(SlowStep(), time_budget=0.1)
+    try:
+        with flow as runner:
+            runner()
+        assert False, "flow should have been stopped"  # pragma: no cover
+    except TimeExceeded as err:
+        assert "Flow exceeded" in str(err)
+
+    assert 0 < len(collect.collected) < 100
+    # the flow was still shut down, and the source's time was recorded
+    assert collect.flushed
+    assert source.latency_histogram.count == 2  # the run and the shutdown
+
+
+def test_steps_stop_when_over_their_time_budget():
+    flow, _, collect = _build_flow(SlowStep(time_budget=0.05))
+    try:
+        with flow as runner:
+            runner()
+        assert False, "flow should have been stopped"  # pragma: no cover
+    except TimeExceeded as err:
+        assert "'middle'" in str(err)
+    assert 0 < len(collect.collected) < 100
+
+
+def test_budgets_are_not_checked_when_not_set():
+    flow, _, collect = _build_flow(SlowStep())
+    with flow as runner:
+        runner()
+    assert len(collect.collected) == 100
+
+
+def test_time_exceeded_is_not_retried():
+    step = OutOfTimeStep(retry_count=3)
+    flow, _, collect = _build_flow(step)
+    try:
+        with flow as runner:
+            runner()
+        assert False, "flow should have been stopped"  # pragma: no cover
+    except TimeExceeded:
+        pass
+    assert step.errors == 0
+    assert collect.collected == []
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
@@ -0,0 +1,99 @@
+"""
+Test cases for writing trace spans for sampled runs of a flow.
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import Flow
+from flows.engine.tracing import TraceSink
+
+
+class SourceStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            yield data, context
+            return
+        for i in range(5):
+            yield i, context
+
+
+class DropOddStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data == self.sigterm or data % 2 == 0:
+            return data, context
+        return None
+
+
+def _build_flow(trace_path):
+    flow = Flow(trace_path=trace_path)
+    flow.add_step("source", SourceStep())
+    flow.add_step("drop", DropOddStep())
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "drop")
+    flow.link_steps("drop", "end")
+    return flow
+
+
+def _read_events(path):
+    with open(path, "r", encoding="utf-8") as trace_file:
+        return json.load(trace_file)
+
+
+def test_sampled_runs_are_traced():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trace.json")
+        with _build_flow(path) as runner:
+            runner(None, {"run_id": "traced"}, trace_sample_rate=1.0)
+
+        events = _read_events(path)
+        by_step = {}
+        for event in events:
+            assert event["ph"] == "X"
+            assert event["args"]["run_id"] == "traced"
+            assert event["args"]["end_ns"] >= event["args"]["start_ns"]
+            by_step.setdefault(event["args"]["step"], []).append(event)
+
+        assert len(by_step["source"]) == 1
+        assert by_step["source"][0]["args"]["records_out"] == 5
+        assert len(by_step["drop"]) == 5
+        assert sum(e["args"]["records_out"] for e in by_step["drop"]) == 3
+        assert len(by_step["end"]) == 3
+
+
+def test_unsampled_runs_are_not_traced():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trace.json")
+        with _build_flow(path) as runner:
+            runner(None, {}, trace_sample_rate=0)
+
+        assert _read_events(path) == []
+
+
+def test_trace_sink_buffers_events():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trace.json")
+        sink = TraceSink(path, buffer_size=3)
+        for i in range(2):
+            sink.record_span("op", "step", i, i + 10, 1, 1, "run")
+        with open(path, "r", encoding="utf-8") as trace_file:
+            assert trace_file.read() == "["
+        sink.record_span("op", "step", 2, 12, 1, 1, "run")
+        sink.record_span("op", "step", 3, 13, 1, 1, "run")
+        sink.close()
+
+        events = _read_events(path)
+        assert len(events) == 4
+        assert events[0]["dur"] == 10 / 1000
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
@@ -0,0 +1,124 @@
+"""
+Test cases for pushing filter conditions down into the SQL step before them.
+"""
+
+import os
+import sys
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+import pytest
+
+from flows.internal.filter.version_1_0_0 import FilterStep
+from flows.internal.sql.version_1_0_0 import SqlStep
+from flows.models import FlowModel
+from flows.models.filter_pushdown import push_down_filters
+from flows.models.filter_pushdown import where_clause
+
+STATEMENT = "SELECT name, numberOfMoons, surfacePressure FROM $planets"
+SCHEMA = [
+    {"name": "name", "type": "varchar"},
+    {"name": "numberOfMoons", "type": "integer"},
+    {"name": "surfacePressure", "type": "double"},
+]
+
+
+def _model(conditions, steps=None, schema=SCHEMA, statement=STATEMENT):
+    steps = steps or [
+        {"name": "query", "uses": "internal/sql@latest", "config": {"statement": statement}},
+        {"name": "filter", "uses": "internal/filter@latest", "config": {"conditions": conditions}},
+    ]
+    return FlowModel.from_dict({"schema": schema, "steps": steps})
+
+
+def _rows(step):
+    return [row for row, _ in step.execute({}, {}) if row != step.sigterm]
+
+
+def test_conditions_are_pushed_into_the_statement():
+    model = _model([[["numberOfMoons", ">", 2], ["name", "!=", "Saturn"]]])
+    flow = model.runner()
+    statement = flow.get_operator("query").statement
+    assert statement == (
+        f"SELECT * FROM (\n{STATEMENT}\n) AS pushed_down "
+        "WHERE (`name` != 'Saturn' AND `numberOfMoons` > 2)"
+    )
+    assert flow.get_operator("filter").groups == []
+    # the definition of the flow is not rewritten
+    assert model.steps[0].config["statement"] == STATEMENT
+
+
+@pytest.mark.parametrize(
+    "conditions",
+    [
+        [[["numberOfMoons", ">", 2], ["name", "!=", "Saturn"]]],
+        [[["numberOfMoons", "==", 0]], [["name", "in", ["Earth", "Mars", "Pluto"]]]],
+        [[["numberOfMoons", "not in", [0, 1]], ["surfacePressure", "==", None]]],
+        [[["surfacePressure", "<", 1]], [["surfacePressure", "!=", None], ["name", "<", "M"]]],
+    ],
+)
+def test_pushed_down_statements_keep_the_same_records(conditions):
+    configs = push_down_filters(_model(conditions).steps, SCHEMA)
+    pushed = _rows(SqlStep(**configs["query"]))
+    assert pushed, "expected the conditions to keep some records"
+
+    filter_step = FilterStep(conditions=conditions)
+    expected = [row for row in _rows(SqlStep(statement=STATEMENT)) if filter_step.execute(row, {})]
+    assert pushed == expected
+
+
+@pytest.mark.parametrize(
+    "conditions",
+    [
+        # columns not in the schema, or compared to values of another type
+        [[["colour", "==", "red"]]],
+        [[["name", ">", 3]]],
+        [[["numberOfMoons", "==", 1.5]]],
+        [[["numberOfMoons", "==", True]]],
+        # values which can't be written as literals
+        [[["name", "==", "Saturn's"]]],
+        [[["name", "in", ["Mars", None]]]],
+        [[["name", "in", []]]],
+        [[["surfacePressure", ">", float("nan")]]],
+        # one condition which can't be pushed down keeps them all
+        [[["numberOfMoons", ">", 2]], [["colour", "==", "red"]]],
+    ],
+)
+def test_unsafe_conditions_are_not_pushed_down(conditions):
+    assert where_clause(conditions, SCHEMA) is None
+    assert push_down_filters(_model(conditions).steps, SCHEMA) == {}
+
+
+def test_statements_read_by_other_steps_are_not_rewritten():
+    conditions = [[["numberOfMoons", ">", 2]]]
+    steps = [
+        {"name": "query", "uses": "internal/sql@latest", "config": {"statement": STATEMENT}},
+        {"name": "filter", "uses": "internal/filter@latest", "config": {"conditions": conditions}},
+        {"name": "audit", "uses": "internal/save@latest", "needs": ["query"]},
+    ]
+    model = _model(conditions, steps=steps)
+    assert push_down_filters(model.steps, SCHEMA) == {}
+    assert model.runner().get_operator("query").statement == STATEMENT
+
+
+def test_only_single_statements_are_rewritten():
+    conditions = [[["numberOfMoons", ">", 2]]]
+    configs = push_down_filters(_model(conditions, statement=STATEMENT + ";\n").steps, SCHEMA)
+    assert configs["query"]["statement"].startswith(f"SELECT * FROM (\n{STATEMENT}\n)")
+
+    model = _model(conditions, statement=f"{STATEMENT}; SELECT * FROM $satellites")
+    assert push_down_filters(model.steps, SCHEMA) == {}
+
+
+def test_pushdown_can_be_turned_off():
+    model = _model([[["numberOfMoons", ">", 2]]])
+    model.flow_config["execution"] = {"push_down_filters": False}
+    flow = model.runner()
+    assert flow.get_operator("query").statement == STATEMENT
+    assert flow.get_operator("filter").groups != []
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
@@ -20,6 +20,58 @@ def test_flow_builder_simple():
     assert flow is not None, "Failed to create FlowModel"
 
 
+def test_flow_builder_links_steps_in_order():
+    model = {
+        "steps": [
+            {"name": "load", "uses": "internal/read@latest"},
+            {"name": "filter", "uses": "internal/filter@latest"},
+            {"name": "save", "uses": "internal/save@latest"},
+        ]
+    }
+    flow = FlowModel.from_dict(model).runner()
+    assert sorted(flow.edges) == [("filter", "save"), ("load", "filter"), ("save", "end")]
+
+
+def test_flow_builder_links_steps_by_needs():
+    model = {
+        "steps": [
+            {"name": "load", "uses": "internal/read@latest"},
+            {"name": "left", "uses": "internal/filter@latest", "needs": "load"},
+            {"name": "right", "uses": "internal/filter@latest", "needs": ["load"]},
+            {"name": "save", "uses": "internal/save@latest", "needs": ["left", "right"]},
+            {"name": "audit", "uses": "internal/save@latest", "needs": ["load"]},
+        ]
+    }
+    pipeline = FlowModel.from_dict(model)
+    flow = pipeline.runner()
+    assert sorted(flow.edges) == [
+        ("audit", "end"),
+        ("left", "save"),
+        ("load", "audit"),
+        ("load", "left"),
+        ("load", "right"),
+        ("right", "save"),
+        ("save", "end"),
+    ]
+    # the definition keeps the needs, so copies of the flow are the same shape
+    assert FlowModel.from_dict(pipeline.to_dict()).runner().edges == flow.edges
+
+
+def test_flow_builder_rejects_unknown_needs():
+    model = {
+        "steps": [
+            {"name": "load", "uses": "internal/read@latest"},
+            {"name": "save", "uses": "internal/save@latest", "needs": ["missing"]},
+        ]
+    }
+    try:
+        FlowModel.from_dict(model)
+    except ValueError:
+        pass
+    else:  # pragma: no cover
+        assert False, "Expected ValueError for a step which needs an unknown step"
+
+
 if __name__ == "__main__":  # pragma: no cover
     from tests import run_tests
 
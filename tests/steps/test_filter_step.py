@@ -0,0 +1,153 @@
+"""
+Test cases for filtering records with compiled conditions in the FilterStep.
+"""
+
+import os
+import sys
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+import pyarrow
+import pytest
+
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import Flow
+from flows.internal.filter.version_1_0_0 import FilterStep
+from flows.internal.filter.version_1_0_0 import parse_conditions
+
+PLANETS = [
+    {"name": "Mercury", "moons": 0, "rings": False, "density": 5427.0},
+    {"name": "Venus", "moons": 0, "rings": False, "density": 5243.0},
+    {"name": "Earth", "moons": 1, "rings": False, "density": 5514.0},
+    {"name": "Mars", "moons": 2, "rings": False, "density": None},
+    {"name": "Jupiter", "moons": 79, "rings": True, "density": 1326.0},
+    {"name": "Saturn", "moons": 82, "rings": True, "density": 687.0},
+    {"name": "Uranus", "moons": 27, "rings": True, "density": None},
+]
+
+
+class SourceStep(BaseOperator):
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            yield data, context
+            return
+        if self.batch_size:
+            table = pyarrow.Table.from_pylist(PLANETS)
+            for batch in table.to_batches(max_chunksize=self.batch_size):
+                yield batch, context
+            return
+        for row in PLANETS:
+            yield row, context
+
+
+class SinkStep(BaseOperator):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.records = []
+
+    def execute(self, data=None, context=None):
+        if data != self.sigterm:
+            self.records.append(data)
+        return data, context
+
+    def execute_batch(self, data=None, context=None):
+        self.records.extend(data.to_pylist())
+        yield data, context
+
+
+def _names(conditions, batch_size=None):
+    flow = Flow(batch_size=batch_size)
+    flow.add_step("source", SourceStep())
+    flow.add_step("filter", FilterStep(conditions=conditions))
+    flow.add_step("sink", SinkStep())
+    flow.add_step("end", EndOperator())
+    flow.link_steps("source", "filter")
+    flow.link_steps("filter", "sink")
+    flow.link_steps("sink", "end")
+    with flow as runner:
+        runner()
+    return [row["name"] for row in flow.get_operator("sink").records]
+
+
+CASES = [
+    (None, [row["name"] for row in PLANETS]),
+    ([[["rings", "==", True]]], ["Jupiter", "Saturn", "Uranus"]),
+    ([[["moons", ">", 1], ["moons", "<=", 79]]], ["Mars", "Jupiter", "Uranus"]),
+    ([[["moons", "==", 0]], [["name", "==", "Saturn"]]], ["Mercury", "Venus", "Saturn"]),
+    ([[["name", "in", ["Earth", "Mars", "Pluto"]]]], ["Earth", "Mars"]),
+    ([[["moons", "not in", [0, 1]], ["rings", "!=", True]]], ["Mars"]),
+    # nulls only match comparisons with null
+    ([[["density", "<", 2000]]], ["Jupiter", "Saturn"]),
+    ([[["density", "!=", 687.0]]], ["Mercury", "Venus", "Earth", "Jupiter"]),
+    ([[["density", "==", None]]], ["Mars", "Uranus"]),
+    ([[["density", "!=", None], ["moons", ">", 50]]], ["Jupiter", "Saturn"]),
+    # missing columns and values of a different type don't match
+    ([[["colour", "==", "red"]]], []),
+    ([[["colour", "==", None], ["moons", "==", 1]]], ["Earth"]),
+    ([[["name", ">", 3]], [["moons", "==", 82]]], ["Saturn"]),
+    # conditions which can't be compared leave the other groups to decide
+    ([[["name", ">", 5]], [["moons", "in", [82]]]], ["Saturn"]),
+]
+
+
+@pytest.mark.parametrize("conditions, expected", CASES)
+def test_row_filters(conditions, expected):
+    assert _names(conditions) == expected
+
+
+@pytest.mark.parametrize("conditions, expected", CASES)
+def test_batch_filters_match_row_filters(conditions, expected):
+    assert _names(conditions, batch_size=3) == expected
+
+
+def test_values_which_cant_be_compared_only_fail_their_condition():
+    conditions = [[["a", ">", 5]], [["b", "in", [1]]]]
+    step = FilterStep(conditions=conditions)
+    records = [{"a": "x", "b": 1}, {"a": "y", "b": 2}]
+
+    kept = [record for record in records if step.execute(record, {})]
+    assert kept == [{"a": "x", "b": 1}]
+
+    batch = pyarrow.Table.from_pylist(records).to_batches()[0]
+    assert [row for data, _ in step.execute_batch(batch, {}) for row in data.to_pylist()] == kept
+
+
+def test_conditions_are_ordered_by_cost():
+    groups = parse_conditions(
+        [
+            [["name", "in", ["Mars"]], ["moons", ">", 1], ["rings", "==", True]],
+            [["moons", "==", 0]],
+        ]
+    )
+    assert groups == [
+        [("moons", "==", 0)],
+        [("rings", "==", True), ("moons", ">", 1), ("name", "in", ["Mars"])],
+    ]
+
+
+@pytest.mark.parametrize(
+    "conditions",
+    [
+        [["moons", "==", 1]],
+        [[["moons", "~=", 1]]],
+        [[["moons", "in", 1]]],
+        [[["moons", ">", None]]],
+        "moons == 1",
+    ],
+)
+def test_invalid_conditions(conditions):
+    with pytest.raises(ValueError):
+        FilterStep(conditions=conditions)
+
+
+def test_steps_without_conditions_pass_records_on():
+    step = FilterStep()
+    assert step.execute(4, {}) == (4, {})
+    assert step.execute({"moons": 1}, {}) == ({"moons": 1}, {})
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
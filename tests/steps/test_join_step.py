@@ -0,0 +1,202 @@
+"""
+Test cases for joining the records from two steps with the JoinStep.
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+import pyarrow
+
+from flows.engine import BaseOperator
+from flows.engine import EndOperator
+from flows.engine import Flow
+from flows.exceptions import FlowError
+from flows.internal import get_step
+
+ORDERS = [
+    {"order": 1, "customer": 1, "name": "first"},
+    {"order": 2, "customer": 2, "name": "second"},
+    {"order": 3, "customer": 9, "name": "third"},
+    {"order": 4, "customer": None, "name": "fourth"},
+]
+CUSTOMERS = [
+    {"customer": 1, "name": "ada"},
+    {"customer": 2, "name": "bob"},
+    {"customer": 2, "name": "cy"},
+    {"customer": None, "name": "nobody"},
+]
+
+
+class SourceStep(BaseOperator):
+    def __init__(self, rows, **kwargs):
+        super().__init__(**kwargs)
+        self.rows = rows
+
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            yield data, context
+            return
+        if self.batch_size:
+            table = pyarrow.Table.from_pylist(self.rows)
+            for batch in table.to_batches(max_chunksize=self.batch_size):
+                yield batch, context
+            return
+        for row in self.rows:
+            yield row, context
+
+
+class SinkStep(BaseOperator):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.records = []
+        self.ends = 0
+
+    def execute(self, data=None, context=None):
+        if data == self.sigterm:
+            self.ends += 1
+        else:
+            self.records.append(data)
+        return data, context
+
+    def execute_batch(self, data=None, context=None):
+        self.records.extend(data.to_pylist())
+        yield data, context
+
+
+def _join(batch_size=None, orders=ORDERS, customers=CUSTOMERS, **config):
+    JoinStep = get_step("join")
+    flow = Flow(batch_size=batch_size)
+    flow.add_step("orders", SourceStep(orders))
+    flow.add_step("customers", SourceStep(customers))
+    flow.add_step("join", JoinStep(on="customer", **config))
+    flow.add_step("sink", SinkStep())
+    flow.add_step("end", EndOperator())
+    # the second step linked to the join is the build side
+    flow.link_steps("orders", "join")
+    flow.link_steps("customers", "join")
+    flow.link_steps("join", "sink")
+    flow.link_steps("sink", "end")
+    with flow as runner:
+        runner()
+    return flow
+
+
+def _records(flow):
+    return sorted(flow.get_operator("sink").records, key=lambda row: (row["order"], str(row)))
+
+
+def test_inner_join():
+    flow = _join(how="inner")
+    assert _records(flow) == [
+        {"order": 1, "customer": 1, "name": "first", "name_right": "ada"},
+        {"order": 2, "customer": 2, "name": "second", "name_right": "bob"},
+        {"order": 2, "customer": 2, "name": "second", "name_right": "cy"},
+    ]
+    # the end of the flow is passed on once, after the joined records
+    assert flow.get_operator("sink").ends == 1
+    sensors = flow.get_operator("join").read_sensors()["join"]
+    assert sensors.pop("peak_bytes") > 0
+    assert sensors == {"build_records": 4, "probe_records": 4, "spilled": False}
+
+
+def test_left_join():
+    records = _records(_join(how="left"))
+    assert len(records) == 5
+    assert records[3] == {"order": 3, "customer": 9, "name": "third", "name_right": None}
+    assert records[4] == {"order": 4, "customer": None, "name": "fourth", "name_right": None}
+
+
+def test_semi_join():
+    assert [row["order"] for row in _records(_join(how="semi"))] == [1, 2]
+
+
+def test_batch_joins_match_row_joins():
+    for how in ("inner", "left", "semi"):
+        assert _records(_join(how=how, batch_size=2)) == _records(_join(how=how)), how
+
+
+def test_build_side_spills_to_disk():
+    for batch_size in (None, 2):
+        for how in ("inner", "left", "semi"):
+            flow = _join(how=how, batch_size=batch_size, memory_limit=1)
+            assert flow.get_operator("join").spilled
+            assert _records(flow) == _records(_join(how=how, batch_size=batch_size)), how
+
+
+def test_held_probe_records_count_against_the_memory_limit():
+    orders = [
+        {"order": i, "customer": i % 50 if i % 7 else None, "name": f"order {i}"}
+        for i in range(3000)
+    ]
+    many_customers = [{"customer": i, "name": f"customer {i}"} for i in range(3000)]
+    # the build side fits and the probe records waiting for it don't, then
+    # neither fits and only a partition of the build side is loaded at a time
+    for customers in (CUSTOMERS, many_customers):
+        for batch_size in (None, 100):
+            for how in ("inner", "left", "semi"):
+                config = {"how": how, "batch_size": batch_size, "orders": orders}
+                expected = _records(_join(customers=customers, **config))
+                flow = _join(customers=customers, memory_limit=20000, **config)
+                sensors = flow.get_operator("join").read_sensors()["join"]
+                assert sensors["spilled"], how
+                # at most one record or batch over the limit is held
+                assert sensors["peak_bytes"] < 20000 + 5000, how
+                assert _records(flow) == expected, how
+
+
+def test_build_side_can_be_chosen():
+    flow = _join(how="semi", build="orders")
+    # the customers with orders
+    assert sorted(row["name"] for row in flow.get_operator("sink").records) == ["ada", "bob", "cy"]
+
+
+def test_joins_need_two_inputs():
+    JoinStep = get_step("join")
+    flow = Flow()
+    flow.add_step("orders", SourceStep(ORDERS))
+    flow.add_step("join", JoinStep(on="customer"))
+    flow.add_step("end", EndOperator())
+    flow.link_steps("orders", "join")
+    flow.link_steps("join", "end")
+    try:
+        with flow as runner:
+            runner()
+    except FlowError:
+        pass
+    else:  # pragma: no cover
+        assert False, "Expected FlowError for a join with one input"
+
+    try:
+        JoinStep(on="customer", how="outer")
+    except ValueError:
+        pass
+    else:  # pragma: no cover
+        assert False, "Expected ValueError for an unsupported join"
+
+
+def test_joins_cant_be_checkpointed():
+    JoinStep = get_step("join")
+    with tempfile.TemporaryDirectory() as tmp:
+        flow = Flow(checkpoint_path=tmp)
+        flow.add_step("orders", SourceStep(ORDERS))
+        flow.add_step("customers", SourceStep(CUSTOMERS))
+        flow.add_step("join", JoinStep(on="customer"))
+        flow.add_step("end", EndOperator())
+        flow.link_steps("orders", "join")
+        flow.link_steps("customers", "join")
+        flow.link_steps("join", "end")
+        try:
+            flow.__enter__()
+        except FlowError:
+            pass
+        else:  # pragma: no cover
+            assert False, "Expected FlowError for checkpointing a flow with a join"
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()
@@ -0,0 +1,52 @@
+"""
+Test cases for the SaveStep holding records until they are committed.
+"""
+
+import os
+import sys
+
+sys.path.insert(1, os.path.join(sys.path[0], "../.."))
+
+from flows.internal.save.version_1_0_0 import SaveStep
+
+
+def _save(step, records):
+    for record in records:
+        list(step.execute(record, {}))
+
+
+def test_uncommitted_records_are_written_to_a_file(capsys):
+    step = SaveStep(buffer_size=3)
+    step.checkpointing = True
+    _save(step, [{"planet": index} for index in range(10)])
+
+    # at most buffer_size records are held in memory, and none are written
+    assert len(step._uncommitted) < 3
+    assert step._spill_file is not None
+    assert capsys.readouterr().out == ""
+
+    step.commit()
+    assert capsys.readouterr().out.splitlines() == [str({"planet": i}) for i in range(10)]
+    assert step._spill_file is None
+
+    # the next checkpoint only writes the records after the last
+    _save(step, [{"planet": 10}])
+    step.commit()
+    assert capsys.readouterr().out.splitlines() == [str({"planet": 10})]
+
+
+def test_uncommitted_records_are_discarded_when_the_flow_stops(capsys):
+    step = SaveStep(buffer_size=3)
+    step.checkpointing = True
+    _save(step, [{"planet": index} for index in range(10)])
+    _save(step, [step.sigterm])
+    assert step._spill_file is None
+
+    step.commit()
+    assert capsys.readouterr().out == ""
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from tests import run_tests
+
+    run_tests()